@@ -0,0 +1,9 @@
+from app.startup import report
+
+# First thing the app imports, so the startup report sees every import
+report.install_import_timer()
+
+from app.services import thread_budget  # noqa: E402
+
+# Before numpy/cv2/torch load: they size their thread pools on import
+thread_budget.limit_native_threads()
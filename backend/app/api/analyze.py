@@ -1,41 +1,45 @@
+import asyncio
 import base64
 import json
 import logging
+import zipfile
+from collections.abc import AsyncIterator, Callable
 from datetime import datetime, timezone
+from functools import partial
 from pathlib import Path
+from typing import BinaryIO
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, UploadFile, File
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from app.config import settings
-from app.database import get_db
-from app.models.scan import Scan
-from app.schemas.scan import AnalysisResponse, MetadataResult, ELAResult, AIDetectionResult
-from app.services.image_storage import compute_hash, save_image
-from app.services.metadata_extractor import extract_metadata
-from app.services.ela_analyzer import perform_ela
-from app.services.ai_detector import AIDetector
+from app.database import SessionLocal, get_db
+from app.models.scan import Scan, ScanSighting
+from app.models.storage import claim_stored_image
+from app.schemas.job import JobAccepted
+from app.schemas.scan import AnalysisResponse, VideoAnalysisResponse
+from app.services import job_queue, metrics, scan_writer
+from app.services.ela_analyzer import save_heatmap_pixels
+from app.services.image_storage import compute_hash, image_exists, save_image, save_original
+from app.services.metadata_extractor import promoted_metadata
+from app.services.pipeline import InvalidImageError
+from app.services.result_cache import cache_key, result_cache
+from app.services.upload_ingest import (
+    IMAGE_TYPE_ERROR,
+    SNIFF_BYTES,
+    UploadRejected,
+    ingest_upload,
+    sniff_content_type,
+)
+from app.services.video_analyzer import InvalidVideoError
+from app.services.worker_pool import analyze_upload, analyze_video_file
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# Initialize AI detector once
-_detector: AIDetector | None = None
-
-
-def get_detector() -> AIDetector | None:
-    global _detector
-    if _detector is None:
-        try:
-            logger.info("Loading AI model...")
-            _detector = AIDetector(model_path=settings.model_path)
-            logger.info("AI model loaded successfully")
-        except Exception as e:
-            logger.error(f"Model loading failed: {e}")
-            _detector = None   # prevent crash
-    return _detector
-
 ALLOWED_CONTENT_TYPES = {"image/jpeg", "image/png"}
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png"}
 
@@ -72,81 +76,22 @@ def _compute_metadata_risk(metadata: dict) -> float:
     return risk
 
 
-@router.post("/analyze", response_model=AnalysisResponse)
-async def analyze_image(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-):
-    # Validate content type
-    if file.content_type not in ALLOWED_CONTENT_TYPES:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Invalid file type '{file.content_type}'. Only JPEG and PNG are allowed.",
-        )
-
-    # Validate extension
-    ext = Path(file.filename or "").suffix.lower()
-    if ext not in ALLOWED_EXTENSIONS:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Invalid file extension '{ext}'. Only .jpg, .jpeg, .png are allowed.",
-        )
-
-    # Read ORIGINAL file
-    original_bytes = await file.read()
-
-    if len(original_bytes) > settings.max_file_size:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File too large. Maximum size is {settings.max_file_size // (1024*1024)}MB.",
-        )
-
-    if len(original_bytes) == 0:
-        raise HTTPException(status_code=400, detail="Empty file.")
+# Columns a duplicate scan copies from the scan whose result was cached
+_DUPLICATE_COLUMNS = [
+    c.key for c in Scan.__table__.columns if c.key not in ("id", "image_name", "timestamp")
+]
 
 
-    # 🔥 STEP 1 — METADATA from ORIGINAL
-    metadata = extract_metadata(original_bytes)
+def _ela_signal(ela_result: dict) -> float:
+    # Weights below are calibrated on the mean of per-channel maxima
+    return ela_result.get("channel_max_mean", ela_result.get("mean_diff", 0))
 
-    # 🔥 STEP 2 — ELA from ORIGINAL
-    ela_result = perform_ela(original_bytes)
 
-
-    # 🔥 STEP 3 — NOW resize/compress ONLY for storage
-    from PIL import Image
-    import io
-
-    try:
-        image = Image.open(io.BytesIO(original_bytes))
-
-        image.thumbnail((512, 512))
-
-        if image.mode != "RGB":
-            image = image.convert("RGB")
-
-        buffer = io.BytesIO()
-        image.save(buffer, format="JPEG", quality=85)
-
-        processed_bytes = buffer.getvalue()
-
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Invalid image file: {e}")
-
-
-    # 🔥 STEP 4 — use processed for saving + hashing
-    sha256 = compute_hash(processed_bytes)
-    save_image(processed_bytes, sha256, ext)
-
-    ai_result = {
-     "deepfake_probability": 0.0,
-     "confidence": 0.0,
-      "model_used": "none",
-    }
-
-    
-    # Compute final scores
+def _compute_manipulation_score(
+    metadata: dict, ela_result: dict, ai_result: dict
+) -> float:
     metadata_risk = _compute_metadata_risk(metadata)
-    ela_normalized = min((ela_result.get("mean_diff", 0) / 60.0) * 100, 100)
+    ela_normalized = min((_ela_signal(ela_result) / 60.0) * 100, 100)
     ai_pct = ai_result["deepfake_probability"] * 100
 
     manipulation_score = (
@@ -163,41 +108,662 @@ async def analyze_image(
             manipulation_score,
         )
 
-    manipulation_score = round(min(manipulation_score, 100.0), 1)
-    verdict = _compute_verdict(manipulation_score, metadata, ai_result)
+    return round(min(manipulation_score, 100.0), 1)
 
-    # Encode original image as base64
-    #original_b64 = f"data:{file.content_type};base64,{base64.b64encode(file_bytes).decode()}"
-    original_b64 = f"data:{file.content_type};base64,{base64.b64encode(original_bytes).decode()}"
 
-    # Persist to database
-    now = datetime.now(timezone.utc)
+def _build_scan(
+    analysis: dict, image_name: str, content_sha256: str, now: datetime
+) -> tuple[Scan, dict]:
+    """Score a pipeline result and build its (unsaved) Scan row together
+    with the response fields shared by the API and the result cache."""
+    metadata = analysis["metadata"]
+    ela_result = analysis["ela"]
+    processed_bytes = analysis["processed_bytes"]
+    ai_result = analysis["ai"]
+
+    sha256 = compute_hash(processed_bytes)
+    manipulation_score = _compute_manipulation_score(metadata, ela_result, ai_result)
+    verdict = _compute_verdict(manipulation_score, metadata, ai_result)
+
     scan = Scan(
-        image_name=file.filename or "unknown",
+        image_name=image_name,
         sha256_hash=sha256,
-        #file_size=len(file_bytes),
+        content_sha256=content_sha256,
         file_size=len(processed_bytes),
         timestamp=now,
         verdict=verdict,
         manipulation_score=manipulation_score,
         metadata_json=json.dumps(metadata),
-        software_detected=metadata.get("software"),
+        **promoted_metadata(metadata),
+        **analysis.get("hashes", {}),
         ela_mean=ela_result.get("mean_diff"),
         ai_score=ai_result["deepfake_probability"],
     )
+    result = {
+        "sha256_hash": sha256,
+        "verdict": verdict,
+        "manipulation_score": manipulation_score,
+        "metadata": metadata,
+        "ela": ela_result,
+        "ai_detection": ai_result,
+    }
+    return scan, result
+
+
+def _count_outcome(outcome: str, verdict: str | None = None) -> None:
+    metrics.ANALYZE_REQUESTS.inc(outcome)
+    if verdict is not None:
+        metrics.VERDICTS.inc(verdict)
+
+
+def _store_images(
+    analysis: dict, original_bytes: bytes | memoryview | None, sha256: str
+) -> None:
+    save_image(analysis["processed_bytes"], sha256)
+    if original_bytes is not None:
+        save_original(original_bytes, sha256)
+    if analysis["heatmap"] is not None:
+        save_heatmap_pixels(analysis["heatmap"], sha256)
+
+
+def _image_url(sha256: str) -> str:
+    """The stored thumbnail."""
+    return f"/api/images/{sha256}"
+
+
+def _original_url(sha256: str) -> str | None:
+    """The upload itself, when originals are kept."""
+    return f"/api/images/{sha256}/original" if settings.keep_originals else None
+
+
+def _encode_original(file_bytes: bytes | memoryview, content_type: str | None) -> str:
+    return f"data:{content_type};base64,{base64.b64encode(file_bytes).decode()}"
+
+
+def _stage_scan(
+    db: Session, scan: Scan, key: str | None = None, cached: dict | None = None
+) -> int:
+    """Add a new scan (and its result-cache row) without committing."""
     db.add(scan)
+    db.flush()  # assigns scan.id for the cache row
+    if key is not None:
+        result_cache.add(db, key, scan.content_sha256, scan.id, cached)
+    return scan.id
+
+
+def _commit_stage(db: Session, stage: Callable[[Session], int | None]) -> int | None:
+    row_id = stage(db)
     db.commit()
-    db.refresh(scan)
+    return row_id
+
+
+async def _persist(db: Session, stage: Callable[[Session], int | None]) -> int | None:
+    """Commit ``stage`` in the request's own transaction, or hand it to the
+    write-behind queue to share a transaction with concurrent requests."""
+    with metrics.STAGE_SECONDS.time("db_commit"):
+        if scan_writer.enabled():
+            # Give back this request's pooled connection (held since the cache
+            # lookup) so waiting requests cannot starve the writer
+            db.close()
+            return await scan_writer.write(stage)
+        return await run_in_threadpool(_commit_stage, db, stage)
+
+
+def _stage_duplicate(
+    db: Session, scan_id: int, image_name: str, now: datetime
+) -> Scan | ScanSighting | None:
+    """Add the row recording a re-upload served from cache, or return None
+    if the cached scan or its stored image no longer exists."""
+    original = db.get(Scan, scan_id)
+    if original is None:
+        return None
+    # Evicted since the result was cached (possibly by another process)
+    if not claim_stored_image(db.connection(), original.sha256_hash, now):
+        return None
+
+    if settings.duplicate_scan_mode == "sighting":
+        row = ScanSighting(scan_id=scan_id, image_name=image_name, timestamp=now)
+    else:
+        row = Scan(
+            image_name=image_name,
+            timestamp=now,
+            **{col: getattr(original, col) for col in _DUPLICATE_COLUMNS},
+        )
+    db.add(row)
+    return row
+
+
+def _reported_scan_id(row: Scan | ScanSighting) -> int:
+    return row.scan_id if isinstance(row, ScanSighting) else row.id
+
+
+def _load_cached(db: Session, key: str) -> dict | None:
+    """The cached result for ``key``, or None if there is none or its
+    stored image is gone (then it is a miss and the upload is analyzed,
+    and stored, again)."""
+    entry = result_cache.load(db, key)
+    if entry is not None and not image_exists(entry["response"]["sha256_hash"]):
+        result_cache.forget_scans({entry["scan_id"]})
+        return None
+    return entry
+
+
+def _record_duplicate(
+    db: Session, scan_id: int, image_name: str, now: datetime
+) -> int | None:
+    row = _stage_duplicate(db, scan_id, image_name, now)
+    if row is None:
+        return None
+    db.flush()
+    return _reported_scan_id(row)
+
+
+async def analyze_and_store(
+    db: Session,
+    original_bytes: bytes | memoryview,
+    image_name: str,
+    content_sha256: str,
+) -> tuple[int, datetime, dict]:
+    """Analyze an upload (or reuse the cached result of an identical one)
+    and persist its scan. Returns (scan_id, timestamp, response fields).
+    Raises InvalidImageError if the upload cannot be decoded."""
+    key = cache_key(content_sha256) if settings.result_cache_enabled else None
+
+    # Identical upload already analyzed with this pipeline version -> reuse it
+    if key is not None:
+        with metrics.STAGE_SECONDS.time("cache_lookup"):
+            cached = await run_in_threadpool(_load_cached, db, key)
+        metrics.RESULT_CACHE.inc("miss" if cached is None else "hit")
+        if cached is not None:
+            now = datetime.now(timezone.utc)
+            stage = partial(
+                _record_duplicate, scan_id=cached["scan_id"], image_name=image_name, now=now
+            )
+            scan_id = await _persist(db, stage)
+            if scan_id is not None:
+                logger.info("Result cache hit for %s", content_sha256)
+                _count_outcome("cached", cached["response"]["verdict"])
+                return scan_id, now, cached["response"]
+
+    # 🔥 STEPS 1-3 — metadata, ELA and storage thumbnail off the event loop
+    try:
+        analysis = await analyze_upload(original_bytes)
+    except InvalidImageError:
+        _count_outcome("invalid")
+        raise
+
+    # 🔥 STEP 4 — use processed for saving + hashing
+    now = datetime.now(timezone.utc)
+    scan, result = _build_scan(analysis, image_name, content_sha256, now)
+    with metrics.STAGE_SECONDS.time("save_image"):
+        await run_in_threadpool(
+            _store_images, analysis, original_bytes, scan.sha256_hash
+        )
+
+    # Persist to database
+    scan_id = await _persist(db, partial(_stage_scan, scan=scan, key=key, cached=result))
+    if key is not None:
+        result_cache.remember(key, {"scan_id": scan_id, "response": result})
+    _count_outcome("analyzed", result["verdict"])
+    return scan_id, now, result
+
+
+@router.post(
+    "/analyze",
+    response_model=AnalysisResponse,
+    responses={202: {"model": JobAccepted, "description": "Queued (?async=true)"}},
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "required": ["file"],
+                        "properties": {"file": {"type": "string", "format": "binary"}},
+                    }
+                }
+            },
+        }
+    },
+)
+async def analyze_image(
+    request: Request,
+    inline_image: bool = Query(
+        default=False, description="Also embed the original upload as base64"
+    ),
+    async_job: bool = Query(
+        default=False,
+        alias="async",
+        description="Queue the analysis and return 202 with a job to poll at /api/jobs/{id}",
+    ),
+    db: Session = Depends(get_db),
+):
+    # Stream the ORIGINAL file: size, extension and magic bytes are checked
+    # while reading, so bad uploads are rejected without buffering them
+    try:
+        upload = await ingest_upload(
+            request,
+            field_name="file",
+            max_size=settings.upload_size_limit,
+            allowed_types=ALLOWED_CONTENT_TYPES,
+            allowed_extensions=ALLOWED_EXTENSIONS,
+        )
+    except UploadRejected as e:
+        metrics.UPLOAD_REJECTIONS.inc(str(e.status_code))
+        _count_outcome("rejected")
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    original_bytes = upload.data
+    ext = Path(upload.filename or "").suffix.lower()
+    image_name = upload.filename or "unknown"
+
+    if async_job:
+        db.close()  # nothing to read; don't hold a pooled connection
+        job = await run_in_threadpool(
+            job_queue.enqueue, original_bytes, image_name, upload.content_type,
+            upload.sha256, ext,
+        )
+        job_queue.notify()
+        status_url = f"/api/jobs/{job.id}"
+        return JSONResponse(
+            status_code=202,
+            content=JobAccepted(job_id=job.id, status=job.status, status_url=status_url).model_dump(),
+            headers={"location": status_url},
+        )
+
+    try:
+        scan_id, now, result = await analyze_and_store(
+            db, original_bytes, image_name, upload.sha256
+        )
+    except InvalidImageError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image file: {e}")
+
+    # Encode original image as base64 (opt-in; clients normally use the URL)
+    original_b64 = None
+    if inline_image:
+        original_b64 = _encode_original(original_bytes, upload.content_type)
 
     return AnalysisResponse(
-        scan_id=scan.id,
-        image_name=scan.image_name,
+        scan_id=scan_id,
+        image_name=image_name,
+        timestamp=now.isoformat(),
+        original_image_base64=original_b64,   # 👈 ADD THIS
+        original_image_url=_original_url(result["sha256_hash"]),
+        thumbnail_url=_image_url(result["sha256_hash"]),
+        **result,
+    )
+
+
+# ---------- Batch ingestion ----------
+
+ZIP_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed"}
+
+
+def _is_zip(upload: UploadFile) -> bool:
+    return (
+        upload.content_type in ZIP_CONTENT_TYPES
+        or Path(upload.filename or "").suffix.lower() == ".zip"
+    )
+
+
+def _expand_batch(files: list[UploadFile]) -> list[tuple[str, Callable[[], bytes]]]:
+    """Flatten uploads and ZIP members into (name, reader) pairs. Readers
+    are called lazily so only in-flight entries are held in memory."""
+    entries = []
+    for upload in files:
+        if not _is_zip(upload):
+            entries.append((upload.filename or "unknown", partial(_read_limited, upload.file)))
+            continue
+
+        archive = zipfile.ZipFile(upload.file)
+        for info in archive.infolist():
+            if info.is_dir() or info.filename.startswith("__MACOSX/"):
+                continue
+            if info.file_size > settings.upload_size_limit:
+                # Checked against the central directory so it is never inflated
+                reader = partial(_reject_oversized, info.file_size)
+            else:
+                # Bounded too: the declared size is only the archive's word
+                reader = partial(_read_member, archive, info)
+            entries.append((info.filename, reader))
+    return entries
+
+
+def _read_limited(f: BinaryIO) -> bytes:
+    """Read at most one byte past the size limit, so an oversized entry
+    is rejected without being loaded whole."""
+    data = f.read(settings.upload_size_limit + 1)
+    if len(data) > settings.upload_size_limit:
+        raise ValueError("File too large.")
+    return data
+
+
+def _read_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> bytes:
+    with archive.open(info) as member:
+        return _read_limited(member)
+
+
+def _reject_oversized(size: int) -> bytes:
+    raise ValueError(f"File too large ({size} bytes).")
+
+
+def _lookup_cached(key: str) -> dict | None:
+    with SessionLocal() as db:
+        entry = _load_cached(db, key)
+        if entry is not None and db.get(Scan, entry["scan_id"]) is None:
+            return None
+    return entry
+
+
+async def _analyze_entry(name: str, reader: Callable[[], bytes]) -> dict:
+    """Analyze one batch entry. Never raises: failures become error items."""
+    try:
+        ext = Path(name).suffix.lower()
+        if ext not in ALLOWED_EXTENSIONS:
+            raise ValueError(f"Invalid file extension '{ext}'.")
+
+        file_bytes = await run_in_threadpool(reader)
+        if not file_bytes:
+            raise ValueError("Empty file.")
+        if sniff_content_type(file_bytes[:SNIFF_BYTES]) not in ALLOWED_CONTENT_TYPES:
+            raise ValueError(IMAGE_TYPE_ERROR)
+
+        content_sha256 = compute_hash(file_bytes)
+        key = cache_key(content_sha256) if settings.result_cache_enabled else None
+        if key is not None:
+            cached = await run_in_threadpool(_lookup_cached, key)
+            metrics.RESULT_CACHE.inc("miss" if cached is None else "hit")
+            if cached is not None:
+                _count_outcome("cached", cached["response"]["verdict"])
+                return {"kind": "cached", "image_name": name, "cached": cached}
+
+        analysis = await analyze_upload(file_bytes)
+        now = datetime.now(timezone.utc)
+        scan, result = _build_scan(analysis, name, content_sha256, now)
+        await run_in_threadpool(
+            _store_images, analysis, file_bytes, scan.sha256_hash
+        )
+        _count_outcome("analyzed", result["verdict"])
+        return {
+            "kind": "analyzed",
+            "image_name": name,
+            "scan": scan,
+            "key": key,
+            "result": result,
+            "timestamp": now,
+        }
+    except InvalidImageError as e:
+        _count_outcome("invalid")
+        return {"kind": "error", "image_name": name, "error": f"Invalid image file: {e}"}
+    except Exception as e:
+        _count_outcome("rejected")
+        logger.warning("Batch entry %s failed: %s", name, e)
+        return {"kind": "error", "image_name": name, "error": str(e)}
+
+
+def _commit_group(db: Session, group: list[dict]) -> str:
+    """Persist a group of finished entries in one transaction and render
+    their NDJSON lines."""
+    now = datetime.now(timezone.utc)
+    lines = []
+    cache_entries = []
+    try:
+        for item in group:
+            if item["kind"] == "analyzed":
+                db.add(item["scan"])
+            elif item["kind"] == "cached":
+                item["row"] = _stage_duplicate(
+                    db, item["cached"]["scan_id"], item["image_name"], now
+                )
+        db.flush()  # assigns ids; read them before commit expires the rows
+
+        for item in group:
+            if item["kind"] == "analyzed":
+                scan = item["scan"]
+                if item["key"] is not None:
+                    entry = result_cache.add(
+                        db, item["key"], scan.content_sha256, scan.id, item["result"]
+                    )
+                    cache_entries.append((item["key"], entry))
+                line = AnalysisResponse(
+                    scan_id=scan.id,
+                    image_name=item["image_name"],
+                    timestamp=item["timestamp"].isoformat(),
+                    original_image_url=_original_url(scan.sha256_hash),
+                    thumbnail_url=_image_url(scan.sha256_hash),
+                    **item["result"],
+                ).model_dump(exclude={"original_image_base64"})
+            elif item["kind"] == "cached" and item["row"] is not None:
+                line = AnalysisResponse(
+                    scan_id=_reported_scan_id(item["row"]),
+                    image_name=item["image_name"],
+                    timestamp=now.isoformat(),
+                    original_image_url=_original_url(item["cached"]["response"]["sha256_hash"]),
+                    thumbnail_url=_image_url(item["cached"]["response"]["sha256_hash"]),
+                    **item["cached"]["response"],
+                ).model_dump(exclude={"original_image_base64"})
+            elif item["kind"] == "cached":
+                line = {"image_name": item["image_name"], "error": "Cached scan or its image no longer exists."}
+            else:
+                line = {"image_name": item["image_name"], "error": item["error"]}
+            lines.append(json.dumps(line) + "\n")
+
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error("Batch commit failed: %s", e)
+        return "".join(
+            json.dumps({"image_name": item["image_name"], "error": "Database write failed."}) + "\n"
+            for item in group
+        )
+
+    for key, entry in cache_entries:
+        result_cache.remember(key, entry)
+    return "".join(lines)
+
+
+async def _stream_batch(
+    entries: list[tuple[str, Callable[[], bytes]]], files: list[UploadFile]
+) -> AsyncIterator[str]:
+    queue: asyncio.Queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(settings.batch_concurrency)
+
+    async def worker(name: str, reader: Callable[[], bytes]):
+        async with semaphore:
+            item = await _analyze_entry(name, reader)
+        await queue.put(item)
+
+    tasks = [asyncio.create_task(worker(name, reader)) for name, reader in entries]
+    db = SessionLocal()
+    try:
+        remaining = len(tasks)
+        while remaining:
+            # Commit whatever has finished so far as one group: big groups
+            # under load, low latency when results trickle in.
+            group = [await queue.get()]
+            while len(group) < settings.batch_commit_size and not queue.empty():
+                group.append(queue.get_nowait())
+            remaining -= len(group)
+            yield await run_in_threadpool(_commit_group, db, group)
+    finally:
+        for task in tasks:
+            task.cancel()
+        db.close()
+        for upload in files:
+            await upload.close()
+
+
+@router.post("/analyze/batch")
+async def analyze_batch(files: list[UploadFile] = File(...)):
+    """Analyze many images (or ZIP archives of images) and stream one JSON
+    line per image as each finishes. Original images are not echoed back."""
+    try:
+        entries = await run_in_threadpool(_expand_batch, files)
+    except zipfile.BadZipFile as e:
+        raise HTTPException(status_code=400, detail=f"Invalid ZIP archive: {e}")
+
+    if not entries:
+        raise HTTPException(status_code=400, detail="No files to analyze.")
+    if len(entries) > settings.batch_max_files:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many files. Maximum per batch is {settings.batch_max_files}.",
+        )
+
+    return StreamingResponse(
+        _stream_batch(entries, files), media_type="application/x-ndjson"
+    )
+
+
+# ---------- Video ----------
+
+ALLOWED_VIDEO_TYPES = {"video/mp4", "video/webm"}
+ALLOWED_VIDEO_EXTENSIONS = {".mp4", ".webm"}
+VIDEO_TYPE_ERROR = "Invalid file content. Only MP4 and WebM videos are allowed."
+
+
+def _video_cache_key(content_sha256: str) -> str:
+    # The timeline depends on how frames were sampled, not just the pipeline
+    sampling = (
+        f"{settings.video_sample_mode}:{settings.video_frame_stride_s:g}:"
+        f"{settings.video_scene_threshold:g}:{settings.video_scene_max_gap_s:g}:"
+        f"{settings.video_max_frames}"
+    )
+    return cache_key(content_sha256, f"video:{sampling}")
+
+
+def _build_video_scan(
+    analysis: dict, video_name: str, content_sha256: str, now: datetime
+) -> tuple[Scan, dict]:
+    """Video counterpart of _build_scan. The stored image is the poster
+    frame, so sha256_hash and file_size describe it, not the clip."""
+    processed_bytes = analysis["processed_bytes"]
+    info = analysis["video"]
+    timeline = analysis["timeline"]
+    sha256 = compute_hash(processed_bytes)
+
+    scan = Scan(
+        image_name=video_name,
         sha256_hash=sha256,
+        content_sha256=content_sha256,
+        file_size=len(processed_bytes),
+        timestamp=now,
+        verdict=analysis["verdict"],
+        manipulation_score=analysis["manipulation_score"],
+        metadata_json=json.dumps({"video": info}),
+        **promoted_metadata({}),
+        **analysis["hashes"],
+        ela_mean=analysis["ela_mean"],
+        ai_score=analysis["ai"]["deepfake_probability"],
+        media_type="video",
+        duration_s=info["duration_s"],
+        frames_analyzed=timeline["frames_analyzed"],
+        timeline_json=json.dumps(timeline),
+    )
+    result = {
+        "sha256_hash": sha256,
+        "verdict": analysis["verdict"],
+        "manipulation_score": analysis["manipulation_score"],
+        "video": info,
+        "ela_mean": analysis["ela_mean"],
+        "ai_detection": analysis["ai"],
+        "timeline": timeline,
+    }
+    return scan, result
+
+
+async def analyze_video_and_store(
+    db: Session, path: str, video_name: str, content_sha256: str
+) -> tuple[int, datetime, dict]:
+    """analyze_and_store for a clip spooled at ``path``. Raises
+    InvalidVideoError if it cannot be decoded or is too long."""
+    key = _video_cache_key(content_sha256) if settings.result_cache_enabled else None
+
+    if key is not None:
+        with metrics.STAGE_SECONDS.time("cache_lookup"):
+            cached = await run_in_threadpool(_load_cached, db, key)
+        metrics.RESULT_CACHE.inc("miss" if cached is None else "hit")
+        if cached is not None:
+            now = datetime.now(timezone.utc)
+            stage = partial(
+                _record_duplicate, scan_id=cached["scan_id"], image_name=video_name, now=now
+            )
+            scan_id = await _persist(db, stage)
+            if scan_id is not None:
+                logger.info("Result cache hit for video %s", content_sha256)
+                _count_outcome("cached", cached["response"]["verdict"])
+                return scan_id, now, cached["response"]
+
+    try:
+        analysis = await analyze_video_file(path)
+    except InvalidVideoError:
+        _count_outcome("invalid")
+        raise
+
+    now = datetime.now(timezone.utc)
+    scan, result = _build_video_scan(analysis, video_name, content_sha256, now)
+    # Only the poster frame is kept; the clip itself is not stored
+    with metrics.STAGE_SECONDS.time("save_image"):
+        await run_in_threadpool(_store_images, analysis, None, scan.sha256_hash)
+
+    scan_id = await _persist(db, partial(_stage_scan, scan=scan, key=key, cached=result))
+    if key is not None:
+        result_cache.remember(key, {"scan_id": scan_id, "response": result})
+    _count_outcome("analyzed", result["verdict"])
+    return scan_id, now, result
+
+
+@router.post(
+    "/analyze/video",
+    response_model=VideoAnalysisResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "required": ["file"],
+                        "properties": {"file": {"type": "string", "format": "binary"}},
+                    }
+                }
+            },
+        }
+    },
+)
+async def analyze_video(request: Request, db: Session = Depends(get_db)):
+    """Analyze an MP4 or WebM clip frame by frame. The upload is spooled to
+    disk and decoded incrementally, so memory does not grow with its length."""
+    try:
+        upload = await ingest_upload(
+            request,
+            field_name="file",
+            max_size=settings.video_max_file_size,
+            allowed_types=ALLOWED_VIDEO_TYPES,
+            allowed_extensions=ALLOWED_VIDEO_EXTENSIONS,
+            type_error=VIDEO_TYPE_ERROR,
+            spool_dir=settings.upload_dir / "spool",
+        )
+    except UploadRejected as e:
+        metrics.UPLOAD_REJECTIONS.inc(str(e.status_code))
+        _count_outcome("rejected")
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    video_name = upload.filename or "unknown"
+    try:
+        scan_id, now, result = await analyze_video_and_store(
+            db, str(upload.path), video_name, upload.sha256
+        )
+    except InvalidVideoError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid video file: {e}")
+    finally:
+        upload.path.unlink(missing_ok=True)
+
+    return VideoAnalysisResponse(
+        scan_id=scan_id,
+        image_name=video_name,
         timestamp=now.isoformat(),
-        verdict=verdict,
-        manipulation_score=manipulation_score,
-        metadata=MetadataResult(**metadata),
-        ela=ELAResult(**ela_result),
-        ai_detection=AIDetectionResult(**ai_result),
-        original_image_base64=original_b64   # 👈 ADD THIS
+        poster_url=_image_url(result["sha256_hash"]),
+        **result,
     )
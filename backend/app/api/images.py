@@ -0,0 +1,106 @@
+import re
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response
+
+from app.services import retention
+from app.services.image_storage import find_image, get_store, image_exists, load_image
+from app.services.upload_ingest import sniff_content_type
+
+router = APIRouter()
+
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Content-addressed: the bytes behind a hash never change
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _byte_range(request: Request, etag: str, size: int) -> tuple[int, int] | None:
+    """The (start, end) inclusive range a request asks for, or None for the
+    whole body. Multiple ranges are answered with the whole body, which
+    RFC 9110 allows. Raises 416 for a range outside the body."""
+    match = RANGE_RE.match(request.headers.get("range", "").replace(" ", ""))
+    if match is None or not any(match.groups()):
+        return None
+    if_range = request.headers.get("if-range")
+    if if_range is not None and if_range.strip() != etag:
+        return None
+
+    first, last = match.groups()
+    if not first:  # suffix: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Range not satisfiable.",
+            headers={"content-range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+def _send_bytes(data: bytes, request: Request, headers: dict[str, str]) -> Response:
+    media_type = sniff_content_type(data[:8]) or "application/octet-stream"
+    headers = {**headers, "accept-ranges": "bytes"}
+    byte_range = _byte_range(request, headers["etag"], len(data))
+    if byte_range is None:
+        return Response(data, media_type=media_type, headers=headers)
+    start, end = byte_range
+    headers["content-range"] = f"bytes {start}-{end}/{len(data)}"
+    return Response(data[start : end + 1], status_code=206, media_type=media_type, headers=headers)
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match", "")
+    tags = {tag.strip() for tag in if_none_match.split(",")}
+    return etag in tags or if_none_match.strip() == "*"
+
+
+def _send_image(sha256: str, request: Request, original: bool = False) -> Response:
+    sha256 = sha256.lower()
+    if not SHA256_RE.match(sha256):
+        raise HTTPException(status_code=400, detail="Invalid image hash.")
+
+    etag = f'"{sha256}{"-original" if original else ""}"'
+    headers = {"etag": etag, "cache-control": CACHE_CONTROL}
+
+    # Revalidation needs only an existence check (a HEAD on the object
+    # store), never the bytes
+    if _not_modified(request, etag):
+        if not image_exists(sha256, original):
+            raise HTTPException(status_code=404, detail="Image not found.")
+        retention.touch(sha256)
+        return Response(status_code=304, headers=headers)
+
+    if not get_store().has_local_paths:
+        data = load_image(sha256, original)  # a single GET
+        if data is None:
+            raise HTTPException(status_code=404, detail="Image not found.")
+        retention.touch(sha256)
+        return _send_bytes(data, request, headers)
+
+    filepath = find_image(sha256, original)
+    if filepath is None:
+        raise HTTPException(status_code=404, detail="Image not found.")
+    retention.touch(sha256)
+
+    with filepath.open("rb") as f:
+        media_type = sniff_content_type(f.read(8)) or "application/octet-stream"
+
+    # FileResponse handles Range/If-Range and uses zero-copy sending
+    # (http.response.pathsend) when the server supports it
+    return FileResponse(filepath, media_type=media_type, headers=headers)
+
+
+@router.get("/images/{sha256}")
+def get_image(sha256: str, request: Request):
+    return _send_image(sha256, request)
+
+
+@router.get("/images/{sha256}/original")
+def get_original_image(sha256: str, request: Request):
+    """The uploaded file behind a thumbnail, when KEEP_ORIGINALS is on."""
+    return _send_image(sha256, request, original=True)
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import logging
+from datetime import datetime
+
+from fastapi import APIRouter, HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from app.api.analyze import _image_url, _original_url, analyze_and_store
+from app.config import settings
+from app.database import SessionLocal
+from app.models.job import AnalysisJob
+from app.schemas.job import JobStatus
+from app.schemas.scan import AnalysisResponse
+from app.services import job_queue
+from app.services.pipeline import InvalidImageError
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+def _iso(value: datetime | None) -> str | None:
+    return value.isoformat() if value else None
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+def get_job(job_id: str):
+    found = job_queue.get(job_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    job, position = found
+    return JobStatus(
+        job_id=job.id,
+        status=job.status,
+        image_name=job.image_name,
+        created_at=_iso(job.created_at),
+        started_at=_iso(job.started_at),
+        finished_at=_iso(job.finished_at),
+        attempts=job.attempts,
+        queue_position=position,
+        error=job.error,
+        result=json.loads(job.result_json) if job.result_json else None,
+    )
+
+
+# ---------- Workers ----------
+
+_workers: list[asyncio.Task] = []
+
+
+async def _heartbeat(job: AnalysisJob) -> None:
+    """Renew the job's lease while it runs, so a slow analysis is not
+    handed to a second worker."""
+    while True:
+        await asyncio.sleep(settings.job_lease_s / 3)
+        try:
+            if not await run_in_threadpool(job_queue.renew, job):
+                logger.warning("Job %s: lease taken over by another worker", job.id)
+                return
+        except Exception as e:
+            logger.warning("Cannot renew the lease of job %s: %s", job.id, e)
+
+
+async def _run_job(job: AnalysisJob) -> None:
+    heartbeat = asyncio.create_task(_heartbeat(job), name=f"job-lease-{job.id}")
+    try:
+        await _analyze_job(job)
+    finally:
+        heartbeat.cancel()
+
+
+async def _analyze_job(job: AnalysisJob) -> None:
+    try:
+        data = await run_in_threadpool(job_queue.upload_path(job).read_bytes)
+    except FileNotFoundError:
+        await run_in_threadpool(job_queue.fail, job, "Upload is missing.")
+        return
+
+    db = SessionLocal()
+    try:
+        scan_id, now, result = await analyze_and_store(
+            db, data, job.image_name, job.content_sha256
+        )
+    except InvalidImageError as e:
+        await run_in_threadpool(job_queue.fail, job, f"Invalid image file: {e}")
+        return
+    except asyncio.CancelledError:
+        # Shutting down: back to the queue without using up an attempt
+        await asyncio.shield(run_in_threadpool(job_queue.release, job, count_attempt=False))
+        raise
+    except Exception as e:
+        logger.exception("Job %s failed (attempt %d)", job.id, job.attempts)
+        if job.attempts >= settings.job_max_attempts:
+            await run_in_threadpool(job_queue.fail, job, str(e))
+        else:
+            await run_in_threadpool(job_queue.release, job, str(e))
+        return
+    finally:
+        db.close()
+
+    response = AnalysisResponse(
+        scan_id=scan_id,
+        image_name=job.image_name,
+        timestamp=now.isoformat(),
+        original_image_url=_original_url(result["sha256_hash"]),
+        thumbnail_url=_image_url(result["sha256_hash"]),
+        **result,
+    ).model_dump(exclude={"original_image_base64"})
+    if not await run_in_threadpool(job_queue.complete, job, scan_id, response):
+        logger.warning(
+            "Job %s finished after another worker took it over; scan %d is a duplicate",
+            job.id, scan_id,
+        )
+
+
+async def _worker() -> None:
+    while True:
+        try:
+            job = await run_in_threadpool(job_queue.claim)
+        except Exception as e:
+            logger.warning("Cannot claim a job: %s", e)
+            job = None
+        if job is None:
+            await job_queue.wait_for_work(settings.job_poll_interval_s)
+            continue
+
+        if job.attempts > settings.job_max_attempts:
+            # Leases kept expiring, e.g. the process crashed on this upload
+            await run_in_threadpool(
+                job_queue.fail, job, f"Gave up after {job.attempts - 1} attempts."
+            )
+            continue
+        await _run_job(job)
+
+
+def start_job_workers() -> None:
+    """Start this process's job workers (call from the event loop)."""
+    for i in range(settings.job_workers):
+        _workers.append(asyncio.create_task(_worker(), name=f"job-worker-{i}"))
+    if _workers:
+        logger.info("Started %d job workers", len(_workers))
+
+
+async def stop_job_workers() -> None:
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    job_queue.reset_wakeup()
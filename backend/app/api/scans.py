@@ -1,44 +1,386 @@
-from fastapi import APIRouter, Depends, Query
+import base64
+import csv
+import io
+import json
+from collections.abc import Iterator
+from datetime import datetime, timezone
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy import func, select, tuple_
 from sqlalchemy.orm import Session
 
-from app.database import get_db
-from app.models.scan import Scan
-from app.schemas.scan import ScanListResponse, ScanSummary
+from app.config import settings
+from app.database import engine, get_db
+from app.models.counter import read_counter
+from app.models.scan import SCAN_COUNTER, Scan
+from app.schemas.scan import (
+    ScanListResponse, ScanSummary, SimilarScan, SimilarScansResponse, VideoTimeline,
+)
+from app.services import retention
+from app.services.ela_analyzer import get_or_render_heatmap
+from app.services.metadata_archive import PackReader
+from app.services.metadata_extractor import SUSPICIOUS_SOFTWARE
+from app.services.metrics import DB_QUERY_SECONDS
+from app.services.similarity_index import MAX_DISTANCE, similarity_index
 
 router = APIRouter()
 
 
+# Only what ScanSummary needs; notably not the large metadata_json column
+SUMMARY_COLUMNS = (
+    Scan.id,
+    Scan.image_name,
+    Scan.sha256_hash,
+    Scan.timestamp,
+    Scan.verdict,
+    Scan.manipulation_score,
+    Scan.software_detected,
+    Scan.ela_mean,
+    Scan.ai_score,
+    Scan.has_exif,
+    Scan.camera_make,
+    Scan.camera_model,
+    Scan.date_taken,
+    Scan.media_type,
+    Scan.duration_s,
+)
+
+
+def encode_cursor(timestamp: datetime | None, scan_id: int) -> str:
+    raw = f"{timestamp.isoformat() if timestamp else ''}|{scan_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime | None, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, scan_id = raw.rsplit("|", 1)
+        return (datetime.fromisoformat(ts) if ts else None), int(scan_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+def _summary_fields(row) -> dict:
+    return {
+        "scan_id": row.id,
+        "image_name": row.image_name,
+        "sha256_hash": row.sha256_hash,
+        "timestamp": row.timestamp.isoformat() if row.timestamp else "",
+        "verdict": row.verdict,
+        "manipulation_score": row.manipulation_score,
+        "software_detected": row.software_detected,
+        "ela_mean": row.ela_mean,
+        "ai_score": row.ai_score,
+        "has_exif": row.has_exif,
+        "camera_make": row.camera_make,
+        "camera_model": row.camera_model,
+        "date_taken": row.date_taken.isoformat() if row.date_taken else None,
+        "media_type": row.media_type or "image",
+        "duration_s": row.duration_s,
+    }
+
+
+def _summary(row, model: type[ScanSummary] = ScanSummary, **extra) -> ScanSummary:
+    return model(**_summary_fields(row), **extra)
+
+
+def _naive_utc(value: datetime | None) -> datetime | None:
+    """Timestamps are stored as naive UTC; normalise aware query values."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _prefix(value: str) -> str:
+    """LIKE pattern for a case-insensitive prefix match (wildcards escaped)."""
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+
+def scan_filters(
+    verdict: str | None = Query(default=None),
+    min_score: float | None = Query(default=None, ge=0, le=100),
+    max_score: float | None = Query(default=None, ge=0, le=100),
+    since: datetime | None = Query(default=None, description="Scanned at or after (UTC)"),
+    until: datetime | None = Query(default=None, description="Scanned before (UTC)"),
+    software: str | None = Query(default=None, description="Software tag prefix, case-insensitive"),
+    edited_with: str | None = Query(
+        default=None, description=f"Editing tool family: {', '.join(SUSPICIOUS_SOFTWARE)}"
+    ),
+    camera_make: str | None = Query(default=None, description="Prefix, case-insensitive"),
+    camera_model: str | None = Query(default=None, description="Prefix, case-insensitive"),
+    has_exif: bool | None = Query(default=None),
+) -> list:
+    """WHERE clauses for the history filters (a dependency shared by the
+    listing and the export); each is served by an index."""
+    since, until = _naive_utc(since), _naive_utc(until)
+    clauses = []
+    if verdict is not None:
+        clauses.append(Scan.verdict == verdict)
+    if min_score is not None:
+        clauses.append(Scan.manipulation_score >= min_score)
+    if max_score is not None:
+        clauses.append(Scan.manipulation_score <= max_score)
+    if since is not None:
+        clauses.append(Scan.timestamp >= since)
+    if until is not None:
+        clauses.append(Scan.timestamp < until)
+    if software:
+        clauses.append(Scan.software_detected.like(_prefix(software), escape="\\"))
+    if edited_with is not None:
+        clauses.append(Scan.editing_software == edited_with.lower())
+    if camera_make:
+        clauses.append(Scan.camera_make.like(_prefix(camera_make), escape="\\"))
+    if camera_model:
+        clauses.append(Scan.camera_model.like(_prefix(camera_model), escape="\\"))
+    if has_exif is not None:
+        clauses.append(Scan.has_exif == has_exif)
+    return clauses
+
+
 @router.get("/scans", response_model=ScanListResponse)
 def list_scans(
     limit: int = Query(default=50, ge=1, le=200),
     offset: int = Query(default=0, ge=0),
+    cursor: str | None = Query(
+        default=None, description="next_cursor from the previous page (overrides offset)"
+    ),
+    clauses: list = Depends(scan_filters),
     db: Session = Depends(get_db),
 ):
-    total = db.query(Scan).count()
-    scans = (
-        db.query(Scan)
-        .order_by(Scan.timestamp.desc())
-        .offset(offset)
-        .limit(limit)
-        .all()
+    if clauses:
+        with DB_QUERY_SECONDS.time("list_scans_count"):
+            total = db.scalar(select(func.count()).select_from(Scan).where(*clauses))
+    else:
+        with DB_QUERY_SECONDS.time("list_scans_total"):
+            total = read_counter(db.connection(), SCAN_COUNTER)
+            if total is None:
+                total = db.query(Scan).count()
+
+    stmt = (
+        select(*SUMMARY_COLUMNS)
+        .where(*clauses)
+        .order_by(Scan.timestamp.desc(), Scan.id.desc())
     )
+    if cursor is not None:
+        ts, scan_id = decode_cursor(cursor)
+        if ts is None:
+            # NULL timestamps sort last in DESC order on SQLite
+            stmt = stmt.where(Scan.timestamp.is_(None), Scan.id < scan_id)
+        else:
+            # Row-value comparison is a range SEARCH on ix_scans_timestamp_id.
+            # timestamp always has a default, so NULL rows are not expected.
+            stmt = stmt.where(tuple_(Scan.timestamp, Scan.id) < (ts, scan_id))
+    elif offset:
+        stmt = stmt.offset(offset)
+
+    # One extra row tells us whether there is a next page
+    with DB_QUERY_SECONDS.time("list_scans_page"):
+        rows = db.execute(stmt.limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
 
     return ScanListResponse(
         total=total,
         limit=limit,
         offset=offset,
-        scans=[
-            ScanSummary(
-                scan_id=s.id,
-                image_name=s.image_name,
-                sha256_hash=s.sha256_hash,
-                timestamp=s.timestamp.isoformat() if s.timestamp else "",
-                verdict=s.verdict,
-                manipulation_score=s.manipulation_score,
-                software_detected=s.software_detected,
-                ela_mean=s.ela_mean,
-                ai_score=s.ai_score,
-            )
-            for s in scans
+        next_cursor=next_cursor,
+        scans=[_summary(row) for row in rows],
+    )
+
+
+# ---------- Export ----------
+
+EXPORT_COLUMNS = SUMMARY_COLUMNS + (Scan.content_sha256, Scan.file_size)
+EXPORT_FIELDS = [*ScanSummary.model_fields, "content_sha256", "file_size"]
+EXPORT_MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+_TIMESTAMP = EXPORT_FIELDS.index("timestamp")
+_DATE_TAKEN = EXPORT_FIELDS.index("date_taken")
+_MEDIA_TYPE = EXPORT_FIELDS.index("media_type")
+
+
+def _export_values(row) -> list:
+    """_summary_fields by position (EXPORT_COLUMNS order): attribute access
+    on millions of rows costs more than everything else in the export."""
+    values = list(row)
+    values[_TIMESTAMP] = values[_TIMESTAMP].isoformat() if values[_TIMESTAMP] else ""
+    if values[_DATE_TAKEN] is not None:
+        values[_DATE_TAKEN] = values[_DATE_TAKEN].isoformat()
+    values[_MEDIA_TYPE] = values[_MEDIA_TYPE] or "image"
+    return values
+
+
+def _csv_chunk(rows) -> str:
+    buffer = io.StringIO()
+    # With include_metadata the JSON document is the last cell
+    csv.writer(buffer).writerows(map(_export_values, rows))
+    return buffer.getvalue()
+
+
+def _csv_header(include_metadata: bool) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(EXPORT_FIELDS + (["metadata"] if include_metadata else []))
+    return buffer.getvalue()
+
+
+def _ndjson_chunk(rows, include_metadata: bool) -> str:
+    lines = []
+    dumps = json.dumps
+    for row in rows:
+        values = _export_values(row)
+        if include_metadata:
+            # metadata_json is already JSON: splice it in instead of
+            # parsing and re-serializing it for every row
+            metadata = values.pop() or "null"
+            line = dumps(dict(zip(EXPORT_FIELDS, values)))
+            line = f'{line[:-1]}, "metadata": {metadata}}}'
+        else:
+            line = dumps(dict(zip(EXPORT_FIELDS, values)))
+        lines.append(line)
+    lines.append("")
+    return "\n".join(lines)
+
+
+def _unarchived(row, archive: PackReader) -> tuple:
+    """(export columns..., metadata JSON), the metadata read back from its
+    monthly pack if retention archived it."""
+    *values, metadata, month = row
+    if metadata is None and month is not None:
+        metadata = archive.get(month, row.timestamp, row.id)
+    return (*values, metadata)
+
+
+def _export_rows(clauses: list, fmt: str, include_metadata: bool) -> Iterator[str]:
+    """Stream the matching scans oldest first, ``export_chunk_size`` rows at
+    a time, from one cursor over one consistent snapshot."""
+    if fmt == "csv":
+        yield _csv_header(include_metadata)
+
+    columns = EXPORT_COLUMNS
+    if include_metadata:
+        columns += (Scan.metadata_json, Scan.metadata_archive)
+    stmt = select(*columns).where(*clauses).order_by(Scan.timestamp, Scan.id)
+    archive = PackReader()
+    # Its own connection: the response body is produced after the endpoint
+    # (and its get_db session) has returned
+    with engine.connect() as conn:
+        result = conn.execution_options(
+            stream_results=True, yield_per=settings.export_chunk_size
+        ).execute(stmt)
+        try:
+            for rows in result.partitions():
+                if include_metadata:
+                    rows = [_unarchived(row, archive) for row in rows]
+                yield _csv_chunk(rows) if fmt == "csv" else _ndjson_chunk(rows, include_metadata)
+        finally:
+            archive.close()
+
+
+@router.get("/scans/export")
+def export_scans(
+    fmt: Literal["csv", "ndjson"] = Query(default="csv", alias="format"),
+    include_metadata: bool = Query(
+        default=False, description="Add each scan's full metadata document"
+    ),
+    clauses: list = Depends(scan_filters),
+):
+    """The full scan history matching the listing's filters, streamed as
+    CSV or NDJSON without paging. Memory use does not depend on its size."""
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    return StreamingResponse(
+        _export_rows(clauses, fmt, include_metadata),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"content-disposition": f'attachment; filename="scans-{stamp}.{fmt}"'},
+    )
+
+
+@router.get("/scans/similar", response_model=SimilarScansResponse)
+def similar_scans(
+    scan_id: int = Query(...),
+    max_distance: int = Query(default=10, ge=0, le=MAX_DISTANCE),
+    hash_kind: Literal["phash", "dhash"] = Query(default="phash", alias="hash"),
+    limit: int = Query(default=50, ge=1, le=200),
+    db: Session = Depends(get_db),
+):
+    """Past scans whose perceptual hash is within ``max_distance`` bits of
+    this scan's: re-encoded, resized or lightly cropped copies."""
+    if not similarity_index.ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Similarity index is still loading.",
+            headers={"retry-after": "5"},
+        )
+    row = db.execute(select(Scan.phash, Scan.dhash).where(Scan.id == scan_id)).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Scan not found.")
+    value = getattr(row, hash_kind)
+    if value is None:
+        raise HTTPException(status_code=409, detail="Scan has not been hashed yet.")
+
+    matches = [
+        (match_id, distance)
+        for match_id, distance in similarity_index.query(hash_kind, value, max_distance)
+        if match_id != scan_id
+    ][:limit]
+    rows = db.execute(
+        select(*SUMMARY_COLUMNS).where(Scan.id.in_([match_id for match_id, _ in matches]))
+    ).all()
+    by_id = {r.id: r for r in rows}
+
+    return SimilarScansResponse(
+        scan_id=scan_id,
+        hash=hash_kind,
+        max_distance=max_distance,
+        matches=[
+            _summary(by_id[match_id], SimilarScan, distance=distance)
+            for match_id, distance in matches
+            if match_id in by_id
         ],
     )
+
+
+@router.get("/scans/{scan_id}/timeline", response_model=VideoTimeline)
+def get_scan_timeline(scan_id: int, db: Session = Depends(get_db)):
+    """Per-frame scores of a video scan."""
+    timeline = db.scalar(select(Scan.timeline_json).where(Scan.id == scan_id))
+    if timeline is None:
+        if db.get(Scan, scan_id) is None:
+            raise HTTPException(status_code=404, detail="Scan not found.")
+        raise HTTPException(status_code=404, detail="Scan is not a video scan.")
+    return VideoTimeline(**json.loads(timeline))
+
+
+@router.get("/scans/{scan_id}/ela")
+def get_scan_ela(scan_id: int, db: Session = Depends(get_db)):
+    """ELA heatmap PNG for a scan. ``X-ELA-Source`` says what it shows:
+    ``upload`` (the analyzed image itself) or, for scans stored before
+    heatmaps were kept, ``thumbnail`` -- the stored 512px JPEG, so its own
+    re-compression shows up too."""
+    scan = db.get(Scan, scan_id)
+    if scan is None:
+        raise HTTPException(status_code=404, detail="Scan not found.")
+
+    found = get_or_render_heatmap(scan.sha256_hash)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Stored image not found.")
+    path, source = found
+    retention.touch(scan.sha256_hash)
+
+    return FileResponse(
+        path,
+        media_type="image/png",
+        headers={
+            "etag": f'"{path.stem}"',
+            # A thumbnail heatmap is replaced if the upload is analyzed again
+            "cache-control": "public, max-age=31536000, immutable"
+            if source == "upload"
+            else "no-cache",
+            "x-ela-source": source,
+        },
+    )
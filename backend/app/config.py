@@ -1,15 +1,116 @@
 from pathlib import Path
+from typing import Literal
+
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     database_url: str = "sqlite:///./visionguard.db"
+    db_pool_size: int = 8
+    db_max_overflow: int = 8
+    # SQLite connection pragmas (WAL journaling is always enabled for file databases)
+    sqlite_synchronous: Literal["OFF", "NORMAL", "FULL"] = "NORMAL"  # NORMAL is safe with WAL
+    sqlite_cache_size_kb: int = 64 * 1024
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_busy_timeout_ms: int = 5000
+    # "write_behind" queues new scan rows and commits them in grouped transactions
+    scan_write_mode: Literal["immediate", "write_behind"] = "immediate"
+    scan_write_batch_size: int = 64
+    scan_write_max_wait_ms: float = 10.0
     upload_dir: Path = Path("./uploads")
+    # Image storage: "local" (sharded under upload_dir) or an S3-compatible
+    # "object" store; a file:// endpoint uses a directory-backed stand-in
+    storage_backend: Literal["local", "object"] = "local"
+    storage_bucket: str = "visionguard"
+    storage_prefix: str = ""
+    storage_endpoint_url: str | None = None
+    keep_originals: bool = False  # also store the uploaded file next to its thumbnail
     max_file_size: int = 2 * 1024 * 1024  # 2MB
+    # Large-image mode: DCT-scaled JPEG decoding for the working copies and
+    # tiled full-resolution ELA, so much bigger uploads can be accepted
+    large_image_mode: bool = False
+    large_image_max_file_size: int = 40 * 1024 * 1024
+    large_image_max_pixels: int = 50_000_000  # bounds the full decode ELA needs
+    ela_tile_size: int = 1024  # rounded down to a multiple of 16 (JPEG MCU)
     model_path: Path = Path("./models/Meso4_DF.pth")
+    # POST /api/analyze/video: MP4/WebM spooled to disk and decoded frame by
+    # frame; sampled frames go through ELA and AI detection in batches
+    video_max_file_size: int = 200 * 1024 * 1024
+    video_max_duration_s: float = 600.0
+    video_sample_mode: Literal["stride", "scene"] = "stride"
+    video_frame_stride_s: float = 1.0  # stride mode; snaps to keyframes when it can
+    video_scene_threshold: float = 30.0  # mean |luma diff| (0-255) between frames = a cut
+    video_scene_max_gap_s: float = 10.0  # scene mode still samples long shots this often
+    video_max_frames: int = 120  # the stride widens for longer clips
+    video_batch_size: int = 8
+    # Read EXIF by walking JPEG markers / PNG chunks instead of opening with Pillow
+    metadata_fast_path: bool = True
+    # Where CPU-bound analysis runs: on the event loop, a thread or a process pool
+    analysis_executor: Literal["inline", "thread", "process"] = "thread"
+    analysis_workers: int = 0  # 0 = one per core of this web worker's share
+    # CPU thread budget (app/services/thread_budget.py): cores shared by the
+    # web workers, analyses run at once per worker, native threads per analysis
+    cpu_budget: int = 0  # 0 = all cores available to the process
+    web_concurrency: int = 1  # web worker processes (the variable uvicorn --workers reads)
+    analysis_concurrency: int = 0  # thread executor; 0 = one per core of the share
+    library_threads: int = 0  # torch/OpenCV/BLAS threads per analysis; 0 = derived
+    # Result cache for identical uploads (in-memory LRU + analysis_cache table)
+    result_cache_enabled: bool = True
+    result_cache_size: int = 1024
+    # On a cache hit record a full duplicate "scan" row or a lightweight "sighting"
+    duplicate_scan_mode: Literal["scan", "sighting"] = "scan"
+    # POST /api/analyze/batch
+    batch_max_files: int = 1000
+    batch_concurrency: int = 4
+    batch_commit_size: int = 50  # max Scan rows per transaction
+    # GET /api/scans/export: rows fetched from the cursor and written per chunk
+    export_chunk_size: int = 1000
+    # Asynchronous jobs (POST /api/analyze?async=true, GET /api/jobs/{id})
+    job_workers: int = 2  # per API process; 0 = never process jobs here
+    job_max_attempts: int = 3
+    job_lease_s: float = 300.0  # a running job not finished by then is retried
+    job_poll_interval_s: float = 1.0  # for jobs queued by other processes
+    # AI detection stage. Off by default; the score then uses metadata + ELA only
+    ai_detection_enabled: bool = False
+    # Load (and warm up) the model at startup, in the background; the process
+    # reports ready once it is loaded. Otherwise the first analysis loads it
+    preload_model: bool = False
+    # "optimized" = BN-folded, traced/frozen MesoNet with OpenCV preprocessing
+    inference_engine: Literal["eager", "optimized"] = "optimized"
+    inference_quantize: bool = False  # dynamic int8 for the Linear layers
+    inference_channels_last: bool = False
+    inference_warmup_runs: int = 3
+    # Max |prob diff| vs the eager model before falling back to eager (-1 = skip check)
+    inference_parity_atol: float = 1e-3
+    # MesoNet micro-batching across concurrent requests (1 = disabled)
+    inference_max_batch_size: int = 8
+    inference_max_wait_ms: float = 5.0
+    # Retention (app/services/retention.py): a background job evicts stored
+    # images past an age or over a disk quota, deletes expired scans and
+    # archives old metadata into monthly packs, a small batch at a time.
+    # Each policy is off at 0
+    image_max_age_days: float = 0.0  # since last use (lru) or since stored (oldest)
+    image_quota_bytes: int = 0  # stored thumbnails, evicted down to the quota
+    image_eviction_policy: Literal["lru", "oldest"] = "lru"
+    scan_max_age_days: float = 0.0  # deletes the scans, their sightings and images
+    metadata_archive_after_days: float = 0.0
+    metadata_archive_dir: Path | None = None  # None = <upload_dir>/archive
+    retention_interval_s: float = 3600.0
+    retention_batch_size: int = 200  # rows per transaction
+    retention_batch_pause_s: float = 0.05  # between transactions, so analyses can write
+    retention_vacuum_pages: int = 1000  # SQLite pages returned to the OS per step
+    # Shared directory for per-worker metric snapshots (multi-worker /metrics)
+    metrics_dir: Path | None = None
+    metrics_flush_interval_s: float = 1.0
     cors_origins: list[str] = ["https://vision-guard-sp.vercel.app"]
 
     model_config = {"env_file": ".env", "env_file_encoding": "utf-8"}
 
+    @property
+    def upload_size_limit(self) -> int:
+        if self.large_image_mode:
+            return max(self.max_file_size, self.large_image_max_file_size)
+        return self.max_file_size
+
 
 settings = Settings()
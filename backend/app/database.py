@@ -1,12 +1,65 @@
-from sqlalchemy import create_engine
+import logging
+
+from sqlalchemy import create_engine, event, inspect, make_url, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
 from app.config import settings
 
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False},  # SQLite only
-)
+logger = logging.getLogger(__name__)
+
+
+def _sqlite_pragmas() -> list[str]:
+    return [
+        # Lets retention return freed pages to the OS in small steps. Only
+        # takes effect on a new database file (existing ones need a VACUUM)
+        "PRAGMA auto_vacuum=INCREMENTAL",
+        "PRAGMA journal_mode=WAL",  # readers no longer block behind a writer
+        f"PRAGMA synchronous={settings.sqlite_synchronous}",
+        f"PRAGMA cache_size=-{settings.sqlite_cache_size_kb}",
+        f"PRAGMA mmap_size={settings.sqlite_mmap_size}",
+        f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+
+def _create_engine(url: str) -> Engine:
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite":
+        return create_engine(
+            url,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_pre_ping=True,
+        )
+
+    if parsed.database in (None, "", ":memory:"):
+        # In-memory database: nothing to journal, keep the default pool
+        return create_engine(url, connect_args={"check_same_thread": False})
+
+    sqlite_engine = create_engine(
+        url,
+        connect_args={
+            "check_same_thread": False,
+            "timeout": settings.sqlite_busy_timeout_ms / 1000,
+        },
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+    )
+
+    @event.listens_for(sqlite_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in _sqlite_pragmas():
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    return sqlite_engine
+
+
+engine = _create_engine(settings.database_url)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
@@ -22,5 +75,39 @@ def get_db():
         db.close()
 
 
+def _add_missing_columns():
+    """Additive migration: create columns/indexes that newer models declare
+    but an existing database file predates. create_all() skips tables that
+    already exist, so without this old databases would fail on new columns."""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(
+                    text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {col_type}')
+                )
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+
 def init_db():
+    from app.models.counter import seed_counter
+    from app.models.scan import SCAN_COUNTER, Scan, backfill_metadata_columns
+    from app.models.storage import backfill_stored_images
+
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    with engine.begin() as conn:
+        seed_counter(conn, SCAN_COUNTER, Scan.__table__)
+        backfilled = backfill_metadata_columns(conn)
+        ledger = backfill_stored_images(conn, Scan.__table__)
+    if backfilled:
+        logger.info("Backfilled promoted metadata columns for %d scans", backfilled)
+    if ledger:
+        logger.info("Recorded %d stored images for retention", ledger)
@@ -1,12 +1,23 @@
 import logging
+import threading
+from concurrent.futures import Future, wait
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import settings
 from app.database import init_db
 from app.api.analyze import router as analyze_router
 from app.api.scans import router as scans_router
+from app.api.images import router as images_router
+from app.api.jobs import router as jobs_router, start_job_workers, stop_job_workers
+from app.services import retention, scan_writer, thread_budget
+from app.services.image_storage import LocalImageStore, get_store
+from app.services.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, registry
+from app.services.pipeline import load_detector
+from app.services.similarity_index import backfill_missing_hashes, similarity_index
+from app.services.worker_pool import start_pool, shutdown_pool
+from app.startup import report as startup_report
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -25,15 +36,110 @@ app.add_middleware(
 # Routers
 app.include_router(analyze_router, prefix="/api")
 app.include_router(scans_router, prefix="/api")
+app.include_router(images_router, prefix="/api")
+app.include_router(jobs_router, prefix="/api")
+
+
+def _preload_model(warmups: list[Future]) -> None:
+    """Load the model (here, or in every pool worker) off the startup
+    path; the process reports ready once it is loaded."""
+    startup_report.wait_for("model")
+
+    def load():
+        try:
+            if warmups:
+                wait(warmups)
+            else:
+                load_detector()
+        finally:
+            startup_report.component_ready("model")
+
+    threading.Thread(target=load, name="model-preload", daemon=True).start()
+
+
+def _load_similarity_index() -> None:
+    def load():
+        try:
+            with startup_report.phase("similarity_index"):
+                similarity_index.rebuild()
+        except Exception:
+            logger.exception("Building the similarity index failed")
+
+    threading.Thread(target=load, name="similarity-index", daemon=True).start()
 
 
 @app.on_event("startup")
 def on_startup():
-    init_db()
-    settings.upload_dir.mkdir(parents=True, exist_ok=True)
+    with startup_report.phase("db_init"):
+        init_db()
+        settings.upload_dir.mkdir(parents=True, exist_ok=True)
+    # Loading the index takes seconds per million scans, so it does not hold
+    # up readiness: /scans/similar answers 503 until it is loaded
+    _load_similarity_index()
+    store = get_store()
+    if isinstance(store, LocalImageStore):
+        # Files stored before sharding move into their shard directories
+        threading.Thread(target=store.migrate_flat_layout, name="storage-migrate", daemon=True).start()
+    # Scans from before perceptual hashing are hashed from their stored images
+    threading.Thread(target=backfill_missing_hashes, name="phash-backfill", daemon=True).start()
+    registry.start_flusher()
+    thread_budget.apply()
+    logger.info("Thread budget: %s", thread_budget.get_budget())
+    retention.start()
+    warmups = start_pool()
+    if settings.preload_model and settings.ai_detection_enabled:
+        _preload_model(warmups)
     logger.info("VisionGuard API started. Database initialized.")
+    startup_report.startup_complete()
+
+
+@app.on_event("startup")
+async def on_startup_jobs():
+    start_job_workers()
+
+
+@app.on_event("shutdown")
+async def on_shutdown_jobs():
+    # Before the scan writer closes: interrupted jobs go back to the queue
+    await stop_job_workers()
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    retention.stop()
+    scan_writer.close()  # flush queued scan rows before exiting
+    shutdown_pool()
 
 
 @app.get("/health")
 def health():
-    return {"status": "ok", "service": "VisionGuard"}
+    return {"status": "ok", "service": "VisionGuard", "ready": startup_report.ready}
+
+
+@app.get("/health/live")
+def health_live():
+    """The process is up and serving (liveness probe)."""
+    return {"status": "ok"}
+
+
+@app.get("/health/ready")
+def health_ready(response: Response):
+    """Startup is done and the model, if preloaded, is loaded (readiness probe)."""
+    if not startup_report.ready:
+        response.status_code = 503
+        return {"status": "starting", "pending": startup_report.pending}
+    return {"status": "ready"}
+
+
+@app.get("/health/startup")
+def health_startup():
+    """Startup timing report (import time per module, startup phases) and
+    the CPU thread budget."""
+    return {**startup_report.as_dict(), "thread_budget": thread_budget.describe()}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus text exposition, merged across workers when
+    ``METRICS_DIR`` is set."""
+    return Response(registry.render(), media_type=METRICS_CONTENT_TYPE)
@@ -0,0 +1,17 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, DateTime, Integer, String, Text
+
+from app.database import Base
+
+
+class AnalysisCacheEntry(Base):
+    """Persistent tier of the result cache, keyed on content hash + analysis version."""
+
+    __tablename__ = "analysis_cache"
+
+    cache_key = Column(String(128), primary_key=True)
+    content_sha256 = Column(String(64), nullable=False, index=True)
+    scan_id = Column(Integer, nullable=False)
+    response_json = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, func, select, update
+from sqlalchemy.engine import Connection
+
+from app.database import Base
+
+
+class Counter(Base):
+    """Maintained row counts, so hot paths never need a COUNT(*)."""
+
+    __tablename__ = "counters"
+
+    name = Column(String(64), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+
+def adjust_counter(conn: Connection, name: str, delta: int) -> None:
+    conn.execute(
+        update(Counter.__table__)
+        .where(Counter.name == name)
+        .values(value=Counter.value + delta)
+    )
+
+
+def read_counter(conn: Connection, name: str) -> int | None:
+    return conn.execute(select(Counter.value).where(Counter.name == name)).scalar()
+
+
+def seed_counter(conn: Connection, name: str, table) -> None:
+    """Create the counter from a one-off COUNT(*) if it does not exist yet."""
+    if read_counter(conn, name) is not None:
+        return
+    total = conn.execute(select(func.count()).select_from(table)).scalar() or 0
+    conn.execute(Counter.__table__.insert().values(name=name, value=total))
@@ -0,0 +1,42 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text
+
+from app.database import Base
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class AnalysisJob(Base):
+    """An upload waiting for (or done with) asynchronous analysis.
+
+    The upload itself lives in ``<upload_dir>/jobs/<upload_name>`` until the
+    job finishes. ``lease_expires_at`` bounds how long a claimed job may
+    stay ``running``; after that another worker may claim it again, so
+    jobs held by a crashed process are retried.
+    """
+
+    __tablename__ = "analysis_jobs"
+
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+    status = Column(String(16), nullable=False, default=JOB_QUEUED)
+    image_name = Column(String(255), nullable=False)
+    content_type = Column(String(64), nullable=True)
+    content_sha256 = Column(String(64), nullable=False)
+    upload_name = Column(String(64), nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    scan_id = Column(Integer, nullable=True)
+    result_json = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Claiming takes the oldest queued job (or expired lease) in order
+        Index("ix_analysis_jobs_status_created", "status", "created_at"),
+    )
@@ -1,8 +1,18 @@
+import json
 from datetime import datetime, timezone
 
-from sqlalchemy import Column, DateTime, Float, Integer, String, Text
+from sqlalchemy import (
+    BigInteger, Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, String, Text,
+    bindparam, event, literal_column, select, update,
+)
+from sqlalchemy.engine import Connection
 
 from app.database import Base
+from app.models.counter import adjust_counter
+from app.models.storage import StoredImage, record_stored_image
+from app.services.metadata_extractor import promoted_metadata
+
+SCAN_COUNTER = "scans"
 
 
 class Scan(Base):
@@ -11,11 +21,114 @@ class Scan(Base):
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     image_name = Column(String(255), nullable=False)
     sha256_hash = Column(String(64), nullable=False, index=True)
+    # Hash of the uploaded bytes (sha256_hash covers the stored thumbnail)
+    content_sha256 = Column(String(64), nullable=True, index=True)
     file_size = Column(Integer, nullable=False)
     timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     verdict = Column(String(50), nullable=False)
     manipulation_score = Column(Float, nullable=False)
     metadata_json = Column(Text, nullable=True)
+    # Month ("YYYY-MM") of the pack metadata_json was archived to (then NULL)
+    metadata_archive = Column(String(7), nullable=True)
     software_detected = Column(String(255), nullable=True)
     ela_mean = Column(Float, nullable=True)
     ai_score = Column(Float, nullable=True)
+    # Promoted from metadata_json for filtering (see promoted_metadata)
+    has_exif = Column(Boolean, nullable=True)
+    camera_make = Column(String(255), nullable=True)
+    camera_model = Column(String(255), nullable=True)
+    editing_software = Column(String(50), nullable=True)  # SUSPICIOUS_SOFTWARE family
+    date_taken = Column(DateTime, nullable=True, index=True)
+    # 64-bit perceptual hashes (signed) of the analysis thumbnail; searched
+    # through the in-memory similarity index rather than SQL
+    phash = Column(BigInteger, nullable=True)
+    dhash = Column(BigInteger, nullable=True)
+    # Video scans (POST /api/analyze/video). The stored image is the
+    # highest-scoring sampled frame; NULL media_type means an image
+    media_type = Column(String(16), nullable=True)
+    duration_s = Column(Float, nullable=True)
+    frames_analyzed = Column(Integer, nullable=True)
+    timeline_json = Column(Text, nullable=True)  # per-frame scores and segments
+
+    __table_args__ = (
+        # Keyset pagination for history: ORDER BY timestamp DESC, id DESC
+        Index("ix_scans_timestamp_id", "timestamp", "id"),
+        # Equality filters that keep the history order without a sort
+        Index("ix_scans_verdict_timestamp", "verdict", "timestamp", "id"),
+        Index("ix_scans_has_exif_timestamp", "has_exif", "timestamp", "id"),
+        Index("ix_scans_editing_software_timestamp", "editing_software", "timestamp", "id"),
+        Index("ix_scans_manipulation_score", "manipulation_score"),
+        # Case-insensitive prefix filters (SQLite LIKE 'x%' uses NOCASE indexes)
+        Index("ix_scans_software_nocase", literal_column("software_detected").collate("NOCASE")),
+        Index("ix_scans_camera_make_nocase", literal_column("camera_make").collate("NOCASE")),
+        Index("ix_scans_camera_model_nocase", literal_column("camera_model").collate("NOCASE")),
+    )
+
+
+@event.listens_for(Scan, "after_insert")
+def _count_insert(mapper, connection, target):
+    adjust_counter(connection, SCAN_COUNTER, 1)
+
+
+@event.listens_for(Scan, "after_insert")
+def _record_image(mapper, connection, target):
+    now = target.timestamp or datetime.now(timezone.utc)
+    record_stored_image(connection, target.sha256_hash, target.file_size, now)
+
+
+@event.listens_for(Scan, "after_delete")
+def _count_delete(mapper, connection, target):
+    adjust_counter(connection, SCAN_COUNTER, -1)
+
+
+def backfill_metadata_columns(conn: Connection, chunk_size: int = 500) -> int:
+    """Fill the promoted metadata columns of rows that predate them, from
+    their metadata_json. Rows are done once: has_exif is NULL only until
+    backfilled. Returns the number of rows updated."""
+    table = Scan.__table__
+    stmt = update(table).where(table.c.id == bindparam("row_id")).values(
+        {name: bindparam(name) for name in promoted_metadata({})}
+    )
+    done, last_id = 0, 0
+    while True:
+        rows = conn.execute(
+            select(table.c.id, table.c.metadata_json)
+            .where(table.c.has_exif.is_(None), table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            return done
+        params = []
+        for row in rows:
+            try:
+                metadata = json.loads(row.metadata_json or "{}")
+            except ValueError:
+                metadata = {}
+            params.append({"row_id": row.id, **promoted_metadata(metadata)})
+        conn.execute(stmt, params)
+        done += len(rows)
+        last_id = rows[-1].id
+
+
+class ScanSighting(Base):
+    """Lightweight record of a re-upload that was served from the result cache."""
+
+    __tablename__ = "scan_sightings"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    scan_id = Column(Integer, ForeignKey("scans.id"), nullable=False, index=True)
+    image_name = Column(String(255), nullable=False)
+    timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+@event.listens_for(ScanSighting, "after_insert")
+def _touch_image(mapper, connection, target):
+    # A re-upload served from cache is a use of the stored image
+    table = StoredImage.__table__
+    sha256_hash = select(Scan.sha256_hash).where(Scan.id == target.scan_id).scalar_subquery()
+    connection.execute(
+        update(table)
+        .where(table.c.sha256_hash == sha256_hash)
+        .values(last_used_at=target.timestamp or datetime.now(timezone.utc))
+    )
@@ -0,0 +1,81 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Index, Integer, String, func, insert, select, update
+from sqlalchemy.engine import Connection
+
+from app.database import Base
+from app.models.counter import Counter, adjust_counter, read_counter
+
+STORED_BYTES_COUNTER = "stored_image_bytes"
+
+
+class StoredImage(Base):
+    """Ledger of the thumbnails in the image store, for retention.
+
+    Rows are written in the transaction of the scan that stores the image
+    (see the listeners in app.models.scan); ``last_used_at`` also moves on
+    re-uploads and, batched, when the image is served. ``bytes`` counts the
+    thumbnail only: a kept original is deleted with it but not measured.
+    """
+
+    __tablename__ = "stored_images"
+
+    sha256_hash = Column(String(64), primary_key=True)
+    bytes = Column(Integer, nullable=False)
+    stored_at = Column(DateTime, nullable=False)
+    last_used_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        # Eviction order of the "oldest" and "lru" policies
+        Index("ix_stored_images_stored_at", "stored_at"),
+        Index("ix_stored_images_last_used_at", "last_used_at"),
+    )
+
+
+def claim_stored_image(conn: Connection, sha256_hash: str, now: datetime) -> bool:
+    """Mark an image as used if it is in the ledger. False if it is not
+    (evicted): retention deletes files only after their ledger rows, so a
+    claim that succeeds keeps the file from being evicted by a pending run."""
+    table = StoredImage.__table__
+    touched = conn.execute(
+        update(table).where(table.c.sha256_hash == sha256_hash).values(last_used_at=now)
+    )
+    return touched.rowcount > 0
+
+
+def record_stored_image(conn: Connection, sha256_hash: str, size: int, now: datetime) -> None:
+    """Mark an image as used, adding it to the ledger if it is new."""
+    if not claim_stored_image(conn, sha256_hash, now):
+        table = StoredImage.__table__
+        conn.execute(
+            insert(table).values(
+                sha256_hash=sha256_hash, bytes=size, stored_at=now, last_used_at=now
+            )
+        )
+        adjust_counter(conn, STORED_BYTES_COUNTER, size)
+
+
+def backfill_stored_images(conn: Connection, scans) -> int:
+    """Build the ledger from the scans table the first time (the byte
+    counter's existence marks it done). Returns the number of images."""
+    if read_counter(conn, STORED_BYTES_COUNTER) is not None:
+        return 0
+    table = StoredImage.__table__
+    conn.execute(
+        insert(table).from_select(
+            ["sha256_hash", "bytes", "stored_at", "last_used_at"],
+            select(
+                scans.c.sha256_hash,
+                func.max(scans.c.file_size),
+                func.min(scans.c.timestamp),
+                func.max(scans.c.timestamp),
+            )
+            .where(scans.c.timestamp.is_not(None))
+            .group_by(scans.c.sha256_hash),
+        )
+    )
+    count, total = conn.execute(
+        select(func.count(), func.coalesce(func.sum(table.c.bytes), 0))
+    ).one()
+    conn.execute(Counter.__table__.insert().values(name=STORED_BYTES_COUNTER, value=total))
+    return count
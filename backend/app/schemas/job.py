@@ -0,0 +1,22 @@
+from pydantic import BaseModel
+
+from app.schemas.scan import AnalysisResponse
+
+
+class JobAccepted(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str  # queued | running | done | failed
+    image_name: str
+    created_at: str
+    started_at: str | None = None
+    finished_at: str | None = None
+    attempts: int
+    queue_position: int | None = None  # jobs ahead of this one while queued
+    error: str | None = None
+    result: AnalysisResponse | None = None  # once done
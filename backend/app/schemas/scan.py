@@ -16,9 +16,14 @@ class MetadataResult(BaseModel):
 
 
 class ELAResult(BaseModel):
-    heatmap_base64: str
+    heatmap_base64: str  # always empty; use GET /api/scans/{scan_id}/ela
     mean_diff: float
     max_diff: float
+    channel_max_mean: float | None = None
+    p50_diff: float | None = None
+    p95_diff: float | None = None
+    p99_diff: float | None = None
+    block_means: list[list[float]] | None = None
 
 
 class AIDetectionResult(BaseModel):
@@ -38,7 +43,59 @@ class AnalysisResponse(BaseModel):
     ela: ELAResult
     ai_detection: AIDetectionResult
     #original_image_base64: str
-    original_image_base64: str | None = None
+    original_image_base64: str | None = None  # only with ?inline_image=true
+    original_image_url: str | None = None  # the upload itself; only with KEEP_ORIGINALS
+    thumbnail_url: str | None = None  # the stored 512px JPEG re-encode
+
+
+class VideoInfo(BaseModel):
+    duration_s: float | None = None
+    fps: float | None = None
+    width: int
+    height: int
+    frame_count: int | None = None
+    codec: str | None = None
+
+
+class FrameResult(BaseModel):
+    time_s: float
+    frame_index: int
+    keyframe: bool
+    manipulation_score: float
+    ela_mean: float
+    ai_probability: float
+
+
+class TimelineSegment(BaseModel):
+    start_s: float
+    end_s: float
+    peak_score: float
+
+
+class VideoTimeline(BaseModel):
+    sample_mode: str
+    frames_analyzed: int
+    # Seconds of the clip that were read (None for scans made before this
+    # was recorded); truncated if that falls short of the reported duration
+    covered_s: float | None = None
+    truncated: bool = False
+    frames: list[FrameResult]
+    segments: list[TimelineSegment]  # runs of frames scoring Suspicious or worse
+
+
+class VideoAnalysisResponse(BaseModel):
+    scan_id: int
+    image_name: str
+    sha256_hash: str  # of the poster frame (the highest-scoring sample)
+    timestamp: str
+    media_type: str = "video"
+    verdict: str
+    manipulation_score: float
+    video: VideoInfo
+    ela_mean: float
+    ai_detection: AIDetectionResult
+    timeline: VideoTimeline
+    poster_url: str | None = None  # the stored 512px JPEG of the poster frame
 
 
 class ScanSummary(BaseModel):
@@ -51,6 +108,12 @@ class ScanSummary(BaseModel):
     software_detected: str | None = None
     ela_mean: float | None = None
     ai_score: float | None = None
+    has_exif: bool | None = None
+    camera_make: str | None = None
+    camera_model: str | None = None
+    date_taken: str | None = None
+    media_type: str = "image"
+    duration_s: float | None = None
 
     model_config = {"from_attributes": True}
 
@@ -59,4 +122,16 @@ class ScanListResponse(BaseModel):
     total: int
     limit: int
     offset: int
+    next_cursor: str | None = None  # pass as ?cursor= for the next page
     scans: list[ScanSummary]
+
+
+class SimilarScan(ScanSummary):
+    distance: int  # Hamming distance between the 64-bit hashes
+
+
+class SimilarScansResponse(BaseModel):
+    scan_id: int
+    hash: str
+    max_distance: int
+    matches: list[SimilarScan]
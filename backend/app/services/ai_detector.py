@@ -3,88 +3,70 @@
 Primary: MesoNet-4 CNN (PyTorch) if weights are available.
 Fallback: Statistical ensemble using frequency analysis, ELA stats,
           color distribution, and edge consistency.
+
+PyTorch is only imported (via ``app.services.mesonet``) when weights are
+actually loaded; importing torch costs seconds of startup that the
+statistical fallback never needs.
 """
 
 import logging
-from io import BytesIO
 from pathlib import Path
 
 import cv2
 import numpy as np
 from PIL import Image
 
-logger = logging.getLogger(__name__)
-
-# ---------- Try importing PyTorch for MesoNet ----------
-_torch_available = False
-try:
-    import torch
-    import torch.nn as nn
+from app.services.fallback_features import compute_features_batch
+from app.services.image_context import ImageContext, as_image_context
+from app.services.micro_batcher import MicroBatcher
+from app.services import thread_budget
 
-    _torch_available = True
-except ImportError:
-    logger.info("PyTorch not installed, using statistical fallback for AI detection")
-
-
-# ---------- MesoNet-4 Architecture ----------
-if _torch_available:
+logger = logging.getLogger(__name__)
 
-    class MesoNet4(nn.Module):
-        def __init__(self):
-            super().__init__()
-            self.conv1 = nn.Sequential(
-                nn.Conv2d(3, 8, 3, padding=1),
-                nn.BatchNorm2d(8),
-                nn.ReLU(),
-                nn.MaxPool2d(2, 2),
-            )
-            self.conv2 = nn.Sequential(
-                nn.Conv2d(8, 8, 5, padding=2),
-                nn.BatchNorm2d(8),
-                nn.ReLU(),
-                nn.MaxPool2d(2, 2),
-            )
-            self.conv3 = nn.Sequential(
-                nn.Conv2d(8, 16, 5, padding=2),
-                nn.BatchNorm2d(16),
-                nn.ReLU(),
-                nn.MaxPool2d(2, 2),
-            )
-            self.conv4 = nn.Sequential(
-                nn.Conv2d(16, 16, 5, padding=2),
-                nn.BatchNorm2d(16),
-                nn.ReLU(),
-                nn.MaxPool2d(4, 4),
-            )
-            self.fc = nn.Sequential(
-                nn.Flatten(),
-                nn.Linear(16 * 4 * 4, 16),
-                nn.ReLU(),
-                nn.Dropout(0.5),
-                nn.Linear(16, 1),
-                nn.Sigmoid(),
-            )
+_DEGRADED_RESULT = {
+    "deepfake_probability": 0.5,
+    "confidence": 0.3,
+    "model_used": "Statistical Ensemble (degraded)",
+}
 
-        def forward(self, x):
-            x = self.conv1(x)
-            x = self.conv2(x)
-            x = self.conv3(x)
-            x = self.conv4(x)
-            return self.fc(x)
+# MesoNet-4 pools by 2*2*2*4 = 32 and its classifier expects a 4x4 map,
+# so any checkpoint that loads into this architecture takes 128x128 input.
+INPUT_SIZE = 128
 
 
 class AIDetector:
-    def __init__(self, model_path: Path | None = None):
+    def __init__(
+        self,
+        model_path: Path | None = None,
+        max_batch_size: int = 1,
+        max_wait_ms: float = 5.0,
+        engine: str = "eager",
+        quantize: bool = False,
+        channels_last: bool = False,
+        warmup_runs: int = 0,
+        parity_atol: float | None = None,
+    ):
         self.model = None
+        self.engine_model = None
+        self.engine = "eager"
+        self.channels_last = False
         self.model_loaded = False
         self.model_name = "Statistical Ensemble"
+        self._batcher: MicroBatcher | None = None
 
-        if _torch_available and model_path and model_path.exists():
+        if model_path and model_path.exists():
+            try:
+                from app.services.mesonet import MesoNet4, torch
+            except ImportError:
+                logger.info("PyTorch not installed, using statistical fallback for AI detection")
+                return
+            thread_budget.apply()  # before torch does any parallel work
             try:
                 self.model = MesoNet4()
                 state = torch.load(str(model_path), map_location="cpu", weights_only=True)
                 self.model.load_state_dict(state)
                 self.model.eval()
+                self.engine_model = self.model
                 self.model_loaded = True
                 self.model_name = "MesoNet-4"
                 logger.info("MesoNet-4 model loaded from %s", model_path)
@@ -93,21 +75,131 @@ class AIDetector:
                 self.model = None
                 self.model_loaded = False
 
-    def predict(self, file_bytes: bytes, ela_stats: dict | None = None) -> dict:
+        if not self.model_loaded:
+            return
+
+        if engine == "optimized":
+            self._enable_optimized(quantize, channels_last, parity_atol)
+        if max_batch_size > 1:
+            self._batcher = MicroBatcher(
+                self._infer_batch,
+                max_batch_size=max_batch_size,
+                max_wait_ms=max_wait_ms,
+                name="mesonet-batcher",
+            )
+        if warmup_runs > 0:
+            self.warmup(warmup_runs, max_batch_size)
+
+    def _enable_optimized(
+        self, quantize: bool, channels_last: bool, parity_atol: float | None
+    ) -> None:
+        from app.services.mesonet import build_inference_model
+
+        try:
+            engine_model = build_inference_model(self.model, quantize, channels_last)
+        except Exception as e:
+            logger.warning("Optimized MesoNet build failed: %s. Using eager model.", e)
+            return
+
+        previous = (self.engine_model, self.engine, self.channels_last)
+        self.engine_model = engine_model
+        self.engine = "optimized-int8" if quantize else "optimized"
+        self.channels_last = channels_last
+
+        if parity_atol is not None:
+            max_err = self.check_parity()
+            if max_err > parity_atol:
+                logger.error(
+                    "Optimized MesoNet diverges from eager model "
+                    "(max |diff|=%.5f > %.5f). Using eager model.",
+                    max_err, parity_atol,
+                )
+                self.engine_model, self.engine, self.channels_last = previous
+                return
+            logger.info("Optimized MesoNet parity OK (max |diff|=%.5f)", max_err)
+        logger.info("MesoNet inference engine: %s", self.engine)
+
+    def check_parity(self, inputs: np.ndarray | None = None) -> float:
+        """Max absolute difference between the active engine and the eager
+        model. Defaults to a fixed set of random NCHW inputs in [0, 1)."""
+        if inputs is None:
+            rng = np.random.default_rng(0)
+            inputs = rng.random((8, 3, INPUT_SIZE, INPUT_SIZE), dtype=np.float32)
+        import torch
+
+        with torch.no_grad():
+            reference = self.model(torch.from_numpy(inputs)).view(-1).numpy()
+        candidate = np.asarray(self._infer_batch(list(inputs)))
+        return float(np.max(np.abs(reference - candidate)))
+
+    def warmup(self, runs: int = 3, max_batch_size: int = 1) -> None:
+        """Run a few passes so allocator/JIT work is not paid by the first requests."""
+        sample = np.zeros((3, INPUT_SIZE, INPUT_SIZE), dtype=np.float32)
+        for _ in range(runs):
+            self._infer_batch([sample])
+            if max_batch_size > 1:
+                self._infer_batch([sample] * max_batch_size)
+
+    def predict(
+        self, source: ImageContext | bytes, ela_stats: dict | None = None
+    ) -> dict:
+        ctx = as_image_context(source)
         if self.model_loaded:
-            return self._run_model(file_bytes)
-        return self._statistical_fallback(file_bytes, ela_stats)
+            return self._run_model(ctx)
+        return self._statistical_fallback(ctx, ela_stats)
+
+    def predict_batch(
+        self, ctxs: list[ImageContext], ela_stats: list[dict | None] | None = None
+    ) -> list[dict]:
+        """Scores for many images (e.g. video frames) with one model call,
+        or one feature-engine call without a model."""
+        if not self.model_loaded:
+            return self.statistical_batch(ctxs, ela_stats)
+        try:
+            probs = self._infer_batch([self._preprocess(ctx) for ctx in ctxs])
+        except Exception as e:
+            logger.error("MesoNet batch inference failed: %s, using fallback", e)
+            return self.statistical_batch(ctxs, ela_stats)
+        return [
+            {
+                "deepfake_probability": round(prob, 4),
+                "confidence": 0.85,
+                "model_used": self.model_name,
+            }
+            for prob in probs
+        ]
 
     # ---------- MesoNet inference ----------
-    def _run_model(self, file_bytes: bytes) -> dict:
+    def _preprocess(self, ctx: ImageContext) -> np.ndarray:
+        if self.engine == "eager":
+            img = ctx.reduced.resize((INPUT_SIZE, INPUT_SIZE), Image.LANCZOS)
+            arr = np.asarray(img, dtype=np.float32)
+        else:
+            # NumPy/OpenCV path: no PIL resize or extra image objects
+            arr = cv2.resize(
+                ctx.reduced_array, (INPUT_SIZE, INPUT_SIZE), interpolation=cv2.INTER_AREA
+            ).astype(np.float32)
+        arr *= 1.0 / 255.0
+        return arr.transpose(2, 0, 1)  # CHW
+
+    def _infer_batch(self, inputs: list[np.ndarray]) -> list[float]:
+        """Run MesoNet once over a stack of CHW inputs."""
+        import torch
+
+        tensor = torch.from_numpy(np.stack(inputs))
+        if self.channels_last:
+            tensor = tensor.contiguous(memory_format=torch.channels_last)
+        with torch.no_grad():
+            probs = self.engine_model(tensor).view(-1)
+        return probs.tolist()
+
+    def _run_model(self, ctx: ImageContext) -> dict:
         try:
-            img = Image.open(BytesIO(file_bytes)).convert("RGB")
-            img = img.resize((256, 256), Image.LANCZOS)
-            arr = np.array(img, dtype=np.float32) / 255.0
-            tensor = torch.from_numpy(arr).permute(2, 0, 1).unsqueeze(0)
-
-            with torch.no_grad():
-                prob = self.model(tensor).item()
+            arr = self._preprocess(ctx)
+            if self._batcher is not None:
+                prob = self._batcher(arr)
+            else:
+                prob = self._infer_batch([arr])[0]
 
             return {
                 "deepfake_probability": round(prob, 4),
@@ -116,49 +208,60 @@ class AIDetector:
             }
         except Exception as e:
             logger.error("MesoNet inference failed: %s, using fallback", e)
-            return self._statistical_fallback(file_bytes, None)
+            return self._statistical_fallback(ctx, None)
 
     # ---------- Statistical ensemble fallback ----------
     def _statistical_fallback(
-        self, file_bytes: bytes, ela_stats: dict | None = None
+        self, ctx: ImageContext, ela_stats: dict | None = None
     ) -> dict:
         try:
-            img = Image.open(BytesIO(file_bytes)).convert("RGB")
-            arr = np.array(img)
+            # The <=512px thumbnail shared with ELA/storage is the working copy
+            arr = ctx.thumbnail_array
         except Exception:
-            return {
-                "deepfake_probability": 0.5,
-                "confidence": 0.3,
-                "model_used": "Statistical Ensemble (degraded)",
-            }
-
-        scores = []
-        weights = []
-
+            return dict(_DEGRADED_RESULT)
+
+        freq_score, color_score, edge_score = compute_features_batch([arr])[0]
+        return self._combine_scores(freq_score, color_score, edge_score, ela_stats)
+
+    def statistical_batch(
+        self, ctxs: list[ImageContext], ela_stats: list[dict | None] | None = None
+    ) -> list[dict]:
+        """Statistical ensemble over many images with one feature-engine call."""
+        ela_stats = ela_stats or [None] * len(ctxs)
+        results: list[dict | None] = [None] * len(ctxs)
+        arrays, indices = [], []
+        for i, ctx in enumerate(ctxs):
+            try:
+                arrays.append(ctx.thumbnail_array)
+                indices.append(i)
+            except Exception:
+                results[i] = dict(_DEGRADED_RESULT)
+
+        if arrays:
+            features = compute_features_batch(arrays)
+            for i, (freq, color, edge) in zip(indices, features):
+                results[i] = self._combine_scores(freq, color, edge, ela_stats[i])
+        return results
+
+    @staticmethod
+    def _combine_scores(
+        freq_score: float, color_score: float, edge_score: float,
+        ela_stats: dict | None,
+    ) -> dict:
         # 1. ELA-based signal (35%)
         ela_score = 0.0
         if ela_stats:
-            mean_d = ela_stats.get("mean_diff", 0)
+            mean_d = ela_stats.get("channel_max_mean", ela_stats.get("mean_diff", 0))
             ela_score = min(mean_d / 30.0, 1.0)
-        scores.append(ela_score)
-        weights.append(0.35)
-
-        # 2. Frequency domain analysis (25%)
-        freq_score = self._frequency_analysis(arr)
-        scores.append(freq_score)
-        weights.append(0.25)
-
-        # 3. Color histogram irregularity (20%)
-        color_score = self._color_analysis(arr)
-        scores.append(color_score)
-        weights.append(0.20)
 
-        # 4. Edge consistency (20%)
-        edge_score = self._edge_analysis(arr)
-        scores.append(edge_score)
-        weights.append(0.20)
-
-        raw = sum(s * w for s, w in zip(scores, weights))
+        # 2. Frequency domain (25%), 3. color histogram irregularity (20%),
+        # 4. edge consistency (20%)
+        raw = (
+            ela_score * 0.35
+            + freq_score * 0.25
+            + color_score * 0.20
+            + edge_score * 0.20
+        )
         # Sigmoid shaping
         probability = 1.0 / (1.0 + np.exp(-8 * (raw - 0.45)))
         probability = float(np.clip(probability, 0.01, 0.99))
@@ -170,74 +273,3 @@ class AIDetector:
             "confidence": round(confidence, 4),
             "model_used": "Statistical Ensemble",
         }
-
-    def _frequency_analysis(self, arr: np.ndarray) -> float:
-        """Analyze high-frequency content via 2D FFT.
-        Manipulated images often show unusual frequency patterns."""
-        try:
-            gray = cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY).astype(np.float32)
-            f = np.fft.fft2(gray)
-            fshift = np.fft.fftshift(f)
-            magnitude = np.log1p(np.abs(fshift))
-
-            h, w = magnitude.shape
-            cy, cx = h // 2, w // 2
-            radius = min(h, w) // 4
-
-            # High frequency energy ratio
-            total_energy = np.sum(magnitude)
-            center_mask = np.zeros_like(magnitude)
-            cv2.circle(center_mask, (cx, cy), radius, 1, -1)
-            low_energy = np.sum(magnitude * center_mask)
-            high_energy = total_energy - low_energy
-
-            ratio = high_energy / (total_energy + 1e-10)
-            # Unusual ratio suggests manipulation
-            deviation = abs(ratio - 0.7)
-            return min(deviation * 3.0, 1.0)
-        except Exception:
-            return 0.3
-
-    def _color_analysis(self, arr: np.ndarray) -> float:
-        """Check color histogram for irregularities."""
-        try:
-            scores = []
-            for ch in range(3):
-                hist, _ = np.histogram(arr[:, :, ch], bins=256, range=(0, 256))
-                hist = hist.astype(np.float64)
-                hist /= hist.sum() + 1e-10
-
-                # Check for unusual gaps or spikes
-                zero_bins = np.sum(hist == 0) / 256.0
-                max_spike = np.max(hist)
-                scores.append(zero_bins * 0.5 + max_spike * 2.0)
-
-            avg = np.mean(scores)
-            return float(np.clip(avg, 0, 1))
-        except Exception:
-            return 0.3
-
-    def _edge_analysis(self, arr: np.ndarray) -> float:
-        """Analyze edge consistency across image regions."""
-        try:
-            gray = cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY)
-            edges = cv2.Canny(gray, 100, 200)
-
-            h, w = edges.shape
-            block_h, block_w = h // 4, w // 4
-            densities = []
-
-            for i in range(4):
-                for j in range(4):
-                    block = edges[
-                        i * block_h : (i + 1) * block_h,
-                        j * block_w : (j + 1) * block_w,
-                    ]
-                    density = np.mean(block) / 255.0
-                    densities.append(density)
-
-            # High variance in edge density suggests manipulation
-            variance = np.var(densities)
-            return float(np.clip(variance * 20.0, 0, 1))
-        except Exception:
-            return 0.3
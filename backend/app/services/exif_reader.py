@@ -0,0 +1,256 @@
+"""Header-only EXIF reader.
+
+Finds the EXIF block by walking the JPEG markers or PNG chunks of the raw
+upload, never touching entropy-coded scan data or IDAT payloads, and
+parses its IFDs into the same ``{"0th", "Exif", "GPS", "Interop", "1st"}``
+dict (same tags, same value types) that ``piexif.load`` returns for
+Pillow's ``info["exif"]``. ``extract_metadata`` builds its result from
+either, so both paths produce identical metadata.
+
+``UnsupportedLayout`` means the file is laid out in a way whose Pillow
+handling this reader does not reproduce exactly (text-chunk EXIF in PNG,
+junk between JPEG markers, malformed IFDs, ...). Callers then fall back
+to the Pillow/piexif path.
+"""
+
+import struct
+import zlib
+
+import piexif
+
+JPEG_SOI = b"\xff\xd8\xff"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+EXIF_HEADER = b"Exif\x00\x00"
+
+# Markers without a length field
+_STANDALONE_MARKERS = {0x01, *range(0xD0, 0xD8)}
+# SOFn; 0xC4 (DHT), 0xC8 (JPG) and 0xCC (DAC) share the range but are not frames
+_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+_SOS, _EOI, _APP1 = 0xDA, 0xD9, 0xE1
+
+# Text chunk keywords Pillow turns into EXIF on its slow path
+_PNG_TEXT_CHUNKS = {b"tEXt", b"zTXt", b"iTXt"}
+_PNG_EXIF_KEYWORDS = {b"exif", b"Raw profile type exif"}
+
+
+class UnsupportedLayout(Exception):
+    """The header-only reader cannot reproduce Pillow's result for this file."""
+
+
+def read_exif(raw: bytes | memoryview) -> dict | None:
+    """piexif-style IFD dict for a JPEG or PNG, or None if it has no EXIF."""
+    data = memoryview(raw)
+    if data[:3] == JPEG_SOI:
+        exif = _jpeg_exif(data)
+    elif data[:8] == PNG_SIGNATURE:
+        exif = _png_exif(data)
+    else:
+        raise UnsupportedLayout("not a JPEG or PNG")
+
+    if not exif:
+        return None
+    try:
+        return parse_exif_block(exif)
+    except Exception as e:
+        raise UnsupportedLayout(f"malformed EXIF: {e}") from e
+
+
+def parse_exif_block(exif: bytes) -> dict:
+    """piexif-style IFD dict for an EXIF block (Pillow's ``info["exif"]``,
+    with or without the "Exif" header). Raises on malformed IFDs where
+    ``piexif.load`` would, but without sizing anything from entry counts."""
+    if exif[: len(EXIF_HEADER)] == EXIF_HEADER:
+        exif = exif[len(EXIF_HEADER):]
+    return _parse_tiff(exif)
+
+
+def _jpeg_exif(data: memoryview) -> bytes | None:
+    """EXIF APP1 payload(s) as Pillow collects them: the first segment
+    whole, later ones appended without their header. Stops at SOS."""
+    exif: bytearray | None = None
+    seen_frame = False
+    pos, end = 2, len(data)
+    while pos + 2 <= end:
+        if data[pos] != 0xFF:
+            raise UnsupportedLayout(f"junk at offset {pos}")
+        marker = data[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        pos += 2
+        if marker in _STANDALONE_MARKERS:
+            continue
+        if marker == _EOI or pos + 2 > end:
+            break
+
+        length = (data[pos] << 8) | data[pos + 1]
+        if length < 2 or pos + length > end:
+            raise UnsupportedLayout("truncated segment")
+        if marker == _SOS:
+            if not seen_frame:
+                break
+            return bytes(exif) if exif is not None else None
+
+        seen_frame = seen_frame or marker in _SOF_MARKERS
+        if marker == _APP1:
+            segment = data[pos + 2 : pos + length]
+            if segment[:6] == EXIF_HEADER:
+                if exif is None:
+                    exif = bytearray(segment)
+                else:
+                    exif += segment[6:]
+        pos += length
+
+    raise UnsupportedLayout("no frame header before end of data")
+
+
+def _png_exif(data: memoryview) -> bytes | None:
+    """``Exif\\0\\0`` + the last eXIf chunk before the first IDAT, as Pillow
+    reads it at open time. EXIF stored anywhere else is only found by
+    Pillow after decoding the pixels, so it is left to that path."""
+    exif: bytes | None = None
+    in_header = True
+    pos, end = 8, len(data)
+    while pos + 8 <= end:
+        length = int.from_bytes(data[pos : pos + 4], "big")
+        ctype = bytes(data[pos + 4 : pos + 8])
+        body_end = pos + 8 + length
+        if body_end + 4 > end:
+            raise UnsupportedLayout("truncated chunk")
+        body = data[pos + 8 : body_end]
+
+        if ctype in (b"IDAT", b"fdAT"):
+            if exif is not None:
+                return exif
+            in_header = False
+        elif ctype == b"IEND":
+            return exif
+        elif in_header:
+            # Pillow verifies header chunk CRCs and refuses the file otherwise
+            crc = int.from_bytes(data[body_end : body_end + 4], "big")
+            if zlib.crc32(body, zlib.crc32(ctype)) != crc:
+                raise UnsupportedLayout(f"bad CRC in {ctype!r}")
+            if ctype == b"eXIf":
+                exif = EXIF_HEADER + bytes(body)
+        elif ctype == b"eXIf":
+            raise UnsupportedLayout("eXIf after image data")
+
+        if ctype in _PNG_TEXT_CHUNKS:
+            keyword = bytes(body[:80]).split(b"\x00", 1)[0]
+            if keyword in _PNG_EXIF_KEYWORDS:
+                raise UnsupportedLayout("EXIF in a text chunk")
+        pos = body_end + 4
+
+    raise UnsupportedLayout("missing IEND")
+
+
+# ---------- TIFF/IFD parsing (mirrors piexif.load) ----------
+
+_IFD_TAGS = {
+    "0th": piexif.TAGS["Image"],
+    "1st": piexif.TAGS["Image"],
+    "Exif": piexif.TAGS["Exif"],
+    "GPS": piexif.TAGS["GPS"],
+    "Interop": piexif.TAGS["Interop"],
+}
+
+# TIFF type -> (struct code, item size) for plain numeric arrays
+_NUMERIC_TYPES = {
+    1: ("B", 1),   # BYTE
+    3: ("H", 2),   # SHORT
+    4: ("L", 4),   # LONG
+    6: ("b", 1),   # SBYTE
+    8: ("h", 2),   # SSHORT
+    9: ("l", 4),   # SLONG
+    11: ("f", 4),  # FLOAT
+    12: ("d", 8),  # DOUBLE (always stored behind a pointer)
+}
+_ASCII, _RATIONAL, _UNDEFINED, _SRATIONAL = 2, 5, 7, 10
+
+
+class _TiffReader:
+    def __init__(self, tiff: bytes):
+        self.tiff = tiff
+        self.endian = "<" if tiff[0:2] == b"II" else ">"
+
+    def u16(self, offset: int) -> int:
+        return struct.unpack(self.endian + "H", self.tiff[offset : offset + 2])[0]
+
+    def u32(self, offset: int) -> int:
+        return struct.unpack(self.endian + "L", self.tiff[offset : offset + 4])[0]
+
+    def ifd(self, offset: int, name: str) -> tuple[dict, bytes]:
+        """Known tags of the IFD at ``offset`` and its raw next-IFD pointer."""
+        known = _IFD_TAGS[name]
+        count = self.u16(offset)
+        entries = {}
+        for i in range(count):
+            entry = offset + 2 + 12 * i
+            tag = self.u16(entry)
+            value_type, value_count = self.u16(entry + 2), self.u32(entry + 4)
+            if tag in known:
+                entries[tag] = self.value(
+                    value_type, value_count, self.tiff[entry + 8 : entry + 12]
+                )
+        next_at = offset + 2 + 12 * count
+        return entries, self.tiff[next_at : next_at + 4]
+
+    def value(self, value_type: int, count: int, field: bytes):
+        e, tiff = self.endian, self.tiff
+        if value_type in _NUMERIC_TYPES:
+            code, size = _NUMERIC_TYPES[value_type]
+            fmt = f"{'' if size == 1 else e}{count}{code}"
+            if count * size > 4 or value_type == 12:
+                start = struct.unpack(e + "L", field)[0]
+                data = struct.unpack(fmt, tiff[start : start + count * size])
+            elif size == 4:
+                data = struct.unpack(fmt, field)  # inline 4-byte values use the whole field
+            else:
+                data = struct.unpack(fmt, field[0 : count * size])
+        elif value_type == _ASCII:
+            if count > 4:
+                start = struct.unpack(e + "L", field)[0]
+                data = tiff[start : start + count - 1]
+            else:
+                data = field[0 : count - 1]
+        elif value_type == _UNDEFINED:
+            if count > 4:
+                start = struct.unpack(e + "L", field)[0]
+                data = tiff[start : start + count]
+            else:
+                data = field[0:count]
+        elif value_type in (_RATIONAL, _SRATIONAL):
+            part = e + ("L" if value_type == _RATIONAL else "l")
+            start = struct.unpack(e + "L", field)[0]
+            pairs = tuple(
+                (
+                    struct.unpack(part, tiff[start + 8 * i : start + 8 * i + 4])[0],
+                    struct.unpack(part, tiff[start + 8 * i + 4 : start + 8 * i + 8])[0],
+                )
+                for i in range(max(count, 1))
+            )
+            return pairs if count > 1 else pairs[0]
+        else:
+            raise ValueError(f"unknown TIFF value type {value_type}")
+
+        if isinstance(data, tuple) and len(data) == 1:
+            return data[0]
+        return data
+
+
+def _parse_tiff(tiff: bytes) -> dict:
+    reader = _TiffReader(tiff)
+    result = {"0th": {}, "Exif": {}, "GPS": {}, "Interop": {}, "1st": {}}
+
+    result["0th"], next_ifd = reader.ifd(reader.u32(4), "0th")
+    if piexif.ImageIFD.ExifTag in result["0th"]:
+        result["Exif"], _ = reader.ifd(result["0th"][piexif.ImageIFD.ExifTag], "Exif")
+    if piexif.ImageIFD.GPSTag in result["0th"]:
+        result["GPS"], _ = reader.ifd(result["0th"][piexif.ImageIFD.GPSTag], "GPS")
+    if piexif.ExifIFD.InteroperabilityTag in result["Exif"]:
+        result["Interop"], _ = reader.ifd(
+            result["Exif"][piexif.ExifIFD.InteroperabilityTag], "Interop"
+        )
+    if next_ifd != b"\x00\x00\x00\x00":
+        result["1st"], _ = reader.ifd(struct.unpack(reader.endian + "L", next_ifd)[0], "1st")
+    return result
@@ -0,0 +1,121 @@
+"""Vectorized feature engine for the statistical fallback detector.
+
+Computes the frequency, color-histogram and edge-consistency signals in
+one pass over a bounded-size working copy:
+
+- frequency: ``rfft2`` half spectrum with per-shape cached masks/weights
+- color:     one ``bincount`` over all three channels
+- edge:      Canny + 4x4 block densities via a reshape/mean
+
+Images of the same shape are processed as one stacked batch.
+"""
+
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+WORKING_MAX_SIDE = 512
+EDGE_GRID = 4
+DEFAULT_SCORE = 0.3  # used when a signal cannot be computed
+
+
+def working_copy(rgb: np.ndarray) -> np.ndarray:
+    """Downscale (INTER_AREA) so the longest side is at most WORKING_MAX_SIDE."""
+    h, w = rgb.shape[:2]
+    scale = WORKING_MAX_SIDE / max(h, w)
+    if scale >= 1.0:
+        return rgb
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return cv2.resize(rgb, size, interpolation=cv2.INTER_AREA)
+
+
+@lru_cache(maxsize=32)
+def _spectrum_weights(h: int, w: int) -> tuple[np.ndarray, np.ndarray]:
+    """Weights over the rfft2 half spectrum so that weighted sums equal sums
+    over the full (shifted) spectrum, plus the same weights restricted to
+    the low-frequency disc of radius min(h, w) // 4."""
+    ky = np.fft.fftfreq(h) * h
+    kx = np.fft.rfftfreq(w) * w
+    # Every column except DC (and Nyquist for even widths) stands for two
+    # mirrored columns of the full spectrum.
+    col = np.full(kx.shape, 2.0, dtype=np.float32)
+    col[0] = 1.0
+    if w % 2 == 0:
+        col[-1] = 1.0
+    total = np.broadcast_to(col, (h, kx.size)).copy()
+
+    radius = min(h, w) // 4
+    disc = (ky[:, None] ** 2 + kx[None, :] ** 2) <= radius**2
+    low = total * disc
+    total.flags.writeable = False
+    low.flags.writeable = False
+    return total, low
+
+
+def _frequency_scores(gray: np.ndarray) -> np.ndarray:
+    """(N, H, W) grayscale stack -> (N,) high-frequency deviation scores."""
+    h, w = gray.shape[-2:]
+    magnitude = np.log1p(np.abs(np.fft.rfft2(gray.astype(np.float32))))
+    total_w, low_w = _spectrum_weights(h, w)
+    total = np.einsum("nij,ij->n", magnitude, total_w)
+    low = np.einsum("nij,ij->n", magnitude, low_w)
+    ratio = (total - low) / (total + 1e-10)
+    return np.minimum(np.abs(ratio - 0.7) * 3.0, 1.0)
+
+
+def _color_scores(rgb: np.ndarray) -> np.ndarray:
+    """(N, H, W, 3) uint8 stack -> (N,) histogram irregularity scores."""
+    n = rgb.shape[0]
+    offsets = (np.arange(n)[:, None] * 3 + np.arange(3)[None, :]) * 256
+    idx = rgb.reshape(n, -1, 3).astype(np.int64) + offsets[:, None, :]
+    hist = np.bincount(idx.ravel(), minlength=n * 3 * 256).reshape(n, 3, 256)
+    hist = hist / (hist.sum(axis=2, keepdims=True) + 1e-10)
+
+    zero_bins = np.count_nonzero(hist == 0, axis=2) / 256.0
+    max_spike = hist.max(axis=2)
+    scores = (zero_bins * 0.5 + max_spike * 2.0).mean(axis=1)
+    return np.clip(scores, 0, 1)
+
+
+def _edge_scores(gray: np.ndarray) -> np.ndarray:
+    """(N, H, W) uint8 stack -> (N,) edge-density variance scores."""
+    n, h, w = gray.shape
+    bh, bw = h // EDGE_GRID, w // EDGE_GRID
+    edges = np.stack([cv2.Canny(g, 100, 200) for g in gray])
+    blocks = edges[:, : bh * EDGE_GRID, : bw * EDGE_GRID].reshape(
+        n, EDGE_GRID, bh, EDGE_GRID, bw
+    )
+    densities = blocks.mean(axis=(2, 4), dtype=np.float64) / 255.0
+    return np.clip(densities.reshape(n, -1).var(axis=1) * 20.0, 0, 1)
+
+
+def _score_stack(rgb: np.ndarray, gray: np.ndarray) -> np.ndarray:
+    """Same-shape stack -> (N, 3) [frequency, color, edge] scores."""
+    out = np.full((rgb.shape[0], 3), DEFAULT_SCORE)
+    for col, fn, arg in (
+        (0, _frequency_scores, gray),
+        (1, _color_scores, rgb),
+        (2, _edge_scores, gray),
+    ):
+        try:
+            out[:, col] = fn(arg)
+        except Exception:
+            pass
+    return out
+
+
+def compute_features_batch(images: list[np.ndarray]) -> np.ndarray:
+    """RGB uint8 images (any sizes) -> (N, 3) [frequency, color, edge]."""
+    working = [working_copy(img) for img in images]
+    out = np.empty((len(working), 3))
+    by_shape: dict[tuple, list[int]] = {}
+    for i, img in enumerate(working):
+        by_shape.setdefault(img.shape, []).append(i)
+
+    for indices in by_shape.values():
+        rgb = np.stack([working[i] for i in indices])
+        gray = np.stack([cv2.cvtColor(working[i], cv2.COLOR_RGB2GRAY) for i in indices])
+        out[indices] = _score_stack(rgb, gray)
+    return out
+
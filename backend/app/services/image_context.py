@@ -0,0 +1,130 @@
+"""Per-request image context.
+
+Parses the uploaded container once and lazily derives the views the
+analysis services need (RGB pixels, storage thumbnail, grayscale array,
+raw EXIF bytes), so each decode happens at most once per request.
+
+In large-image mode JPEGs are additionally decoded at a reduced DCT scale
+(``reduced``) for the thumbnail and the model input, so only full-resolution
+ELA pays for a full decode.
+"""
+
+from functools import cached_property
+from io import BytesIO
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from app.config import settings
+
+THUMBNAIL_SIZE = (512, 512)
+THUMBNAIL_JPEG_QUALITY = 85
+# Reduced decodes keep at least this multiple of the thumbnail size, like
+# Image.thumbnail's reducing_gap, so downscaling quality is preserved
+DRAFT_GAP = 2.0
+
+
+class ImageContext:
+    def __init__(self, file_bytes: bytes | memoryview):
+        self.raw = file_bytes
+        # ELA difference of ``thumbnail``, left here by perform_ela so the
+        # heatmap does not need a second JPEG re-save
+        self.ela_diff: np.ndarray | None = None
+
+    @classmethod
+    def from_rgb_array(cls, rgb: np.ndarray) -> "ImageContext":
+        """Context over pixels that are already decoded (a video frame).
+        There is no container, so no format and no EXIF."""
+        ctx = cls(b"")
+        image = Image.fromarray(rgb, "RGB")
+        ctx.__dict__.update(image=image, rgb=image, rgb_array=rgb)
+        return ctx
+
+    @cached_property
+    def image(self) -> Image.Image:
+        """Opened container. Only the header is parsed here; pixels are
+        decoded on first access to ``rgb``."""
+        return Image.open(BytesIO(self.raw))
+
+    @property
+    def format(self) -> str | None:
+        return self.image.format
+
+    @property
+    def info(self) -> dict:
+        return self.image.info
+
+    @cached_property
+    def exif_bytes(self) -> bytes:
+        return self.image.info.get("exif", b"")
+
+    @cached_property
+    def rgb(self) -> Image.Image:
+        img = self.image
+        if img.mode != "RGB":
+            return img.convert("RGB")
+        img.load()
+        return img
+
+    @cached_property
+    def rgb_array(self) -> np.ndarray:
+        return np.asarray(self.rgb)
+
+    @cached_property
+    def gray(self) -> np.ndarray:
+        return cv2.cvtColor(self.rgb_array, cv2.COLOR_RGB2GRAY)
+
+    @property
+    def uses_draft(self) -> bool:
+        return settings.large_image_mode and self.format == "JPEG"
+
+    @cached_property
+    def reduced(self) -> Image.Image:
+        """RGB working image for the thumbnail and model input: the JPEG
+        decoded at the smallest DCT scale (1/2, 1/4, 1/8) that stays above
+        DRAFT_GAP x the thumbnail size in large-image mode, else ``rgb``."""
+        if not self.uses_draft:
+            return self.rgb
+        w, h = self.image.size
+        scale = min(THUMBNAIL_SIZE[0] / w, THUMBNAIL_SIZE[1] / h, 1.0) * DRAFT_GAP
+        target = (max(int(w * scale), 1), max(int(h * scale), 1))
+        if "rgb" in self.__dict__:
+            # Already fully decoded (full-resolution ELA): box-reduce that
+            # by the factor draft() would pick instead of decoding again
+            factor = next(
+                (f for f in (8, 4, 2) if w // f >= target[0] and h // f >= target[1]), 1
+            )
+            return self.rgb.reduce(factor) if factor > 1 else self.rgb
+        img = Image.open(BytesIO(self.raw))
+        img.draft("RGB", target)
+        return img.convert("RGB")
+
+    @cached_property
+    def reduced_array(self) -> np.ndarray:
+        if not self.uses_draft:
+            return self.rgb_array
+        return np.asarray(self.reduced)
+
+    @cached_property
+    def thumbnail(self) -> Image.Image:
+        thumb = self.reduced.copy()
+        thumb.thumbnail(THUMBNAIL_SIZE)
+        return thumb
+
+    @cached_property
+    def thumbnail_array(self) -> np.ndarray:
+        return np.asarray(self.thumbnail)
+
+    @cached_property
+    def thumbnail_jpeg(self) -> bytes:
+        buffer = BytesIO()
+        self.thumbnail.save(buffer, format="JPEG", quality=THUMBNAIL_JPEG_QUALITY)
+        return buffer.getvalue()
+
+
+def as_image_context(source: "ImageContext | bytes") -> ImageContext:
+    """Accept either a prepared context or raw bytes (legacy callers)."""
+    if isinstance(source, ImageContext):
+        return source
+    return ImageContext(source)
@@ -1,16 +1,319 @@
+"""Content-addressed storage for analyzed images.
+
+Images are keyed by SHA-256 under ``originals/`` (historical name: it
+holds the processed thumbnails) and, with ``settings.keep_originals``,
+the uploaded file sits next to its thumbnail as ``<sha>.original``.
+Keys are sharded by hash prefix (``originals/ab/cd/<sha>``) so no
+directory or listing grows with the whole collection. Keys carry no
+extension, so a lookup is one request whatever the file type (responses
+sniff it from the bytes); images stored before that keep their upload's
+extension and are found by trying each of LEGACY_EXTENSIONS after a miss.
+
+``settings.storage_backend`` selects the store:
+
+- ``local``:  files under ``settings.upload_dir``, written to a temp file
+              and renamed into place, so readers never see partial files
+- ``object``: an S3-compatible bucket through boto3. An endpoint of the
+              form ``file:///some/dir`` uses ``LocalObjectClient``, a
+              directory-backed stand-in with the same calls, for tests
+              and development without a bucket
+
+Writes are skipped when the key already exists: identical content has
+identical keys. All calls block; callers run them off the event loop.
+"""
+
 import hashlib
+import logging
+import os
+import tempfile
+import threading
+from abc import ABC, abstractmethod
 from pathlib import Path
 
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
+PREFIX = "originals"
+LEGACY_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
 
 def compute_hash(file_bytes: bytes) -> str:
     return hashlib.sha256(file_bytes).hexdigest()
 
 
-def save_image(file_bytes: bytes, sha256_hash: str, extension: str) -> Path:
-    upload_dir = settings.upload_dir / "originals"
-    upload_dir.mkdir(parents=True, exist_ok=True)
-    filepath = upload_dir / f"{sha256_hash}{extension}"
-    filepath.write_bytes(file_bytes)
-    return filepath
+def image_key(sha256_hash: str, original: bool = False, extension: str = "") -> str:
+    """Store key of an image; ``extension`` only to find legacy keys."""
+    name = f"{sha256_hash}.original" if original else sha256_hash
+    return f"{PREFIX}/{sha256_hash[:2]}/{sha256_hash[2:4]}/{name}{extension}"
+
+
+def _legacy_keys(sha256_hash: str, original: bool = False) -> list[str]:
+    return [image_key(sha256_hash, original, extension) for extension in LEGACY_EXTENSIONS]
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+class ImageStore(ABC):
+    """Interface of a storage backend. Keys are ``/``-separated paths."""
+
+    # Whether local_path() can return anything; lets readers skip the
+    # lookup on backends that only have get()
+    has_local_paths = False
+
+    @abstractmethod
+    def exists(self, key: str) -> bool: ...
+
+    @abstractmethod
+    def put(self, key: str, data: bytes) -> bool:
+        """Store ``data`` unless ``key`` exists. Returns True if written."""
+
+    @abstractmethod
+    def get(self, key: str) -> bytes | None: ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None: ...
+
+    def local_path(self, key: str) -> Path | None:
+        """A filesystem path for ``key`` if the backend has one (lets the
+        API send the file with FileResponse)."""
+        return None
+
+
+class LocalImageStore(ImageStore):
+    has_local_paths = True
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._dirs: set[Path] = set()  # shard directories known to exist
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    def _legacy_path(self, key: str) -> Path:
+        # Before sharding every file sat directly in originals/
+        return self.root / PREFIX / key.rsplit("/", 1)[-1]
+
+    def _ensure_dir(self, directory: Path) -> None:
+        if directory in self._dirs:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self._dirs.add(directory)
+
+    def local_path(self, key: str) -> Path | None:
+        path = self._path(key)
+        if path.is_file():
+            return path
+        legacy = self._legacy_path(key)
+        return legacy if legacy.is_file() else None
+
+    def exists(self, key: str) -> bool:
+        return self.local_path(key) is not None
+
+    def put(self, key: str, data: bytes) -> bool:
+        if self.exists(key):
+            return False
+        path = self._path(key)
+        self._ensure_dir(path.parent)
+        _atomic_write(path, data)
+        return True
+
+    def get(self, key: str) -> bytes | None:
+        path = self.local_path(key)
+        return path.read_bytes() if path is not None else None
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+        self._legacy_path(key).unlink(missing_ok=True)
+
+    def migrate_flat_layout(self) -> int:
+        """Move files from the pre-sharding flat directory into their
+        shards. Safe to run while serving: lookups fall back to the flat
+        path until a file has moved. Returns the number moved."""
+        flat = self.root / PREFIX
+        if not flat.is_dir():
+            return 0
+        moved = 0
+        with os.scandir(flat) as entries:
+            for entry in entries:
+                if not entry.is_file() or len(entry.name) < 64 or entry.name.startswith("."):
+                    continue
+                target = self._path(image_key(entry.name[:64])).parent / entry.name
+                self._ensure_dir(target.parent)
+                os.replace(entry.path, target)
+                moved += 1
+        if moved:
+            logger.info("Moved %d stored images into shard directories", moved)
+        return moved
+
+
+class LocalObjectClient:
+    """Stand-in for a boto3 S3 client backed by a directory, implementing
+    the calls ObjectImageStore makes (one subdirectory per bucket)."""
+
+    class NoSuchKey(Exception):
+        pass
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def _path(self, bucket: str, key: str) -> Path:
+        return self.root / bucket / key
+
+    def head_object(self, Bucket: str, Key: str) -> dict:
+        path = self._path(Bucket, Key)
+        if not path.is_file():
+            raise self.NoSuchKey(Key)
+        return {"ContentLength": path.stat().st_size}
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes, **kwargs) -> dict:
+        path = self._path(Bucket, Key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _atomic_write(path, Body)  # object stores never expose partial objects
+        return {}
+
+    def get_object(self, Bucket: str, Key: str) -> dict:
+        path = self._path(Bucket, Key)
+        if not path.is_file():
+            raise self.NoSuchKey(Key)
+        return {"Body": path.open("rb")}
+
+    def delete_object(self, Bucket: str, Key: str) -> dict:
+        self._path(Bucket, Key).unlink(missing_ok=True)
+        return {}
+
+
+def _is_missing(error: Exception) -> bool:
+    if isinstance(error, LocalObjectClient.NoSuchKey):
+        return True
+    # botocore.exceptions.ClientError
+    code = getattr(error, "response", {}).get("Error", {}).get("Code")
+    return code in ("404", "NoSuchKey", "NotFound")
+
+
+class ObjectImageStore(ImageStore):
+    def __init__(self, client, bucket: str, prefix: str = ""):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+        except Exception as e:
+            if _is_missing(e):
+                return False
+            raise
+        return True
+
+    def put(self, key: str, data: bytes) -> bool:
+        if self.exists(key):
+            return False
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data)
+        return True
+
+    def get(self, key: str) -> bytes | None:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)
+        except Exception as e:
+            if _is_missing(e):
+                return None
+            raise
+        with response["Body"] as body:
+            return body.read()
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+
+def _object_client():
+    endpoint = settings.storage_endpoint_url
+    if endpoint and endpoint.startswith("file://"):
+        return LocalObjectClient(Path(endpoint.removeprefix("file://")))
+    try:
+        import boto3
+    except ImportError as e:
+        raise RuntimeError("storage_backend=object requires boto3 (pip install boto3)") from e
+    return boto3.client("s3", endpoint_url=endpoint or None)
+
+
+_store: ImageStore | None = None
+
+
+def get_store() -> ImageStore:
+    global _store
+    if _store is None:
+        if settings.storage_backend == "object":
+            _store = ObjectImageStore(
+                _object_client(), settings.storage_bucket, settings.storage_prefix
+            )
+        else:
+            _store = LocalImageStore(settings.upload_dir)
+    return _store
+
+
+# ---------- Image API used by the rest of the app ----------
+
+def save_image(file_bytes: bytes, sha256_hash: str) -> str:
+    """Store a processed image; a no-op if that content is already stored."""
+    key = image_key(sha256_hash)
+    get_store().put(key, file_bytes)
+    return key
+
+
+def save_original(file_bytes: bytes | memoryview, sha256_hash: str) -> str | None:
+    """Keep the uploaded file next to its thumbnail (``keep_originals``)."""
+    if not settings.keep_originals:
+        return None
+    key = image_key(sha256_hash, original=True)
+    get_store().put(key, bytes(file_bytes))
+    return key
+
+
+def find_key(sha256_hash: str, original: bool = False) -> str | None:
+    """Key a stored image is under, or None if it is missing: one lookup,
+    more only for images stored under a legacy extension key (or missing)."""
+    store = get_store()
+    for key in [image_key(sha256_hash, original), *_legacy_keys(sha256_hash, original)]:
+        if store.exists(key):
+            return key
+    return None
+
+
+def image_exists(sha256_hash: str, original: bool = False) -> bool:
+    return find_key(sha256_hash, original) is not None
+
+
+def find_image(sha256_hash: str, original: bool = False) -> Path | None:
+    """Local path of a stored image. None if it is missing or the backend
+    is not on the filesystem."""
+    key = find_key(sha256_hash, original)
+    return get_store().local_path(key) if key is not None else None
+
+
+def load_image(sha256_hash: str, original: bool = False) -> bytes | None:
+    store = get_store()
+    data = store.get(image_key(sha256_hash, original))  # no existence check first
+    if data is None:
+        key = find_key(sha256_hash, original)
+        data = store.get(key) if key is not None else None
+    return data
+
+
+def delete_image(sha256_hash: str) -> None:
+    """Remove a thumbnail and any kept original."""
+    store = get_store()
+    for original in (False, True):
+        for key in [image_key(sha256_hash, original), *_legacy_keys(sha256_hash, original)]:
+            store.delete(key)
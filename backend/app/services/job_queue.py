@@ -0,0 +1,202 @@
+"""SQLite-backed queue of asynchronous analysis jobs.
+
+Jobs are rows in ``analysis_jobs`` and their uploads are files under
+``<upload_dir>/jobs``, so queued work survives a restart. Workers (in any
+number of processes) claim the oldest runnable job with a single
+``UPDATE ... RETURNING``, which SQLite serialises, so a job is never
+handed to two workers at once. The owner renews its lease while the job
+runs; a job whose lease expires (its worker died) is claimed again, and
+every later write by the previous owner is fenced off by the claim's
+``started_at``.
+"""
+
+import asyncio
+import json
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from sqlalchemy import and_, func, or_, select, update
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.job import JOB_DONE, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, AnalysisJob
+
+
+# Set by notify() so idle workers in this process start at once; jobs
+# queued by other processes are picked up by polling
+_wakeup: asyncio.Event | None = None
+
+
+def _utcnow() -> datetime:
+    # Stored DateTimes are naive UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def jobs_dir() -> Path:
+    return settings.upload_dir / "jobs"
+
+
+def upload_path(job: AnalysisJob) -> Path:
+    return jobs_dir() / job.upload_name
+
+
+def enqueue(
+    data: bytes | memoryview,
+    image_name: str,
+    content_type: str | None,
+    content_sha256: str,
+    extension: str,
+) -> AnalysisJob:
+    """Store the upload and queue it. The file is written (atomically)
+    before the row exists, so a claimed job always has its upload."""
+    job_id = uuid.uuid4().hex
+    directory = jobs_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    upload_name = f"{job_id}{extension}"
+    tmp = directory / f"{upload_name}.tmp"
+    tmp.write_bytes(data)
+    os.replace(tmp, directory / upload_name)
+
+    job = AnalysisJob(
+        id=job_id,
+        status=JOB_QUEUED,
+        image_name=image_name,
+        content_type=content_type,
+        content_sha256=content_sha256,
+        upload_name=upload_name,
+        attempts=0,
+        created_at=_utcnow(),
+    )
+    with SessionLocal(expire_on_commit=False) as db:
+        db.add(job)
+        db.commit()
+    return job
+
+
+def claim() -> AnalysisJob | None:
+    """Take the oldest queued job, or a running one whose lease expired."""
+    now = _utcnow()
+    runnable = or_(
+        AnalysisJob.status == JOB_QUEUED,
+        and_(AnalysisJob.status == JOB_RUNNING, AnalysisJob.lease_expires_at < now),
+    )
+    oldest = (
+        select(AnalysisJob.id)
+        .where(runnable)
+        .order_by(AnalysisJob.created_at, AnalysisJob.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    stmt = (
+        update(AnalysisJob)
+        .where(AnalysisJob.id == oldest, runnable)
+        .values(
+            status=JOB_RUNNING,
+            attempts=AnalysisJob.attempts + 1,
+            started_at=now,
+            lease_expires_at=now + timedelta(seconds=settings.job_lease_s),
+        )
+        .returning(AnalysisJob)
+        .execution_options(synchronize_session=False)
+    )
+    with SessionLocal(expire_on_commit=False) as db:
+        job = db.scalars(stmt).first()
+        db.commit()
+    return job
+
+
+def _owned(job: AnalysisJob):
+    """Still running under the claim ``job`` came from: each claim sets a
+    new ``started_at``, which renew() leaves alone."""
+    return and_(
+        AnalysisJob.id == job.id,
+        AnalysisJob.status == JOB_RUNNING,
+        AnalysisJob.started_at == job.started_at,
+    )
+
+
+def _update_owned(job: AnalysisJob, **values) -> bool:
+    with SessionLocal() as db:
+        result = db.execute(update(AnalysisJob).where(_owned(job)).values(**values))
+        db.commit()
+    return result.rowcount > 0
+
+
+def renew(job: AnalysisJob) -> bool:
+    """Extend the lease of a job this worker is running. False if it has
+    been claimed by another worker since (the lease had expired)."""
+    return _update_owned(
+        job, lease_expires_at=_utcnow() + timedelta(seconds=settings.job_lease_s)
+    )
+
+
+def _finish(job: AnalysisJob, **values) -> bool:
+    return _update_owned(job, finished_at=_utcnow(), lease_expires_at=None, **values)
+
+
+def complete(job: AnalysisJob, scan_id: int, response: dict) -> bool:
+    """Record the result. False (and the upload is left for the new
+    owner) if the job was claimed by another worker meanwhile."""
+    if not _finish(job, status=JOB_DONE, scan_id=scan_id, result_json=json.dumps(response)):
+        return False
+    upload_path(job).unlink(missing_ok=True)
+    return True
+
+
+def fail(job: AnalysisJob, error: str) -> bool:
+    if not _finish(job, status=JOB_FAILED, error=error):
+        return False
+    upload_path(job).unlink(missing_ok=True)
+    return True
+
+
+def release(job: AnalysisJob, error: str | None = None, count_attempt: bool = True) -> bool:
+    """Put a claimed job back at its place in the queue."""
+    values = {"status": JOB_QUEUED, "lease_expires_at": None, "error": error}
+    if not count_attempt:
+        values["attempts"] = AnalysisJob.attempts - 1
+    return _update_owned(job, **values)
+
+
+def get(job_id: str) -> tuple[AnalysisJob, int | None] | None:
+    """The job and, while it is queued, how many jobs are ahead of it."""
+    with SessionLocal(expire_on_commit=False) as db:
+        job = db.get(AnalysisJob, job_id)
+        if job is None:
+            return None
+        position = None
+        if job.status == JOB_QUEUED:
+            position = db.scalar(
+                select(func.count())
+                .select_from(AnalysisJob)
+                .where(
+                    AnalysisJob.status == JOB_QUEUED,
+                    AnalysisJob.created_at < job.created_at,
+                )
+            )
+    return job, position
+
+
+def notify() -> None:
+    """Wake this process's idle workers (call from the event loop)."""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+async def wait_for_work(timeout: float) -> None:
+    global _wakeup
+    if _wakeup is None:
+        _wakeup = asyncio.Event()
+    try:
+        await asyncio.wait_for(_wakeup.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    _wakeup.clear()
+
+
+def reset_wakeup() -> None:
+    """Forget the event (it belongs to the event loop that is stopping)."""
+    global _wakeup
+    _wakeup = None
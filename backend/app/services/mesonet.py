@@ -0,0 +1,88 @@
+"""MesoNet-4 network and its optimized inference build.
+
+Kept apart from ``ai_detector`` so that torch (seconds to import) is only
+loaded by processes that actually load model weights.
+"""
+
+import copy
+
+import torch
+import torch.nn as nn
+
+from app.services.ai_detector import INPUT_SIZE
+
+
+# ---------- MesoNet-4 Architecture ----------
+class MesoNet4(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.conv1 = nn.Sequential(
+            nn.Conv2d(3, 8, 3, padding=1),
+            nn.BatchNorm2d(8),
+            nn.ReLU(),
+            nn.MaxPool2d(2, 2),
+        )
+        self.conv2 = nn.Sequential(
+            nn.Conv2d(8, 8, 5, padding=2),
+            nn.BatchNorm2d(8),
+            nn.ReLU(),
+            nn.MaxPool2d(2, 2),
+        )
+        self.conv3 = nn.Sequential(
+            nn.Conv2d(8, 16, 5, padding=2),
+            nn.BatchNorm2d(16),
+            nn.ReLU(),
+            nn.MaxPool2d(2, 2),
+        )
+        self.conv4 = nn.Sequential(
+            nn.Conv2d(16, 16, 5, padding=2),
+            nn.BatchNorm2d(16),
+            nn.ReLU(),
+            nn.MaxPool2d(4, 4),
+        )
+        self.fc = nn.Sequential(
+            nn.Flatten(),
+            nn.Linear(16 * 4 * 4, 16),
+            nn.ReLU(),
+            nn.Dropout(0.5),
+            nn.Linear(16, 1),
+            nn.Sigmoid(),
+        )
+
+    def forward(self, x):
+        x = self.conv1(x)
+        x = self.conv2(x)
+        x = self.conv3(x)
+        x = self.conv4(x)
+        return self.fc(x)
+
+
+# ---------- Optimized inference engine ----------
+def _fold_batchnorm(model: MesoNet4) -> nn.Module:
+    """Fold each eval-mode BatchNorm into the preceding convolution."""
+    from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+    folded = copy.deepcopy(model)
+    for name in ("conv1", "conv2", "conv3", "conv4"):
+        conv, bn, *rest = getattr(folded, name)
+        setattr(folded, name, nn.Sequential(fuse_conv_bn_eval(conv, bn), *rest))
+    return folded.eval()
+
+
+def build_inference_model(
+    model: MesoNet4, quantize: bool = False, channels_last: bool = False
+) -> torch.jit.ScriptModule:
+    """BN-folded, optionally int8 (dynamic, Linear layers), traced and
+    frozen copy of an eval-mode MesoNet."""
+    engine = _fold_batchnorm(model)
+    if quantize:
+        engine = torch.ao.quantization.quantize_dynamic(
+            engine, {nn.Linear}, dtype=torch.qint8
+        )
+    example = torch.zeros(1, 3, INPUT_SIZE, INPUT_SIZE)
+    if channels_last:
+        engine = engine.to(memory_format=torch.channels_last)
+        example = example.to(memory_format=torch.channels_last)
+    with torch.no_grad():
+        traced = torch.jit.trace(engine, example)
+    return torch.jit.freeze(traced.eval())
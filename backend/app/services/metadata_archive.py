@@ -0,0 +1,116 @@
+"""Monthly packs of archived ``metadata_json`` payloads.
+
+Once scans pass ``metadata_archive_after_days`` their metadata documents
+move out of SQLite into ``metadata-YYYY-MM.tsv.gz`` under the archive
+directory (by the month of the scan), and the row keeps only the month
+in ``metadata_archive``. Each line is ``<scan id>\\t<timestamp>\\t<json>``;
+the JSON is stored as it was, and ``json.dumps`` output contains no raw
+tabs or newlines. Every archived batch is appended as its own gzip member
+(a concatenation of members is a valid gzip file), so a pack is never
+rewritten.
+
+Scans are archived oldest first, so a pack is sorted by (timestamp, id):
+the history order. ``PackReader`` relies on that to read packs forward
+only while the export walks the history.
+"""
+
+import gzip
+import os
+from datetime import datetime
+from pathlib import Path
+
+from app.config import settings
+
+
+def archive_dir() -> Path:
+    return settings.metadata_archive_dir or settings.upload_dir / "archive"
+
+
+def pack_month(timestamp: datetime) -> str:
+    return timestamp.strftime("%Y-%m")
+
+
+def pack_path(month: str) -> Path:
+    return archive_dir() / f"metadata-{month}.tsv.gz"
+
+
+def _timestamp_key(timestamp: datetime | None) -> str:
+    # Fixed width, so keys compare like the timestamps
+    return timestamp.isoformat(timespec="microseconds") if timestamp else ""
+
+
+def append_to_pack(month: str, entries: list[tuple[int, datetime, str]]) -> int:
+    """Append (scan id, timestamp, metadata JSON) entries to a month's pack
+    and flush them to disk. Returns the compressed bytes written."""
+    path = pack_path(month)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines = "".join(
+        f"{scan_id}\t{_timestamp_key(timestamp)}\t{metadata}\n"
+        for scan_id, timestamp, metadata in entries
+    )
+    with path.open("ab") as f:
+        start = f.tell()
+        f.write(gzip.compress(lines.encode()))
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell() - start
+
+
+def delete_pack(month: str) -> int:
+    """Remove a pack whose scans are all gone. Returns the bytes freed."""
+    path = pack_path(month)
+    try:
+        size = path.stat().st_size
+        path.unlink()
+    except FileNotFoundError:
+        return 0
+    return size
+
+
+class PackReader:
+    """Looks up archived metadata for scans requested in (timestamp, id)
+    order, reading each pack once from start to end."""
+
+    def __init__(self):
+        self.month: str | None = None
+        self._file = None
+        self._line: tuple[str, int, str] | None = None  # read, not yet passed
+
+    def _open(self, month: str) -> None:
+        self.close()
+        self.month = month
+        path = pack_path(month)
+        if path.is_file():
+            self._file = gzip.open(path, "rt", encoding="utf-8")
+
+    def _next(self) -> tuple[str, int, str] | None:
+        line = self._file.readline() if self._file is not None else ""
+        if not line:
+            return None
+        scan_id, timestamp, metadata = line.rstrip("\n").split("\t", 2)
+        return timestamp, int(scan_id), metadata
+
+    def get(self, month: str, timestamp: datetime | None, scan_id: int) -> str | None:
+        """The metadata JSON of an archived scan, or None if its pack does
+        not have it (or the request came out of order)."""
+        if month != self.month:
+            self._open(month)
+        wanted = (_timestamp_key(timestamp), scan_id)
+        while True:
+            if self._line is None:
+                self._line = self._next()
+                if self._line is None:
+                    return None
+            key = self._line[:2]
+            if key == wanted:
+                return self._line[2]
+            if key > wanted:
+                return None  # keep the line for a later request
+            self._line = None
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self._line = None
+        self.month = None
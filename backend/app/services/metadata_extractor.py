@@ -1,14 +1,48 @@
 import logging
-from io import BytesIO
+from datetime import datetime
 
-from PIL import Image, ExifTags
+from PIL import ExifTags
 import piexif
 
+from app.config import settings
+from app.services.exif_reader import UnsupportedLayout, parse_exif_block, read_exif
+from app.services.image_context import ImageContext, as_image_context
+
 logger = logging.getLogger(__name__)
 
 SUSPICIOUS_SOFTWARE = ["photoshop", "gimp", "canva", "affinity", "pixlr", "paint.net"]
 
 
+def editing_software(software: str | None) -> str | None:
+    """The SUSPICIOUS_SOFTWARE family a Software tag belongs to, if any."""
+    if not software:
+        return None
+    sw_lower = software.lower()
+    return next((sus for sus in SUSPICIOUS_SOFTWARE if sus in sw_lower), None)
+
+
+def parse_exif_datetime(value: str | None) -> datetime | None:
+    """EXIF "YYYY:MM:DD HH:MM:SS" -> datetime; None if missing or malformed."""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value.strip()[:19], "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
+
+
+def promoted_metadata(metadata: dict) -> dict:
+    """The extract_metadata fields stored in their own indexed Scan columns."""
+    return {
+        "has_exif": bool(metadata.get("has_exif")),
+        "camera_make": metadata.get("camera_make"),
+        "camera_model": metadata.get("camera_model"),
+        "software_detected": metadata.get("software"),
+        "editing_software": editing_software(metadata.get("software")),
+        "date_taken": parse_exif_datetime(metadata.get("date_taken")),
+    }
+
+
 def _convert_gps_to_decimal(gps_data: dict) -> dict | None:
     try:
         lat_ref = gps_data.get(piexif.GPSIFD.GPSLatitudeRef, b"N")
@@ -44,8 +78,8 @@ def _convert_gps_to_decimal(gps_data: dict) -> dict | None:
         return None
 
 
-def extract_metadata(file_bytes: bytes) -> dict:
-    result = {
+def _empty_result() -> dict:
+    return {
         "has_exif": False,
         "metadata_status": "Unknown",
         "camera_model": None,
@@ -57,8 +91,99 @@ def extract_metadata(file_bytes: bytes) -> dict:
         "all_tags": {},
     }
 
+
+def _text(value) -> str:
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="ignore").strip()
+    return value
+
+
+def _text_field(ifd: dict, tag: int) -> str:
+    """A string tag's value; "" when absent or stored with a non-text
+    type (a corrupted field type decodes to numbers)."""
+    value = _text(ifd.get(tag, b""))
+    return value if isinstance(value, str) else ""
+
+
+def _warn_software(result: dict, software: str) -> None:
+    if editing_software(software):
+        result["warnings"].append(f"Editing software detected: {software}")
+
+
+def _mark_no_exif(result: dict) -> None:
+    result["metadata_status"] = "Inconclusive / Stripped"
+    result["warnings"].append(
+        "No EXIF data found. This image may be synthetic or have been "
+        "processed by social media/editing software."
+    )
+
+
+def _apply_exif(result: dict, exif_dict: dict) -> None:
+    """Fill ``result`` from a piexif-style IFD dict (piexif.load or
+    exif_reader.read_exif)."""
+    zeroth = exif_dict.get("0th", {})
+    exif_ifd = exif_dict.get("Exif", {})
+    gps_ifd = exif_dict.get("GPS", {})
+
+    # Camera model / make, software, date taken
+    model = _text_field(zeroth, piexif.ImageIFD.Model)
+    if model:
+        result["camera_model"] = model
+    make = _text_field(zeroth, piexif.ImageIFD.Make)
+    if make:
+        result["camera_make"] = make
+    software = _text_field(zeroth, piexif.ImageIFD.Software)
+    if software:
+        result["software"] = software
+        _warn_software(result, software)
+    date_taken = _text_field(exif_ifd, piexif.ExifIFD.DateTimeOriginal)
+    if date_taken:
+        result["date_taken"] = date_taken
+
+    # GPS
+    if gps_ifd:
+        gps = _convert_gps_to_decimal(gps_ifd)
+        if gps:
+            result["gps"] = gps
+
+    result["has_exif"] = True
+    result["metadata_status"] = "Present"
+
+    all_tags = {}
+    for ifd_name in ("0th", "Exif", "1st"):
+        names = piexif.TAGS.get(ifd_name, {})
+        for tag_id, value in exif_dict.get(ifd_name, {}).items():
+            tag_name = names.get(tag_id, {}).get("name", str(tag_id))
+            all_tags[tag_name] = str(_text(value))[:200]
+    result["all_tags"] = all_tags
+
+
+def extract_metadata(source: ImageContext | bytes) -> dict:
+    """EXIF-derived metadata in the MetadataResult shape.
+
+    The header-only reader handles JPEG/PNG uploads without opening them
+    with Pillow; files it declines go through Pillow and piexif."""
+    ctx = as_image_context(source)
+    if settings.metadata_fast_path:
+        try:
+            exif_dict = read_exif(ctx.raw)
+        except UnsupportedLayout as e:
+            logger.debug("Header-only EXIF reader declined: %s", e)
+        else:
+            result = _empty_result()
+            if exif_dict is not None:
+                _apply_exif(result, exif_dict)
+            else:
+                _mark_no_exif(result)
+            return result
+    return _extract_with_pillow(ctx)
+
+
+def _extract_with_pillow(ctx: ImageContext) -> dict:
+    result = _empty_result()
+
     try:
-        img = Image.open(BytesIO(file_bytes))
+        img = ctx.image
         logger.info(
             "Image opened for metadata extraction: format=%s, size=%s, mode=%s",
             img.format, img.size, img.mode,
@@ -67,7 +192,7 @@ def extract_metadata(file_bytes: bytes) -> dict:
         logger.error(
             "Pillow failed to open image for metadata extraction: %s "
             "(file_bytes length=%d, first 16 bytes=%r)",
-            e, len(file_bytes), file_bytes[:16],
+            e, len(ctx.raw), bytes(ctx.raw[:16]),
         )
         result["metadata_status"] = "Error"
         result["warnings"].append(
@@ -78,8 +203,11 @@ def extract_metadata(file_bytes: bytes) -> dict:
 
     # Try piexif first for full EXIF access
     try:
-        raw_exif = img.info.get("exif", b"")
+        raw_exif = ctx.exif_bytes
         if raw_exif:
+            # piexif builds struct formats as "L" * count, so one corrupt
+            # entry count costs gigabytes; this fails first, cheaply
+            parse_exif_block(raw_exif)
             exif_dict = piexif.load(raw_exif)
             logger.debug("piexif loaded EXIF data: IFDs present=%s",
                          [k for k in exif_dict if exif_dict.get(k)])
@@ -91,118 +219,45 @@ def extract_metadata(file_bytes: bytes) -> dict:
         exif_dict = None
         logger.warning(
             "piexif.load() failed: %s (raw exif length=%d)",
-            e, len(img.info.get("exif", b"")),
+            e, len(ctx.exif_bytes),
         )
 
     if exif_dict:
-        zeroth = exif_dict.get("0th", {})
-        exif_ifd = exif_dict.get("Exif", {})
-        gps_ifd = exif_dict.get("GPS", {})
-
-        # Camera model
-        model = zeroth.get(piexif.ImageIFD.Model, b"")
-        if isinstance(model, bytes):
-            model = model.decode("utf-8", errors="ignore").strip()
-        if model:
-            result["camera_model"] = model
-
-        # Camera make
-        make = zeroth.get(piexif.ImageIFD.Make, b"")
-        if isinstance(make, bytes):
-            make = make.decode("utf-8", errors="ignore").strip()
-        if make:
-            result["camera_make"] = make
-
-        # Software
-        software = zeroth.get(piexif.ImageIFD.Software, b"")
-        if isinstance(software, bytes):
-            software = software.decode("utf-8", errors="ignore").strip()
-        if software:
-            result["software"] = software
-            sw_lower = software.lower()
-            for sus in SUSPICIOUS_SOFTWARE:
-                if sus in sw_lower:
-                    result["warnings"].append(
-                        f"Editing software detected: {software}"
-                    )
-                    break
-
-        # Date taken
-        date_taken = exif_ifd.get(piexif.ExifIFD.DateTimeOriginal, b"")
-        if isinstance(date_taken, bytes):
-            date_taken = date_taken.decode("utf-8", errors="ignore").strip()
-        if date_taken:
-            result["date_taken"] = date_taken
-
-        # GPS
-        if gps_ifd:
-            gps = _convert_gps_to_decimal(gps_ifd)
-            if gps:
-                result["gps"] = gps
-
-        result["has_exif"] = True
-        result["metadata_status"] = "Present"
+        _apply_exif(result, exif_dict)
+        return result
 
     # Fallback: try PIL EXIF tags
-    if not result["has_exif"]:
-        try:
-            pil_exif = img._getexif()
-            if pil_exif:
-                result["has_exif"] = True
-                result["metadata_status"] = "Present"
-                tag_map = {ExifTags.TAGS.get(k, k): v for k, v in pil_exif.items()}
-                result["all_tags"] = {
-                    str(k): str(v)[:200] for k, v in tag_map.items()
-                }
-                if "Model" in tag_map:
-                    result["camera_model"] = str(tag_map["Model"])
-                if "Make" in tag_map:
-                    result["camera_make"] = str(tag_map["Make"])
-                if "Software" in tag_map:
-                    sw = str(tag_map["Software"])
-                    result["software"] = sw
-                    sw_lower = sw.lower()
-                    for sus in SUSPICIOUS_SOFTWARE:
-                        if sus in sw_lower:
-                            result["warnings"].append(
-                                f"Editing software detected: {sw}"
-                            )
-                            break
-                if "DateTimeOriginal" in tag_map:
-                    result["date_taken"] = str(tag_map["DateTimeOriginal"])
-        except Exception as e:
-            logger.warning(
-                "PIL _getexif() failed: %s (image format=%s, mode=%s)",
-                e, img.format, img.mode,
-            )
+    try:
+        pil_exif = img._getexif()
+        if pil_exif:
+            result["has_exif"] = True
+            result["metadata_status"] = "Present"
+            tag_map = {ExifTags.TAGS.get(k, k): v for k, v in pil_exif.items()}
+            result["all_tags"] = {
+                str(k): str(v)[:200] for k, v in tag_map.items()
+            }
+            if "Model" in tag_map:
+                result["camera_model"] = str(tag_map["Model"])
+            if "Make" in tag_map:
+                result["camera_make"] = str(tag_map["Make"])
+            if "Software" in tag_map:
+                sw = str(tag_map["Software"])
+                result["software"] = sw
+                _warn_software(result, sw)
+            if "DateTimeOriginal" in tag_map:
+                result["date_taken"] = str(tag_map["DateTimeOriginal"])
+    except Exception as e:
+        logger.warning(
+            "PIL _getexif() failed: %s (image format=%s, mode=%s)",
+            e, img.format, img.mode,
+        )
 
     if not result["has_exif"]:
-        result["metadata_status"] = "Inconclusive / Stripped"
-        result["warnings"].append(
-            "No EXIF data found. This image may be synthetic or have been "
-            "processed by social media/editing software."
-        )
+        _mark_no_exif(result)
         logger.info(
             "No EXIF data found for image (format=%s, size=%s, mode=%s, "
             "info_keys=%s). Marking as Inconclusive / Stripped.",
             img.format, img.size, img.mode, list(img.info.keys()),
         )
 
-    # Build all_tags from piexif if available
-    if exif_dict and not result["all_tags"]:
-        all_tags = {}
-        for ifd_name in ("0th", "Exif", "1st"):
-            ifd = exif_dict.get(ifd_name, {})
-            for tag_id, value in ifd.items():
-                tag_name = piexif.TAGS.get(ifd_name, {}).get(tag_id, {}).get(
-                    "name", str(tag_id)
-                )
-                if isinstance(value, bytes):
-                    try:
-                        value = value.decode("utf-8", errors="ignore").strip()
-                    except Exception:
-                        value = repr(value)
-                all_tags[tag_name] = str(value)[:200]
-        result["all_tags"] = all_tags
-
     return result
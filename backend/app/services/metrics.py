@@ -0,0 +1,357 @@
+"""In-process metrics served at ``/metrics`` in Prometheus text format.
+
+Counters, gauges and histograms are plain Python objects updated under a
+per-metric lock, so recording a sample costs a dict lookup, a bisect and
+an addition.
+
+With several uvicorn workers each process only sees its own requests.
+When ``settings.metrics_dir`` is set, every process periodically writes a
+snapshot of its metrics to ``<metrics_dir>/metrics-<pid>-<token>.json`` and a
+scrape merges the snapshots of all processes: counters and histograms
+are summed (including those of exited workers, so totals never go
+backwards), gauges only over processes that are still alive. Point it at
+a directory that is emptied on deployment.
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; analysis stages range from sub-millisecond to whole seconds
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: dict[tuple, object] = {}
+
+    def _check(self, labels: tuple) -> None:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [[list(k), self._copy(v)] for k, v in self._values.items()]
+
+    def _copy(self, value):
+        return value
+
+    def header(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self._check(labels)
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    @staticmethod
+    def merge(values: list) -> float:
+        return sum(values)
+
+    def render(self, samples: dict[tuple, object]) -> list[str]:
+        return [
+            f"{self.name}{_labels(self.labelnames, k)} {_number(v)}"
+            for k, v in sorted(samples.items())
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float) -> None:
+        self._check(labels)
+        with self._lock:
+            self._values[labels] = value
+
+    @contextmanager
+    def track(self, *labels) -> Iterator[None]:
+        """Count the enclosed block as in progress."""
+        self.inc(*labels)
+        try:
+            yield
+        finally:
+            self.dec(*labels)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *labels, value: float) -> None:
+        self._check(labels)
+        # Per-bucket (non-cumulative) counts; the last slot is +Inf
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, *labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(*labels, value=time.perf_counter() - start)
+
+    def _copy(self, value):
+        return [list(value[0]), value[1]]
+
+    def merge(self, values: list) -> list:
+        counts = [0] * (len(self.buckets) + 1)
+        total = 0.0
+        for bucket_counts, value_sum in values:
+            if len(bucket_counts) != len(counts):
+                continue  # written with other buckets (older deployment)
+            counts = [a + b for a, b in zip(counts, bucket_counts)]
+            total += value_sum
+        return [counts, total]
+
+    def render(self, samples: dict[tuple, object]) -> list[str]:
+        lines = []
+        for key, (counts, value_sum) in sorted(samples.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = _labels(self.labelnames, key, f'le="{_number(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            plain = _labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{plain} {_number(value_sum)}")
+            lines.append(f"{self.name}_count{plain} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._flusher: threading.Thread | None = None
+        self._snapshot_name: tuple[int, str] | None = None  # (pid, file name)
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = (), **kwargs
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, **kwargs))
+
+    def snapshot(self) -> dict:
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    # ---------- Multi-process aggregation ----------
+
+    def _snapshot_path(self, directory: Path) -> Path:
+        """This process's snapshot file. The name adds a random token to the
+        PID: a process that gets a dead worker's PID must not overwrite that
+        worker's counter totals (they would go backwards, which Prometheus
+        reads as a reset). A forked child gets a new token."""
+        pid = os.getpid()
+        if self._snapshot_name is None or self._snapshot_name[0] != pid:
+            self._snapshot_name = (pid, f"metrics-{pid}-{uuid.uuid4().hex[:12]}.json")
+        return directory / self._snapshot_name[1]
+
+    def write_snapshot(self) -> None:
+        directory = settings.metrics_dir
+        if directory is None:
+            return
+        path = self._snapshot_path(directory)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"pid": os.getpid(), "metrics": self.snapshot()}))
+        os.replace(tmp, path)  # readers never see a partial file
+
+    def _read_snapshots(self) -> list[tuple[bool, dict]]:
+        """(alive, metrics) for every process that has written a snapshot;
+        this process's own entry is taken live."""
+        own = self._snapshot_path(settings.metrics_dir)
+        result = [(True, self.snapshot())]
+        for path in settings.metrics_dir.glob("metrics-*.json"):
+            if path == own:
+                continue
+            try:
+                data = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            result.append((_alive(data.get("pid")), data.get("metrics", {})))
+        return result
+
+    def start_flusher(self) -> None:
+        """Periodically publish this process's snapshot (multi-process mode)."""
+        directory = settings.metrics_dir
+        if directory is None or self._flusher is not None:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+
+        def loop():
+            while True:
+                try:
+                    self.write_snapshot()
+                except OSError as e:
+                    logger.warning("Cannot write metrics snapshot: %s", e)
+                time.sleep(settings.metrics_flush_interval_s)
+
+        self._flusher = threading.Thread(target=loop, name="metrics-flush", daemon=True)
+        self._flusher.start()
+        atexit.register(self.write_snapshot)
+
+    def render(self) -> str:
+        if settings.metrics_dir is None:
+            sources = [(True, self.snapshot())]
+        else:
+            sources = self._read_snapshots()
+
+        lines = []
+        for name, metric in self._metrics.items():
+            grouped: dict[tuple, list] = {}
+            for alive, metrics in sources:
+                if isinstance(metric, Gauge) and not alive:
+                    continue  # an exited worker has nothing in flight
+                for key, value in metrics.get(name, ()):
+                    grouped.setdefault(tuple(key), []).append(value)
+            lines.extend(metric.header())
+            lines.extend(metric.render({k: metric.merge(v) for k, v in grouped.items()}))
+        return "\n".join(lines) + "\n"
+
+
+def _alive(pid: int | None) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+registry = Registry()
+
+# ---------- VisionGuard metrics ----------
+
+STAGE_SECONDS = registry.histogram(
+    "visionguard_stage_duration_seconds",
+    "Time spent in each stage of POST /api/analyze.",
+    ("stage",),
+)
+DB_QUERY_SECONDS = registry.histogram(
+    "visionguard_db_query_duration_seconds",
+    "Time spent in database queries, by query.",
+    ("query",),
+)
+ANALYZE_REQUESTS = registry.counter(
+    "visionguard_analyze_requests_total",
+    "Analyze requests by outcome (analyzed, cached, rejected, invalid).",
+    ("outcome",),
+)
+VERDICTS = registry.counter(
+    "visionguard_verdicts_total",
+    "Verdicts returned for analyzed and cached uploads.",
+    ("verdict",),
+)
+RESULT_CACHE = registry.counter(
+    "visionguard_result_cache_total",
+    "Result cache lookups by result (hit, miss).",
+    ("result",),
+)
+UPLOAD_REJECTIONS = registry.counter(
+    "visionguard_upload_rejections_total",
+    "Uploads rejected before analysis, by HTTP status.",
+    ("status",),
+)
+IN_FLIGHT = registry.gauge(
+    "visionguard_analyses_in_flight",
+    "Analyses currently running in the pipeline.",
+)
+RETENTION_ITEMS = registry.counter(
+    "visionguard_retention_items_total",
+    "Items removed or archived by the retention job, by action "
+    "(image_evicted, scan_deleted, job_deleted, metadata_archived).",
+    ("action",),
+)
+RETENTION_RECLAIMED_BYTES = registry.counter(
+    "visionguard_retention_reclaimed_bytes_total",
+    "Bytes reclaimed by the retention job, by kind (images, metadata, database).",
+    ("kind",),
+)
+RETENTION_BATCH_SECONDS = registry.histogram(
+    "visionguard_retention_batch_duration_seconds",
+    "Time spent in each batch (one transaction) of the retention job, by task.",
+    ("task",),
+)
+STORED_IMAGE_BYTES = registry.gauge(
+    "visionguard_stored_image_bytes",
+    "Bytes of stored thumbnails, as of the last retention run.",
+)
+
+
+def observe_stages(timings: dict[str, float]) -> None:
+    """Record the per-stage timings returned by ``run_analysis``."""
+    for stage, seconds in timings.items():
+        STAGE_SECONDS.observe(stage, value=seconds)
@@ -0,0 +1,109 @@
+"""Dynamic micro-batching for model inference.
+
+Concurrent callers submit one preprocessed input each; a scheduler thread
+groups them into a single batch once ``max_batch_size`` inputs are queued
+or ``max_wait_ms`` has passed since the first one arrived, runs the batch
+function once and hands every caller its own output (an output that is
+an exception instance is raised to that caller only).
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections.abc import Callable, Sequence
+from concurrent.futures import Future
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()  # queued by close(); ends the scheduler loop
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        run_batch: Callable[[list[Any]], Sequence[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+        name: str = "micro-batcher",
+    ):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+        self._queue: queue.Queue[tuple[Any, Future]] = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def submit(self, item: Any) -> Future:
+        future: Future = Future()
+        # Under the lock, so the item cannot land behind a close()'s _STOP
+        with self._lock:
+            if self._thread is None:
+                self._start()
+            self._queue.put((item, future))
+        return future
+
+    def __call__(self, item: Any) -> Any:
+        """Submit and block until this item's output is ready."""
+        return self.submit(item).result()
+
+    def close(self, timeout: float | None = None) -> None:
+        """Run everything submitted so far, then stop the scheduler thread.
+        A later submit starts a new one, with its own queue."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return
+            self._queue.put((_STOP, None))
+        thread.join(timeout)
+
+    def _start(self) -> None:
+        # Each scheduler thread owns its queue: a _STOP is only ever seen by
+        # the thread it was meant for
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._loop, args=(self._queue,), name=self.name, daemon=True
+        )
+        self._thread.start()
+
+    def _collect(self, q: queue.Queue) -> list[tuple[Any, Future]]:
+        batch = [q.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size and batch[-1][0] is not _STOP:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(q.get_nowait())
+                else:
+                    batch.append(q.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self, q: queue.Queue) -> None:
+        while True:
+            batch = self._collect(q)
+            stop = batch[-1][0] is _STOP
+            if stop:
+                batch.pop()
+            if batch:
+                self._run(batch)
+            if stop:
+                return
+
+    def _run(self, batch: list[tuple[Any, Future]]) -> None:
+        items = [item for item, _ in batch]
+        try:
+            outputs = self.run_batch(items)
+        except Exception as e:
+            logger.error("%s: batch of %d failed: %s", self.name, len(items), e)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), output in zip(batch, outputs):
+            if isinstance(output, Exception):
+                future.set_exception(output)  # per-item failure
+            else:
+                future.set_result(output)
@@ -0,0 +1,50 @@
+"""64-bit perceptual hashes for near-duplicate lookup.
+
+Both are computed from a small grayscale copy of the analysis thumbnail,
+so they survive re-encoding, resizing and light cropping:
+
+- dHash: sign of horizontal gradients on a 9x8 image
+- pHash: low-frequency 8x8 DCT coefficients of a 32x32 image vs their median
+
+Hashes are stored in signed 64-bit INTEGER columns; ``to_signed`` and
+``to_unsigned`` convert between the two views.
+"""
+
+import cv2
+import numpy as np
+
+HASH_BITS = 64
+_SIGN_BIT = 1 << (HASH_BITS - 1)
+
+
+def _gray(rgb: np.ndarray, size: tuple[int, int]) -> np.ndarray:
+    gray = rgb if rgb.ndim == 2 else cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+
+def _pack(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def dhash(rgb: np.ndarray) -> int:
+    small = _gray(rgb, (9, 8)).astype(np.int16)
+    return _pack(small[:, 1:] > small[:, :-1])
+
+
+def phash(rgb: np.ndarray) -> int:
+    small = _gray(rgb, (32, 32)).astype(np.float32)
+    low = cv2.dct(small)[:8, :8]
+    return _pack(low > np.median(low))
+
+
+def image_hashes(rgb: np.ndarray) -> dict:
+    """{"dhash", "phash"} as signed 64-bit ints, ready for the Scan columns."""
+    return {"dhash": to_signed(dhash(rgb)), "phash": to_signed(phash(rgb))}
+
+
+def to_signed(value: int) -> int:
+    return value - (1 << HASH_BITS) if value & _SIGN_BIT else value
+
+
+def to_unsigned(value: int) -> int:
+    return value & ((1 << HASH_BITS) - 1)
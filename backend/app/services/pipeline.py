@@ -0,0 +1,167 @@
+"""CPU-bound analysis stages.
+
+Everything in here is synchronous and free of request/DB state so it can
+run inline, in a thread, or inside a worker process.
+"""
+
+import logging
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from app.config import settings
+from app.services.ai_detector import AIDetector
+from app.services.image_context import ImageContext
+from app.services.metadata_extractor import extract_metadata
+from app.services.ela_analyzer import compute_ela_diff, heatmap_pixels, perform_ela
+from app.services.perceptual_hash import image_hashes
+from app.startup import report
+
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever a stage changes its output; part of the result cache key.
+ANALYSIS_VERSION = "3"
+
+
+class InvalidImageError(ValueError):
+    """The upload could not be decoded as an image."""
+
+
+_NO_AI_RESULT = {
+    "deepfake_probability": 0.0,
+    "confidence": 0.0,
+    "model_used": "none",
+}
+
+# One detector per process (the API process or each pool worker)
+_detector: AIDetector | None = None
+_detector_lock = threading.Lock()  # concurrent first requests load it once
+
+
+def get_detector() -> AIDetector | None:
+    global _detector
+    if _detector is not None:
+        return _detector
+    with _detector_lock:
+        if _detector is not None:
+            return _detector
+        with report.phase("model_load"):
+            try:
+                logger.info("Loading AI model...")
+                _detector = AIDetector(
+                    model_path=settings.model_path,
+                    max_batch_size=settings.inference_max_batch_size,
+                    max_wait_ms=settings.inference_max_wait_ms,
+                    engine=settings.inference_engine,
+                    quantize=settings.inference_quantize,
+                    channels_last=settings.inference_channels_last,
+                    warmup_runs=settings.inference_warmup_runs,
+                    parity_atol=(
+                        settings.inference_parity_atol
+                        if settings.inference_parity_atol >= 0 else None
+                    ),
+                )
+                logger.info("AI model loaded successfully")
+            except Exception as e:
+                logger.error(f"Model loading failed: {e}")
+                _detector = None   # prevent crash
+    return _detector
+
+
+def load_detector() -> None:
+    """Eagerly load (and warm up) the detector when AI detection is on."""
+    if settings.ai_detection_enabled:
+        get_detector()
+
+
+def analysis_version() -> str:
+    """Identifies the pipeline and AI model that produce results. Derived
+    from settings so it can be computed without loading the model."""
+    # Full-resolution ELA and reduced decoding change the numbers
+    version = ANALYSIS_VERSION + ("-large" if settings.large_image_mode else "")
+    if not settings.ai_detection_enabled:
+        return f"{version}/none"
+    if not settings.model_path.exists():
+        return f"{version}/statistical"
+    engine = settings.inference_engine
+    if engine == "optimized" and settings.inference_quantize:
+        engine += "-int8"
+    return f"{version}/{settings.model_path.name}/{engine}"
+
+
+def _check_pixels(ctx: ImageContext) -> None:
+    """Large-image mode decodes the full image for ELA; cap its size so
+    memory stays predictable (the header alone gives the dimensions)."""
+    try:
+        width, height = ctx.image.size
+    except Exception:
+        return  # undecodable; reported by the stages below
+    if width * height > settings.large_image_max_pixels:
+        raise InvalidImageError(
+            f"{width}x{height} exceeds the {settings.large_image_max_pixels} pixel limit"
+        )
+
+
+@contextmanager
+def _timed(timings: dict[str, float], stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = time.perf_counter() - start
+
+
+def run_analysis(ctx: ImageContext) -> dict:
+    # Seconds per stage, returned to the caller for the metrics histograms
+    # (this may run in a worker process that has no metrics of its own)
+    timings: dict[str, float] = {}
+    if settings.large_image_mode:
+        _check_pixels(ctx)
+
+    # 🔥 STEP 1 — METADATA from ORIGINAL
+    with _timed(timings, "metadata"):
+        metadata = extract_metadata(ctx)
+
+    # 🔥 STEP 2 — ELA from ORIGINAL (includes decoding the image)
+    with _timed(timings, "ela"):
+        ela_result = perform_ela(ctx)
+
+    # 🔥 STEP 3 — NOW resize/compress ONLY for storage
+    with _timed(timings, "thumbnail"):
+        try:
+            processed_bytes = ctx.thumbnail_jpeg
+        except Exception as e:
+            raise InvalidImageError(str(e)) from e
+
+    # The upload is not kept, so its ELA heatmap must be kept now: one
+    # rendered later from the stored thumbnail would show that re-save.
+    # Only the pixels; the PNG is encoded if and when it is requested
+    heatmap = None
+    if not settings.keep_originals:
+        with _timed(timings, "heatmap"):
+            diff = ctx.ela_diff  # None in large-image mode (tiled ELA)
+            heatmap = heatmap_pixels(diff if diff is not None else compute_ela_diff(ctx.thumbnail))
+
+    # Perceptual hashes of the same thumbnail, for near-duplicate lookup
+    with _timed(timings, "hashes"):
+        hashes = image_hashes(ctx.thumbnail_array)
+
+    # 🔥 STEP 4 — AI detection on the shared decoded image
+    ai_result = dict(_NO_AI_RESULT)
+    if settings.ai_detection_enabled:
+        detector = get_detector()
+        if detector is not None:
+            with _timed(timings, "ai"):
+                ai_result = detector.predict(ctx, ela_result)
+
+    return {
+        "metadata": metadata,
+        "ela": ela_result,
+        "processed_bytes": processed_bytes,
+        "heatmap": heatmap,
+        "hashes": hashes,
+        "ai": ai_result,
+        "timings": timings,
+    }
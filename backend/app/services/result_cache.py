@@ -0,0 +1,95 @@
+"""Two-tier cache of analysis results for identical uploads.
+
+Keyed on the SHA-256 of the original upload bytes plus a digest of the
+analysis version, so a pipeline or model change naturally invalidates old
+entries.
+An in-process LRU sits in front of the ``analysis_cache`` table.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.cache import AnalysisCacheEntry
+from app.services.pipeline import analysis_version
+
+
+def cache_key(content_sha256: str, variant: str = "") -> str:
+    """``<content sha256>:<digest>``, where the digest covers the analysis
+    version and ``variant`` (settings a result also depends on). Fixed at
+    81 characters, within the column, however long the model file name or
+    the variant."""
+    version = f"{analysis_version()}|{variant}".encode()
+    return f"{content_sha256}:{hashlib.sha256(version).hexdigest()[:16]}"
+
+
+class ResultCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> dict | None:
+        """Memory tier only; safe to call on the event loop."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def remember(self, key: str, entry: dict) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def load(self, db: Session, key: str) -> dict | None:
+        """Memory tier, then the database; DB hits are promoted to memory."""
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+
+        row = db.get(AnalysisCacheEntry, key)
+        if row is None:
+            return None
+        entry = {"scan_id": row.scan_id, "response": json.loads(row.response_json)}
+        self.remember(key, entry)
+        return entry
+
+    def add(
+        self, db: Session, key: str, content_sha256: str, scan_id: int, response: dict
+    ) -> dict:
+        """Stage a cache row in the caller's transaction. Call ``remember``
+        with the returned entry once the transaction has committed."""
+        db.merge(
+            AnalysisCacheEntry(
+                cache_key=key,
+                content_sha256=content_sha256,
+                scan_id=scan_id,
+                response_json=json.dumps(response),
+            )
+        )
+        return {"scan_id": scan_id, "response": response}
+
+    def forget_scans(self, scan_ids: set[int]) -> None:
+        """Drop memory entries pointing at these scans (deleted, or their
+        image evicted). Other processes keep theirs until LRU-evicted; a
+        hit on one whose image is gone is treated as a miss by the caller."""
+        with self._lock:
+            stale = [k for k, e in self._entries.items() if e["scan_id"] in scan_ids]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+result_cache = ResultCache(settings.result_cache_size)
@@ -0,0 +1,438 @@
+"""Retention and compaction of stored images and scan records.
+
+A background thread wakes every ``retention_interval_s`` and applies the
+enabled policies (see the retention settings in app/config.py):
+
+- ``scan_max_age_days``: scans older than this are deleted with their
+  sightings and result-cache rows; images no scan refers to any more go
+  too. Finished job rows of the same age are deleted as well
+- ``metadata_archive_after_days``: older ``metadata_json`` payloads move
+  into monthly packs (app/services/metadata_archive.py)
+- ``image_max_age_days`` / ``image_quota_bytes``: stored images unused
+  (``lru``) or stored (``oldest``) that long ago are evicted, then more
+  in the same order until the ledger (app/models/storage.py) is within
+  the quota. Their scans stay; the image URLs then answer 404
+- freed SQLite pages are handed back to the OS ``retention_vacuum_pages``
+  at a time (databases created with auto_vacuum=INCREMENTAL only)
+
+Work is done ``retention_batch_size`` rows per transaction with a pause
+in between, so analyses never wait long for the write lock. One process
+at a time compacts (an flock on ``<upload_dir>/.retention.lock``); every
+process records which images it served, for the lru policy.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import bindparam, delete, select, text, tuple_, update
+from sqlalchemy.orm import Session, load_only
+
+from app.config import settings
+from app.database import SessionLocal, engine
+from app.models.cache import AnalysisCacheEntry
+from app.models.counter import adjust_counter, read_counter
+from app.models.job import JOB_DONE, JOB_FAILED, AnalysisJob
+from app.models.scan import Scan, ScanSighting
+from app.models.storage import STORED_BYTES_COUNTER, StoredImage
+from app.services import metadata_archive, metrics
+from app.services.ela_analyzer import delete_heatmaps
+from app.services.image_storage import delete_image
+from app.services.result_cache import result_cache
+
+try:
+    import fcntl
+except ImportError:  # not on Unix: no cross-process lock
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_stop = threading.Event()
+_thread: threading.Thread | None = None
+_touched: dict[str, datetime] = {}
+_touched_lock = threading.Lock()
+# (timestamp, id) of the last scan archived by this process; rows before
+# it are archived already, so later runs need not walk them again
+_archived_until: tuple[datetime, int] | None = None
+_warned_vacuum = False
+
+
+def _utcnow() -> datetime:
+    # Stored DateTimes are naive UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _cutoff(days: float) -> datetime:
+    return _utcnow() - timedelta(days=days)
+
+
+def enabled() -> bool:
+    return settings.retention_interval_s > 0 and any((
+        settings.image_max_age_days,
+        settings.image_quota_bytes,
+        settings.scan_max_age_days,
+        settings.metadata_archive_after_days,
+    ))
+
+
+def _tracks_use() -> bool:
+    return enabled() and settings.image_eviction_policy == "lru" and bool(
+        settings.image_max_age_days or settings.image_quota_bytes
+    )
+
+
+def touch(sha256_hash: str) -> None:
+    """Note that a stored image was served; written out on the next run."""
+    if _tracks_use():
+        with _touched_lock:
+            _touched[sha256_hash] = _utcnow()
+
+
+def flush_touches() -> int:
+    with _touched_lock:
+        touched = list(_touched.items())
+        _touched.clear()
+    if not touched:
+        return 0
+    table = StoredImage.__table__
+    stmt = (
+        update(table)
+        .where(table.c.sha256_hash == bindparam("sha"))
+        .values(last_used_at=bindparam("used"))
+    )
+    with engine.begin() as conn:
+        conn.execute(stmt, [{"sha": sha, "used": used} for sha, used in touched])
+    return len(touched)
+
+
+def _batches(task: str, step) -> int:
+    """Run ``step`` (one transaction, returns rows done) until it has
+    nothing left to do, pausing between transactions."""
+    total = 0
+    while not _stop.is_set():
+        with metrics.RETENTION_BATCH_SECONDS.time(task):
+            done = step()
+        total += done
+        if done < settings.retention_batch_size:
+            break
+        _stop.wait(settings.retention_batch_pause_s)
+    return total
+
+
+# ---------- Images ----------
+
+def _clock():
+    if settings.image_eviction_policy == "oldest":
+        return StoredImage.stored_at
+    return StoredImage.last_used_at
+
+
+def _evict(rows: list) -> int:
+    """Delete (sha256_hash, bytes, last_used_at) ledger rows, then the
+    files of those actually deleted. A row used meanwhile is kept, file
+    and all; a use that comes after the delete finds no ledger row and is
+    treated as a cache miss (see claim_stored_image). Returns the number
+    of rows evicted."""
+    if not rows:
+        return 0
+    table = StoredImage.__table__
+    freed, evicted = 0, []
+    with SessionLocal() as db:
+        for row in rows:
+            result = db.execute(
+                delete(table).where(
+                    table.c.sha256_hash == row.sha256_hash,
+                    table.c.last_used_at <= row.last_used_at,  # not used since
+                )
+            )
+            if result.rowcount:
+                freed += row.bytes
+                evicted.append(row.sha256_hash)
+        adjust_counter(db.connection(), STORED_BYTES_COUNTER, -freed)
+        # Later uploads of the same content must analyze (and store) again
+        scan_ids = set(db.scalars(select(Scan.id).where(Scan.sha256_hash.in_(evicted))))
+        if scan_ids:
+            db.execute(
+                delete(AnalysisCacheEntry).where(AnalysisCacheEntry.scan_id.in_(scan_ids))
+            )
+        db.commit()
+    result_cache.forget_scans(scan_ids)
+
+    for sha256_hash in evicted:
+        delete_image(sha256_hash)
+        delete_heatmaps(sha256_hash)
+
+    metrics.RETENTION_ITEMS.inc("image_evicted", amount=len(evicted))
+    metrics.RETENTION_RECLAIMED_BYTES.inc("images", amount=freed)
+    return len(evicted)
+
+
+def _ledger_rows(db: Session, *clauses, limit: int) -> list:
+    return db.execute(
+        select(StoredImage.sha256_hash, StoredImage.bytes, StoredImage.last_used_at)
+        .where(*clauses)
+        .order_by(_clock())
+        .limit(limit)
+    ).all()
+
+
+def evict_expired_images() -> int:
+    cutoff = _cutoff(settings.image_max_age_days)
+
+    def step() -> int:
+        with SessionLocal() as db:
+            rows = _ledger_rows(db, _clock() < cutoff, limit=settings.retention_batch_size)
+        return _evict(rows)
+
+    return _batches("evict_expired_images", step)
+
+
+def enforce_quota() -> int:
+    def step() -> int:
+        with SessionLocal() as db:
+            stored = read_counter(db.connection(), STORED_BYTES_COUNTER) or 0
+            excess = stored - settings.image_quota_bytes
+            if excess <= 0:
+                return 0
+            rows = _ledger_rows(db, limit=settings.retention_batch_size)
+        # Only as many as it takes to get under the quota
+        chosen = []
+        for row in rows:
+            if excess <= 0:
+                break
+            chosen.append(row)
+            excess -= row.bytes
+        return _evict(chosen)
+
+    return _batches("enforce_quota", step)
+
+
+# ---------- Scans ----------
+
+def delete_expired_scans() -> int:
+    cutoff = _cutoff(settings.scan_max_age_days)
+
+    def step() -> int:
+        with SessionLocal() as db:
+            scans = db.scalars(
+                select(Scan)
+                .options(load_only(Scan.id, Scan.sha256_hash, Scan.metadata_archive))
+                .where(Scan.timestamp < cutoff)
+                .order_by(Scan.timestamp, Scan.id)
+                .limit(settings.retention_batch_size)
+            ).all()
+            if not scans:
+                return 0
+            ids = {scan.id for scan in scans}
+            hashes = {scan.sha256_hash for scan in scans}
+            months = {scan.metadata_archive for scan in scans if scan.metadata_archive}
+
+            db.execute(delete(ScanSighting).where(ScanSighting.scan_id.in_(ids)))
+            db.execute(delete(AnalysisCacheEntry).where(AnalysisCacheEntry.scan_id.in_(ids)))
+            for scan in scans:
+                db.delete(scan)  # ORM delete: keeps the counter and similarity index
+            db.flush()
+
+            hashes -= set(db.scalars(select(Scan.sha256_hash).where(Scan.sha256_hash.in_(hashes))))
+            months -= set(db.scalars(
+                select(Scan.metadata_archive).where(Scan.metadata_archive.in_(months))
+            ))
+            orphans = (
+                _ledger_rows(db, StoredImage.sha256_hash.in_(hashes), limit=len(hashes))
+                if hashes else []
+            )
+            db.commit()
+
+        result_cache.forget_scans(ids)
+        metrics.RETENTION_ITEMS.inc("scan_deleted", amount=len(ids))
+        _evict(orphans)
+        for month in months:
+            freed = metadata_archive.delete_pack(month)
+            metrics.RETENTION_RECLAIMED_BYTES.inc("metadata", amount=freed)
+        return len(ids)
+
+    return _batches("delete_expired_scans", step)
+
+
+def delete_finished_jobs() -> int:
+    cutoff = _cutoff(settings.scan_max_age_days)
+
+    def step() -> int:
+        with SessionLocal() as db:
+            ids = db.scalars(
+                select(AnalysisJob.id)
+                .where(
+                    AnalysisJob.status.in_((JOB_DONE, JOB_FAILED)),
+                    AnalysisJob.finished_at < cutoff,
+                )
+                .limit(settings.retention_batch_size)
+            ).all()
+            if ids:
+                db.execute(delete(AnalysisJob).where(AnalysisJob.id.in_(ids)))
+                db.commit()
+        metrics.RETENTION_ITEMS.inc("job_deleted", amount=len(ids))
+        return len(ids)
+
+    return _batches("delete_finished_jobs", step)
+
+
+def archive_metadata() -> int:
+    cutoff = _cutoff(settings.metadata_archive_after_days)
+
+    def step() -> int:
+        global _archived_until
+        with SessionLocal() as db:
+            stmt = (
+                select(Scan.id, Scan.timestamp, Scan.metadata_json)
+                .where(Scan.timestamp < cutoff, Scan.metadata_json.is_not(None))
+                .order_by(Scan.timestamp, Scan.id)
+                .limit(settings.retention_batch_size)
+            )
+            if _archived_until is not None:
+                stmt = stmt.where(tuple_(Scan.timestamp, Scan.id) > _archived_until)
+            rows = db.execute(stmt).all()
+            if not rows:
+                return 0
+
+            by_month: dict[str, list] = {}
+            for row in rows:
+                by_month.setdefault(metadata_archive.pack_month(row.timestamp), []).append(row)
+            raw, packed = 0, 0
+            for month, entries in by_month.items():
+                # The pack is on disk before any row drops its copy
+                packed += metadata_archive.append_to_pack(month, entries)
+                raw += sum(len(entry.metadata_json) for entry in entries)
+                db.execute(
+                    update(Scan)
+                    .where(Scan.id.in_([entry.id for entry in entries]))
+                    .values(metadata_json=None, metadata_archive=month)
+                )
+            db.commit()
+
+        _archived_until = (rows[-1].timestamp, rows[-1].id)
+        metrics.RETENTION_ITEMS.inc("metadata_archived", amount=len(rows))
+        metrics.RETENTION_RECLAIMED_BYTES.inc("metadata", amount=max(raw - packed, 0))
+        return len(rows)
+
+    return _batches("archive_metadata", step)
+
+
+# ---------- Database ----------
+
+def vacuum() -> int:
+    """Return free SQLite pages to the OS in small steps. Returns bytes."""
+    global _warned_vacuum
+    if engine.dialect.name != "sqlite":
+        return 0
+    freed = 0
+    with engine.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:  # INCREMENTAL
+            if not _warned_vacuum:
+                _warned_vacuum = True
+                logger.info(
+                    "Database was created without auto_vacuum=INCREMENTAL: freed pages "
+                    "are reused, but the file only shrinks after a one-off VACUUM"
+                )
+            return 0
+        page_size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+        while not _stop.is_set():
+            before = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+            if not before:
+                break
+            with metrics.RETENTION_BATCH_SECONDS.time("vacuum"):
+                conn.execute(text(f"PRAGMA incremental_vacuum({settings.retention_vacuum_pages:d})"))
+                conn.commit()
+            after = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+            freed += (before - after) * page_size
+            if after >= before:
+                break
+            _stop.wait(settings.retention_batch_pause_s)
+    metrics.RETENTION_RECLAIMED_BYTES.inc("database", amount=freed)
+    return freed
+
+
+# ---------- Scheduling ----------
+
+class _CompactionLock:
+    """Non-blocking, cross-process: only one process compacts at a time."""
+
+    def __init__(self):
+        self._file = None
+
+    def acquire(self) -> bool:
+        if fcntl is None:
+            return True
+        settings.upload_dir.mkdir(parents=True, exist_ok=True)
+        self._file = (settings.upload_dir / ".retention.lock").open("a")
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._file.close()
+            self._file = None
+            return False
+        return True
+
+    def release(self) -> None:
+        if self._file is not None:
+            self._file.close()  # closing drops the flock
+            self._file = None
+
+
+def run_once() -> dict[str, int]:
+    """Apply every enabled policy once. Returns what was done."""
+    done = {"touches_flushed": flush_touches()}
+    lock = _CompactionLock()
+    if not lock.acquire():
+        return done
+    start = time.perf_counter()
+    try:
+        if settings.scan_max_age_days:
+            done["scans_deleted"] = delete_expired_scans()
+            done["jobs_deleted"] = delete_finished_jobs()
+        if settings.metadata_archive_after_days:
+            done["metadata_archived"] = archive_metadata()
+        if settings.image_max_age_days:
+            done["images_expired"] = evict_expired_images()
+        if settings.image_quota_bytes:
+            done["images_over_quota"] = enforce_quota()
+        if any(count for task, count in done.items() if task != "touches_flushed"):
+            done["database_bytes_freed"] = vacuum()
+        with engine.connect() as conn:
+            stored = read_counter(conn, STORED_BYTES_COUNTER) or 0
+        metrics.STORED_IMAGE_BYTES.set(value=stored)
+    finally:
+        lock.release()
+    logger.info("Retention run in %.1f s: %s", time.perf_counter() - start, done)
+    return done
+
+
+def _loop() -> None:
+    while not _stop.is_set():
+        try:
+            run_once()
+        except Exception:
+            logger.exception("Retention run failed")
+        _stop.wait(settings.retention_interval_s)
+
+
+def start() -> None:
+    global _thread
+    if not enabled() or _thread is not None:
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_loop, name="retention", daemon=True)
+    _thread.start()
+
+
+def stop() -> None:
+    global _thread
+    if _thread is None:
+        return
+    _stop.set()
+    _thread.join(timeout=10)
+    _thread = None
+    try:
+        flush_touches()
+    except Exception:
+        logger.exception("Cannot record image use at shutdown")
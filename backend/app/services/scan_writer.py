@@ -0,0 +1,78 @@
+"""Write-behind persistence for new rows.
+
+With ``settings.scan_write_mode == "write_behind"`` requests do not commit
+their own Scan rows. They hand a *stage* function to a scheduler thread,
+which runs every stage queued within ``scan_write_max_wait_ms`` (up to
+``scan_write_batch_size``) in one transaction, so N uploads cost one
+commit instead of N. Each caller's future resolves with its row id only
+after that transaction has committed, so returned ids always refer to
+durable rows. If a group fails, its stages are retried one transaction
+each so a single bad row cannot fail the rest.
+
+``close()`` (called on shutdown) flushes everything still queued.
+"""
+
+import asyncio
+import logging
+from collections.abc import Callable
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.services.micro_batcher import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+# Adds rows to the session, flushes and returns the id to report
+Stage = Callable[[Session], int | None]
+
+
+def _commit(stages: list[Stage]) -> list[int | None]:
+    with SessionLocal() as db:
+        try:
+            ids = [stage(db) for stage in stages]
+            db.commit()
+            return ids
+        except Exception:
+            db.rollback()
+            raise
+
+
+def _write_group(stages: list[Stage]) -> list[int | None | Exception]:
+    try:
+        return _commit(stages)
+    except Exception as e:
+        if len(stages) == 1:
+            return [e]
+        logger.warning("Grouped write of %d rows failed (%s); retrying one by one", len(stages), e)
+
+    results: list[int | None | Exception] = []
+    for stage in stages:
+        try:
+            results.extend(_commit([stage]))
+        except Exception as e:
+            logger.error("Write-behind row failed: %s", e)
+            results.append(e)
+    return results
+
+
+_writer = MicroBatcher(
+    _write_group,
+    max_batch_size=settings.scan_write_batch_size,
+    max_wait_ms=settings.scan_write_max_wait_ms,
+    name="scan-writer",
+)
+
+
+def enabled() -> bool:
+    return settings.scan_write_mode == "write_behind"
+
+
+async def write(stage: Stage) -> int | None:
+    """Queue ``stage`` and wait until the transaction containing it commits."""
+    return await asyncio.wrap_future(_writer.submit(stage))
+
+
+def close() -> None:
+    _writer.close()
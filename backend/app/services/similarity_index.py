@@ -0,0 +1,302 @@
+"""In-memory Hamming-distance index over the perceptual hashes of all scans.
+
+Multi-index hashing: every 64-bit hash is split into four 16-bit chunks,
+each with its own bucket table. If two hashes are within distance ``r``,
+at least one chunk pair is within ``r // 4`` (pigeonhole), so a query
+only probes the buckets near each of its four chunks and verifies those
+candidates. Nothing is compared against the whole collection.
+
+The index is loaded from the ``scans`` table in the background at startup
+(``ready`` is False until then) and kept current by session hooks that
+apply inserted/deleted scans after their transaction commits.
+"""
+
+import logging
+import threading
+from array import array
+from io import BytesIO
+from itertools import combinations
+
+import numpy as np
+from PIL import Image
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, engine
+from app.models.scan import Scan
+from app.services.image_storage import load_image
+from app.services.perceptual_hash import image_hashes, to_unsigned
+
+logger = logging.getLogger(__name__)
+
+CHUNKS = 4
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+MAX_DISTANCE = 16  # up to 4 differing bits per chunk
+HASH_KINDS = ("phash", "dhash")
+TOMBSTONE = -1  # scan id of a removed entry
+# Compact once this share of the entries (and at least COMPACT_MIN) are
+# tombstones, so removals cost amortised O(1) and memory stays bounded
+COMPACT_RATIO = 0.25
+COMPACT_MIN = 1024
+
+
+def _flip_masks(max_bits: int) -> list[int]:
+    """All CHUNK_BITS-bit masks with at most ``max_bits`` bits set."""
+    masks = [0]
+    for k in range(1, max_bits + 1):
+        for bits in combinations(range(CHUNK_BITS), k):
+            masks.append(sum(1 << b for b in bits))
+    return masks
+
+
+_MASKS = [_flip_masks(k) for k in range(MAX_DISTANCE // CHUNKS + 1)]
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):  # NumPy >= 2.0
+        return np.bitwise_count(values)
+    return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class HammingIndex:
+    """Entries are appended; a removed (or re-added) scan's old entry is
+    tombstoned in place, and the arrays are compacted once tombstones make
+    up COMPACT_RATIO of them."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load(np.empty(0, np.int64), np.empty(0, np.uint64))
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def add(self, scan_id: int, value: int) -> None:
+        value = to_unsigned(value)
+        with self._lock:
+            # Replaces an earlier hash of the id: scans.id values can be
+            # reused once the highest row has been deleted
+            self._tombstone(scan_id)
+            pos = len(self._ids)
+            self._ids.append(scan_id)
+            self._hashes.append(value)
+            self._positions[scan_id] = pos
+            for i, table in enumerate(self._buckets):
+                key = (value >> (i * CHUNK_BITS)) & CHUNK_MASK
+                bucket = table.get(key)
+                if bucket is None:
+                    table[key] = bucket = array("I")
+                bucket.append(pos)
+            self._maybe_compact()
+
+    def remove(self, scan_id: int) -> None:
+        with self._lock:
+            self._tombstone(scan_id)
+            self._maybe_compact()
+
+    def clear(self) -> None:
+        self.load(np.empty(0, np.int64), np.empty(0, np.uint64))
+
+    def load(self, ids: np.ndarray, hashes: np.ndarray) -> None:
+        """Replace the contents with unique ``ids`` and their hashes."""
+        with self._lock:
+            self._load(ids, hashes)
+
+    def _tombstone(self, scan_id: int) -> None:
+        pos = self._positions.pop(scan_id, None)
+        if pos is not None:
+            self._ids[pos] = TOMBSTONE
+
+    def _maybe_compact(self) -> None:
+        dead = len(self._ids) - len(self._positions)
+        if dead >= COMPACT_MIN and dead >= len(self._ids) * COMPACT_RATIO:
+            ids = np.frombuffer(self._ids, dtype=np.int64)
+            live = ids != TOMBSTONE
+            self._load(ids[live], np.frombuffer(self._hashes, dtype=np.uint64)[live])
+
+    def _load(self, ids: np.ndarray, hashes: np.ndarray) -> None:
+        # Copies first: ids/hashes may be views of the arrays being replaced
+        self._ids = array("q", ids.astype(np.int64).tobytes())
+        self._hashes = array("Q", hashes.astype(np.uint64).tobytes())
+        self._positions: dict[int, int] = dict(zip(ids.tolist(), range(len(ids))))
+        # Bucket tables by sorting positions on each chunk's key
+        self._buckets: list[dict[int, array]] = []
+        for i in range(CHUNKS):
+            keys = ((hashes >> np.uint64(i * CHUNK_BITS)) & np.uint64(CHUNK_MASK)).astype(np.uint16)
+            order = np.argsort(keys, kind="stable").astype(np.uint32)
+            unique, starts = np.unique(keys[order], return_index=True)
+            data = order.tobytes()  # positions grouped by key, in order
+            bounds = (starts * order.itemsize).tolist() + [len(data)]
+            self._buckets.append({
+                key: array("I", data[bounds[j] : bounds[j + 1]])
+                for j, key in enumerate(unique.tolist())
+            })
+
+    def query(self, value: int, max_distance: int) -> list[tuple[int, int]]:
+        """(scan_id, distance) pairs within ``max_distance``, closest first."""
+        if not 0 <= max_distance <= MAX_DISTANCE:
+            raise ValueError(f"max_distance must be between 0 and {MAX_DISTANCE}")
+        value = to_unsigned(value)
+        with self._lock:
+            ids, distances = self._verified(value, max_distance)
+
+        order = np.lexsort((-ids, distances))
+        return list(zip(ids[order].tolist(), distances[order].tolist()))
+
+    def _verified(self, value: int, max_distance: int) -> tuple[np.ndarray, np.ndarray]:
+        """Probe the buckets near each chunk and check the candidates' full
+        distance. Returns copies, so no buffer views outlive the lock."""
+        masks = _MASKS[max_distance // CHUNKS]
+        hits = []
+        for i, table in enumerate(self._buckets):
+            key = (value >> (i * CHUNK_BITS)) & CHUNK_MASK
+            for mask in masks:
+                bucket = table.get(key ^ mask)
+                if bucket is not None:
+                    hits.append(np.frombuffer(bucket, dtype=np.uint32))
+        if not hits:
+            return np.empty(0, np.int64), np.empty(0, np.int64)
+
+        positions = np.unique(np.concatenate(hits))
+        hashes = np.frombuffer(self._hashes, dtype=np.uint64)[positions]
+        distances = _popcount(hashes ^ np.uint64(value))
+        ids = np.frombuffer(self._ids, dtype=np.int64)[positions]
+        keep = (distances <= max_distance) & (ids != TOMBSTONE)
+        return ids[keep], distances[keep].astype(np.int64)
+
+
+class SimilarityIndex:
+    """One HammingIndex per hash kind."""
+
+    def __init__(self):
+        self.indexes = {kind: HammingIndex() for kind in HASH_KINDS}
+        self.ready = False
+        self._lock = threading.Lock()
+        self._journal: list[tuple[int, dict | None]] | None = None  # during rebuild
+
+    def add(self, scan_id: int, hashes: dict) -> None:
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((scan_id, hashes))
+            self._apply(scan_id, hashes)
+
+    def remove(self, scan_id: int) -> None:
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((scan_id, None))
+            self._apply(scan_id, None)
+
+    def _apply(self, scan_id: int, hashes: dict | None) -> None:
+        for kind, index in self.indexes.items():
+            if hashes is None:
+                index.remove(scan_id)
+            elif hashes.get(kind) is not None:
+                index.add(scan_id, hashes[kind])
+
+    def query(self, kind: str, value: int, max_distance: int) -> list[tuple[int, int]]:
+        return self.indexes[kind].query(value, max_distance)
+
+    def rebuild(self, chunk_size: int = 10_000) -> int:
+        """Load every hashed scan from the database. Safe to run while the
+        app serves: changes committed meanwhile are journaled and replayed
+        over the loaded snapshot (adds replace, so overlaps are harmless)."""
+        with self._lock:
+            self._journal = []
+        try:
+            rows = array("q")  # (id, *hashes) flattened, hashes in HASH_KINDS order
+            hash_columns = [getattr(Scan, kind) for kind in HASH_KINDS]
+            stmt = select(Scan.id, *hash_columns).where(
+                *(column.is_not(None) for column in hash_columns)
+            )
+            # Core rows: several times cheaper than ORM rows at this volume
+            with engine.connect() as conn:
+                result = conn.execution_options(
+                    stream_results=True, yield_per=chunk_size
+                ).execute(stmt)
+                for chunk in result.partitions():
+                    for row in chunk:
+                        rows.extend(row)
+
+            # Stored signed; viewed as uint64 they are the to_unsigned bits
+            table = np.frombuffer(rows, dtype=np.int64).reshape(-1, 1 + len(HASH_KINDS))
+            with self._lock:
+                for column, (kind, index) in enumerate(self.indexes.items(), start=1):
+                    index.load(table[:, 0], table[:, column].view(np.uint64))
+                for scan_id, changed in self._journal:
+                    self._apply(scan_id, changed)
+                self.ready = True
+        finally:
+            with self._lock:
+                self._journal = None
+        count = len(table)
+        logger.info("Similarity index built over %d scans", count)
+        return count
+
+
+similarity_index = SimilarityIndex()
+
+
+def backfill_missing_hashes(chunk_size: int = 200) -> int:
+    """Hash scans that predate the phash/dhash columns from their stored
+    images, and index them. Returns the number of scans hashed."""
+    done, last_id = 0, 0
+    while True:
+        with SessionLocal() as db:
+            scans = db.scalars(
+                select(Scan)
+                .where(Scan.phash.is_(None), Scan.id > last_id)
+                .order_by(Scan.id)
+                .limit(chunk_size)
+            ).all()
+            if not scans:
+                return done
+            hashed = []
+            for scan in scans:
+                data = load_image(scan.sha256_hash)
+                if data is None:
+                    continue
+                try:
+                    with Image.open(BytesIO(data)) as img:
+                        hashes = image_hashes(np.asarray(img.convert("RGB")))
+                except Exception as e:
+                    logger.warning("Cannot hash stored image for scan %d: %s", scan.id, e)
+                    continue
+                scan.phash, scan.dhash = hashes["phash"], hashes["dhash"]
+                hashed.append((scan.id, hashes))
+            last_id = scans[-1].id
+            db.commit()
+        for scan_id, hashes in hashed:
+            similarity_index.add(scan_id, hashes)
+        done += len(hashed)
+
+
+# ---------- Incremental maintenance ----------
+# Changes are staged per session at flush time and applied only once the
+# transaction commits, so rolled-back scans never become visible.
+
+_PENDING_KEY = "similarity_index_pending"
+
+
+@event.listens_for(Session, "after_flush")
+def _stage_changes(session, flush_context):
+    pending = session.info.setdefault(_PENDING_KEY, [])
+    for obj in session.new:
+        if isinstance(obj, Scan) and obj.phash is not None:
+            pending.append((obj.id, {"phash": obj.phash, "dhash": obj.dhash}))
+    for obj in session.deleted:
+        if isinstance(obj, Scan):
+            pending.append((obj.id, None))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session):
+    for scan_id, hashes in session.info.pop(_PENDING_KEY, ()):
+        if hashes is None:
+            similarity_index.remove(scan_id)
+        else:
+            similarity_index.add(scan_id, hashes)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_changes(session, previous_transaction):
+    session.info.pop(_PENDING_KEY, None)
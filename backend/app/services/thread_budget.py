@@ -0,0 +1,121 @@
+"""Division of the CPU budget between processes, analyses and libraries.
+
+Left alone, torch, OpenCV and OpenBLAS each start one thread per core in
+every process, so several web workers running several analyses at once
+oversubscribe the machine many times over. The budget is split instead:
+
+- ``cpu_budget`` cores (default: what the process may run on, capped by
+  a cgroup CPU quota) are shared by ``web_concurrency`` web workers;
+- each web worker runs ``analysis_slots`` analyses at once: its pool
+  processes in process mode, a limit on concurrent analyses in thread
+  mode, one in inline mode;
+- each analysis gets ``library_threads`` threads in every native library.
+
+By default an analysis is single-threaded and analyses run in parallel,
+which scales best for many small requests. Setting ``library_threads``
+(or fewer ``analysis_concurrency`` slots) trades that for lower latency
+per image.
+"""
+
+import math
+import os
+import sys
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from app.config import settings
+
+# Read when the native libraries load, so they must be set before numpy,
+# cv2 or torch are imported (this module imports cv2 only when called)
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+
+@dataclass(frozen=True)
+class ThreadBudget:
+    cores: int
+    web_workers: int
+    cores_per_worker: int
+    analysis_slots: int
+    library_threads: int
+
+
+def available_cores() -> int:
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:  # not on Linux
+        cores = os.cpu_count() or 1
+    try:
+        # cgroup v2 quota, e.g. "200000 100000" = 2 CPUs; "max" = unlimited
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if quota != "max":
+            cores = min(cores, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cores
+
+
+def compute_budget() -> ThreadBudget:
+    cores = settings.cpu_budget or available_cores()
+    web_workers = max(1, settings.web_concurrency)
+    per_worker = max(1, cores // web_workers)
+    if settings.analysis_executor == "process":
+        slots = settings.analysis_workers or per_worker
+    elif settings.analysis_executor == "thread":
+        slots = settings.analysis_concurrency or per_worker
+    else:
+        slots = 1
+    library = settings.library_threads or max(1, per_worker // slots)
+    return ThreadBudget(cores, web_workers, per_worker, slots, library)
+
+
+_budget: ThreadBudget | None = None
+
+
+def get_budget() -> ThreadBudget:
+    global _budget
+    if _budget is None:
+        _budget = compute_budget()
+    return _budget
+
+
+def limit_native_threads() -> None:
+    """Cap OpenMP/BLAS threads through the environment. Values already
+    set by the operator win; pool workers inherit the caps."""
+    threads = str(get_budget().library_threads)
+    for name in _THREAD_ENV_VARS:
+        os.environ.setdefault(name, threads)
+
+
+def apply() -> dict:
+    """Size OpenCV's and (if loaded) torch's thread pools. Call at process
+    start and again after the model loads. Returns the applied sizes."""
+    threads = get_budget().library_threads
+    import cv2
+
+    cv2.setNumThreads(threads)
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # only settable before torch's first parallel work
+    return library_threads()
+
+
+def library_threads() -> dict:
+    """Thread pool sizes the native libraries are actually using."""
+    import cv2
+
+    state = {"opencv": cv2.getNumThreads()}
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        state["torch"] = torch.get_num_threads()
+        state["torch_interop"] = torch.get_num_interop_threads()
+    state.update((name, os.environ.get(name)) for name in _THREAD_ENV_VARS)
+    return state
+
+
+def describe() -> dict:
+    """The budget and the applied pool sizes, for diagnostics."""
+    return {**asdict(get_budget()), "applied": library_threads()}
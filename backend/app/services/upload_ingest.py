@@ -0,0 +1,279 @@
+"""Streaming ingestion of single-image multipart uploads.
+
+Parses the request body chunk by chunk instead of letting the framework
+spool the whole body first, so that:
+
+- bodies larger than the limit are rejected as soon as the limit is
+  crossed (or up front from Content-Length), without reading the rest
+- the file type is sniffed from magic bytes rather than trusted from the
+  client-declared content type
+- the SHA-256 is computed incrementally while reading
+- the data is handed on as a memoryview over one buffer, with no copies,
+  or (``spool_dir``, for videos) written straight to a file on disk
+"""
+
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+
+from fastapi import Request
+
+try:
+    from python_multipart import MultipartParser
+    from python_multipart.exceptions import MultipartParseError
+    from python_multipart.multipart import parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart import MultipartParser
+    from multipart.exceptions import MultipartParseError
+    from multipart.multipart import parse_options_header
+
+# Allowance for multipart boundaries and part headers around the file
+MULTIPART_OVERHEAD = 64 * 1024
+
+MAGIC_TYPES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\x1a\x45\xdf\xa3", "video/webm"),  # EBML header (WebM / Matroska)
+)
+SNIFF_BYTES = 8
+
+IMAGE_TYPE_ERROR = "Invalid file content. Only JPEG and PNG images are allowed."
+
+
+class UploadRejected(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class IngestedUpload:
+    filename: str | None
+    declared_type: str | None
+    content_type: str  # sniffed from magic bytes
+    data: memoryview  # empty when spooled to ``path``
+    sha256: str
+    path: Path | None = None
+
+    @property
+    def size(self) -> int:
+        return self.path.stat().st_size if self.path is not None else len(self.data)
+
+
+def sniff_content_type(head: bytes) -> str | None:
+    for magic, content_type in MAGIC_TYPES:
+        if head.startswith(magic):
+            return content_type
+    if head[4:8] == b"ftyp":  # ISO base media (MP4) starts with an ftyp box
+        return "video/mp4"
+    return None
+
+
+class _FilePartCollector:
+    """Multipart callbacks that keep only the named file part."""
+
+    def __init__(
+        self,
+        field_name: str,
+        max_size: int,
+        allowed_types: set[str],
+        allowed_extensions: set[str],
+        type_error: str,
+        spool=None,
+    ):
+        self.field_name = field_name
+        self.max_size = max_size
+        self.allowed_types = allowed_types
+        self.allowed_extensions = allowed_extensions
+        self.type_error = type_error
+        self.buffer = bytearray()  # the file, or just its head when spooling
+        self.spool = spool
+        self.size = 0
+        self.hasher = hashlib.sha256()
+        self.filename: str | None = None
+        self.declared_type: str | None = None
+        self.content_type: str | None = None
+        self.found = False
+        self.complete = False  # the file part and the body both ended
+        self.error: UploadRejected | None = None
+
+        self._headers: dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._capturing = False
+        self._part_closed = False
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+            "on_end": self._on_end,
+        }
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("latin-1")
+        self._capturing = (
+            not self.found and name == self.field_name and b"filename" in options
+        )
+        if self._capturing:
+            self.found = True
+            self.filename = options[b"filename"].decode("utf-8", errors="replace")
+            declared = self._headers.get(b"content-type")
+            self.declared_type = declared.decode("latin-1") if declared else None
+            ext = Path(self.filename).suffix.lower()
+            if ext not in self.allowed_extensions:
+                self.error = UploadRejected(
+                    400,
+                    f"Invalid file extension '{ext}'. Only "
+                    f"{', '.join(sorted(self.allowed_extensions))} are allowed.",
+                )
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if not self._capturing or self.error is not None:
+            return
+        chunk = data[start:end]
+        if self.size + len(chunk) > self.max_size:
+            self.error = UploadRejected(
+                400,
+                f"File too large. Maximum size is {self.max_size // (1024*1024)}MB.",
+            )
+            return
+
+        had = self.size
+        self.size += len(chunk)
+        if self.spool is None:
+            self.buffer += chunk
+        else:
+            if had < SNIFF_BYTES:
+                self.buffer += chunk[: SNIFF_BYTES - had]
+            self.spool.write(chunk)
+        self.hasher.update(chunk)
+        if had < SNIFF_BYTES <= self.size:
+            self._sniff()
+
+    def _on_part_end(self) -> None:
+        if self._capturing and self.content_type is None and self.error is None:
+            self._sniff()
+        if self._capturing:
+            self._part_closed = True
+        self._capturing = False
+
+    def _on_end(self) -> None:
+        # Only called once the closing boundary has been parsed
+        self.complete = self._part_closed
+
+    def _sniff(self) -> None:
+        self.content_type = sniff_content_type(bytes(self.buffer[:SNIFF_BYTES]))
+        if self.content_type not in self.allowed_types and self.buffer:
+            self.error = UploadRejected(400, self.type_error)
+
+
+async def ingest_upload(
+    request: Request,
+    field_name: str,
+    max_size: int,
+    allowed_types: set[str],
+    allowed_extensions: set[str],
+    type_error: str = IMAGE_TYPE_ERROR,
+    spool_dir: Path | None = None,
+) -> IngestedUpload:
+    """Read the ``field_name`` file part of a multipart request.
+
+    Raises UploadRejected as soon as the body is known to be invalid; the
+    remainder of the body is then never read. With ``spool_dir`` the file
+    is written to a temporary file there instead of memory; the caller
+    deletes ``upload.path`` when done with it.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise UploadRejected(400, "Expected a multipart/form-data upload.")
+
+    declared_length = request.headers.get("content-length")
+    if declared_length and declared_length.isdigit():
+        if int(declared_length) > max_size + MULTIPART_OVERHEAD:
+            raise UploadRejected(
+                400, f"File too large. Maximum size is {max_size // (1024*1024)}MB."
+            )
+
+    spool = None
+    if spool_dir is not None:
+        spool_dir.mkdir(parents=True, exist_ok=True)
+        fd, spool_name = tempfile.mkstemp(dir=spool_dir, suffix=".upload")
+        spool = os.fdopen(fd, "wb")
+    collector = _FilePartCollector(
+        field_name, max_size, allowed_types, allowed_extensions, type_error, spool
+    )
+    try:
+        await _read_body(request, boundary, max_size, collector)
+    except BaseException:
+        if spool is not None:
+            spool.close()
+            os.unlink(spool_name)
+        raise
+
+    if spool is not None:
+        spool.close()
+    return IngestedUpload(
+        filename=collector.filename,
+        declared_type=collector.declared_type,
+        content_type=collector.content_type,
+        data=memoryview(collector.buffer if spool is None else b""),
+        sha256=collector.hasher.hexdigest(),
+        path=Path(spool_name) if spool is not None else None,
+    )
+
+
+async def _read_body(
+    request: Request, boundary: bytes, max_size: int, collector: _FilePartCollector
+) -> None:
+    parser = MultipartParser(boundary, collector.callbacks())
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_size + MULTIPART_OVERHEAD:
+            raise UploadRejected(
+                400, f"File too large. Maximum size is {max_size // (1024*1024)}MB."
+            )
+        try:
+            parser.write(chunk)
+        except MultipartParseError:
+            raise UploadRejected(400, "Malformed multipart body.") from None
+        if collector.error is not None:
+            raise collector.error
+    try:
+        parser.finalize()
+    except MultipartParseError:
+        raise UploadRejected(400, "Malformed multipart body.") from None
+
+    if collector.error is not None:
+        raise collector.error
+    if not collector.found:
+        raise UploadRejected(400, f"Missing file field '{collector.field_name}'.")
+    if not collector.size:
+        raise UploadRejected(400, "Empty file.")
+    if not collector.complete:
+        raise UploadRejected(400, "Incomplete multipart body.")
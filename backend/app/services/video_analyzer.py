@@ -0,0 +1,351 @@
+"""Frame-sampled analysis of video clips.
+
+The clip is read sequentially with OpenCV's ``VideoCapture`` from a file
+on disk. Every frame is grabbed (demuxed and decoded), but only sampled
+frames are converted and downscaled to the 512px working size, and they
+are analyzed ``video_batch_size`` at a time, so memory stays constant
+however long the clip is.
+
+``settings.video_sample_mode`` selects the frames:
+
+- ``stride``: one frame per ``video_frame_stride_s``. Once a sample is
+              due the next keyframe is taken (intra-coded, so the best
+              quality frame for ELA), or the current frame if none has
+              come within half a stride
+- ``scene``:  the first frame of every shot (mean luma difference to the
+              previous probe of at least ``video_scene_threshold``), and
+              a frame at least every ``video_scene_max_gap_s``. Frames
+              are probed every SCENE_PROBE_INTERVAL_S, since converting
+              every decoded frame would cost more than decoding it
+
+Both intervals widen so that a clip yields at most ``video_max_frames``.
+When the container does not report its length (common for WebM), or
+scene cuts outnumber the cap, the clip is still read to the end: each
+time the cap is reached every other sample is dropped and the interval
+doubles, so the samples keep spanning the whole clip.
+
+Frames are scored like images minus the metadata term (a clip carries no
+EXIF). The clip's score blends the mean frame score with the mean of the
+top decile, so a short manipulated segment still raises it.
+"""
+
+import math
+import time
+from collections.abc import Iterator
+
+import cv2
+import numpy as np
+
+from app.config import settings
+from app.services import thread_budget
+from app.services.ela_analyzer import compute_ela_diff, heatmap_pixels, perform_ela
+from app.services.image_context import THUMBNAIL_SIZE, ImageContext
+from app.services.perceptual_hash import image_hashes
+from app.services.pipeline import _NO_AI_RESULT, get_detector
+
+
+class InvalidVideoError(ValueError):
+    """The upload could not be decoded as a video, or is too long."""
+
+
+# Scene-change probe: frames this far apart are compared at this size
+SCENE_PROBE_INTERVAL_S = 0.2
+SCENE_PROBE_SIZE = (32, 32)
+# The image score's ELA and AI weights (35% / 40%) without metadata's 25%
+ELA_WEIGHT = 0.35 / 0.75
+AI_WEIGHT = 0.40 / 0.75
+# A clip whose frames stop this far short of the reported duration is truncated
+COVERAGE_TOLERANCE_S = 1.0
+SUSPICIOUS_SCORE = 35.0
+MANIPULATED_SCORE = 65.0
+
+
+def _probe(cap: cv2.VideoCapture) -> dict:
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+    codec = fourcc.to_bytes(4, "little").decode("ascii", "replace").strip("\x00 ")
+    fps = fps if fps > 0 else None
+    frame_count = frame_count if frame_count > 0 else None
+    return {
+        "duration_s": round(frame_count / fps, 3) if fps and frame_count else None,
+        "fps": round(fps, 3) if fps else None,
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "frame_count": frame_count,
+        "codec": codec or None,
+    }
+
+
+class _StrideSampler:
+    def __init__(self, stride_s: float):
+        self.stride_s = stride_s
+        self.next_due = 0.0
+        self.decoded_s = 0.0  # time of the last frame read; set by _sampled_frames
+
+    def needs_pixels(self, t: float) -> bool:
+        return False
+
+    def wants(self, t: float, keyframe: bool, frame: np.ndarray | None) -> bool:
+        if t < self.next_due:
+            return False
+        if keyframe or t >= self.next_due + self.stride_s / 2:
+            # Stay on the stride grid however late the keyframe came
+            while self.next_due <= t:
+                self.next_due += self.stride_s
+            return True
+        return False
+
+    def widen(self) -> None:
+        """Double the stride, staying on the coarser grid."""
+        self.stride_s *= 2
+        self.next_due = math.ceil(self.next_due / self.stride_s) * self.stride_s
+
+
+class _SceneSampler:
+    def __init__(self, threshold: float, max_gap_s: float):
+        self.threshold = threshold
+        self.max_gap_s = max_gap_s
+        self.min_gap_s = 0.0  # between cuts; raised by widen()
+        self.previous: np.ndarray | None = None
+        self.last_probe = -math.inf
+        self.last_sample = -math.inf
+        self.decoded_s = 0.0
+
+    def needs_pixels(self, t: float) -> bool:
+        return t - self.last_probe >= SCENE_PROBE_INTERVAL_S
+
+    def wants(self, t: float, keyframe: bool, frame: np.ndarray | None) -> bool:
+        if frame is None:
+            return False
+        self.last_probe = t
+        small = cv2.resize(frame, SCENE_PROBE_SIZE, interpolation=cv2.INTER_AREA)
+        probe = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        cut = (
+            self.previous is None
+            or cv2.norm(probe, self.previous, cv2.NORM_L1) / probe.size >= self.threshold
+        )
+        self.previous = probe
+        gap = t - self.last_sample
+        if (cut and gap >= self.min_gap_s) or gap >= self.max_gap_s:
+            self.last_sample = t
+            return True
+        return False
+
+    def widen(self) -> None:
+        """Halve the sample rate: long shots and cuts alike."""
+        self.max_gap_s *= 2
+        self.min_gap_s = max(self.min_gap_s * 2, SCENE_PROBE_INTERVAL_S)
+
+
+def _sampler(duration_s: float | None) -> _StrideSampler | _SceneSampler:
+    # Widen the interval so the whole clip fits in video_max_frames samples
+    floor = duration_s / settings.video_max_frames if duration_s else 0.0
+    if settings.video_sample_mode == "scene":
+        return _SceneSampler(
+            settings.video_scene_threshold, max(settings.video_scene_max_gap_s, floor)
+        )
+    return _StrideSampler(max(settings.video_frame_stride_s, floor))
+
+
+def _working_rgb(frame: np.ndarray) -> np.ndarray:
+    """BGR frame -> RGB, downscaled to fit the thumbnail size."""
+    h, w = frame.shape[:2]
+    scale = min(THUMBNAIL_SIZE[0] / w, THUMBNAIL_SIZE[1] / h, 1.0)
+    if scale < 1.0:
+        size = (max(int(w * scale), 1), max(int(h * scale), 1))
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
+def _sampled_frames(
+    cap: cv2.VideoCapture, sampler: _StrideSampler | _SceneSampler
+) -> Iterator[tuple[int, float, bool, np.ndarray]]:
+    """(frame index, seconds, keyframe, working RGB) of each sampled frame."""
+    index = -1
+    while cap.grab():
+        index += 1
+        t = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        sampler.decoded_s = t
+        if t > settings.video_max_duration_s:
+            raise InvalidVideoError(
+                f"longer than the {settings.video_max_duration_s:g} s limit"
+            )
+        keyframe = bool(cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME))
+        frame = None
+        if sampler.needs_pixels(t):
+            ok, frame = cap.retrieve()
+            if not ok:
+                continue
+        if not sampler.wants(t, keyframe, frame):
+            continue
+        if frame is None:
+            ok, frame = cap.retrieve()
+            if not ok:
+                continue
+        yield index, t, keyframe, _working_rgb(frame)
+
+
+def frame_score(ela_result: dict, ai_result: dict) -> float:
+    ela_signal = ela_result.get("channel_max_mean", ela_result.get("mean_diff", 0))
+    ela_normalized = min((ela_signal / 60.0) * 100, 100)
+    ai_pct = ai_result["deepfake_probability"] * 100
+    return round(min(ela_normalized * ELA_WEIGHT + ai_pct * AI_WEIGHT, 100.0), 1)
+
+
+def _blend(values: list[float]) -> float:
+    """Mean of all values averaged with the mean of the top decile."""
+    top = sorted(values, reverse=True)[: max(1, math.ceil(len(values) / 10))]
+    return 0.5 * float(np.mean(values)) + 0.5 * float(np.mean(top))
+
+
+def verdict_for(score: float) -> str:
+    if score < SUSPICIOUS_SCORE:
+        return "Likely Authentic"
+    if score < MANIPULATED_SCORE:
+        return "Suspicious"
+    return "Likely Manipulated"
+
+
+def _segments(frames: list[dict]) -> list[dict]:
+    """Runs of consecutive samples scoring Suspicious or worse."""
+    segments: list[dict] = []
+    run: list[dict] = []
+    for frame in frames + [None]:
+        if frame is not None and frame["manipulation_score"] >= SUSPICIOUS_SCORE:
+            run.append(frame)
+            continue
+        if run:
+            segments.append({
+                "start_s": run[0]["time_s"],
+                "end_s": run[-1]["time_s"],
+                "peak_score": max(f["manipulation_score"] for f in run),
+            })
+            run = []
+    return segments
+
+
+class _FrameBatcher:
+    """Analyzes sampled frames a batch at a time, keeping only their
+    scores and the highest-scoring frame (the clip's poster image)."""
+
+    def __init__(self):
+        self.detector = get_detector() if settings.ai_detection_enabled else None
+        self.pending: list[tuple[int, float, bool, np.ndarray]] = []
+        self.frames: list[dict] = []
+        self.ai_results: list[dict] = []
+        self.poster: tuple[float, np.ndarray] | None = None
+
+    def add(self, sample: tuple[int, float, bool, np.ndarray]) -> None:
+        self.pending.append(sample)
+        if len(self.pending) >= settings.video_batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        ctxs = [ImageContext.from_rgb_array(rgb) for _, _, _, rgb in self.pending]
+        ela_results = [perform_ela(ctx) for ctx in ctxs]
+        if self.detector is not None:
+            ai_results = self.detector.predict_batch(ctxs, ela_results)
+        else:
+            ai_results = [dict(_NO_AI_RESULT) for _ in ctxs]
+
+        for (index, t, keyframe, rgb), ela, ai in zip(self.pending, ela_results, ai_results):
+            score = frame_score(ela, ai)
+            self.frames.append({
+                "time_s": round(t, 3),
+                "frame_index": index,
+                "keyframe": keyframe,
+                "manipulation_score": score,
+                "ela_mean": ela.get("mean_diff", 0.0),
+                "ai_probability": ai["deepfake_probability"],
+            })
+            self.ai_results.append(ai)
+            if self.poster is None or score > self.poster[0]:
+                self.poster = (score, rgb)
+        self.pending = []
+
+    def thin(self) -> None:
+        """Drop every other analyzed frame. The poster is kept even if its
+        frame goes: it is still the highest-scoring frame seen."""
+        self.flush()
+        self.frames = self.frames[::2]
+        self.ai_results = self.ai_results[::2]
+
+
+def analyze_video(path: str) -> dict:
+    """Analyze the clip at ``path``. Raises InvalidVideoError if it cannot
+    be decoded or exceeds ``video_max_duration_s``."""
+    timings = {"video_decode": 0.0, "video_frames": 0.0}
+    cap = cv2.VideoCapture(
+        path, cv2.CAP_FFMPEG,
+        [cv2.CAP_PROP_N_THREADS, thread_budget.get_budget().library_threads],
+    )
+    try:
+        if not cap.isOpened():
+            raise InvalidVideoError("unsupported or corrupt video")
+        info = _probe(cap)
+        if info["width"] <= 0 or info["height"] <= 0:
+            raise InvalidVideoError("no video stream")
+        if info["duration_s"] and info["duration_s"] > settings.video_max_duration_s:
+            raise InvalidVideoError(
+                f"longer than the {settings.video_max_duration_s:g} s limit"
+            )
+
+        sampler = _sampler(info["duration_s"])
+        batcher = _FrameBatcher()
+        samples = _sampled_frames(cap, sampler)
+        while True:
+            start = time.perf_counter()
+            sample = next(samples, None)
+            timings["video_decode"] += time.perf_counter() - start
+            if sample is None:
+                break
+            start = time.perf_counter()
+            if len(batcher.frames) + len(batcher.pending) >= settings.video_max_frames:
+                # With an even cap, this sample lands on the doubled grid too
+                batcher.thin()
+                sampler.widen()
+            batcher.add(sample)
+            timings["video_frames"] += time.perf_counter() - start
+        start = time.perf_counter()
+        batcher.flush()
+        timings["video_frames"] += time.perf_counter() - start
+    finally:
+        cap.release()
+
+    frames = batcher.frames
+    if not frames:
+        raise InvalidVideoError("no frames could be decoded")
+
+    score = round(min(_blend([f["manipulation_score"] for f in frames]), 100.0), 1)
+    ai_result = dict(batcher.ai_results[0])
+    ai_result["deepfake_probability"] = round(_blend([f["ai_probability"] for f in frames]), 4)
+    ai_result["confidence"] = round(float(np.mean([a["confidence"] for a in batcher.ai_results])), 4)
+
+    # Shorter than the container says: the stream ended early, so the
+    # verdict covers only the part that decoded
+    duration = info["duration_s"]
+    truncated = duration is not None and sampler.decoded_s < duration - COVERAGE_TOLERANCE_S
+
+    poster = ImageContext.from_rgb_array(batcher.poster[1])
+    return {
+        "video": info,
+        "verdict": verdict_for(score),
+        "manipulation_score": score,
+        "ai": ai_result,
+        "ela_mean": round(float(np.mean([f["ela_mean"] for f in frames])), 2),
+        "timeline": {
+            "sample_mode": settings.video_sample_mode,
+            "frames_analyzed": len(frames),
+            "covered_s": round(sampler.decoded_s, 3),
+            "truncated": truncated,
+            "frames": frames,
+            "segments": _segments(frames),
+        },
+        "processed_bytes": poster.thumbnail_jpeg,
+        "heatmap": heatmap_pixels(compute_ela_diff(poster.thumbnail)),  # of the decoded frame
+        "hashes": image_hashes(poster.thumbnail_array),
+        "timings": timings,
+    }
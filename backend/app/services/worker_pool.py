@@ -0,0 +1,173 @@
+"""Execution backends for the analysis pipeline.
+
+``settings.analysis_executor`` selects where ``run_analysis`` runs:
+
+- ``inline``:  directly on the event loop (legacy behaviour)
+- ``thread``:  in Starlette's thread pool
+- ``process``: in a spawn-based process pool; the upload is handed over
+               through shared memory instead of being pickled
+
+In thread and process mode at most ``analysis_slots`` analyses run at
+once per process (see ``thread_budget``); others wait for a free slot.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import sys
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.services import metrics, thread_budget
+from app.services.image_context import ImageContext
+from app.services.pipeline import load_detector, run_analysis
+from app.services.video_analyzer import analyze_video
+
+logger = logging.getLogger(__name__)
+
+_pool: ProcessPoolExecutor | None = None
+# Bounds concurrent analyses in thread mode; one per event loop
+_slots: tuple[asyncio.AbstractEventLoop, asyncio.Semaphore] | None = None
+
+
+def _attach_shared(name: str) -> shared_memory.SharedMemory:
+    """Attach to the parent's segment without registering it with a
+    resource tracker; the parent owns and unlinks it. Before 3.13 attaching
+    always registers (bpo-39959), and a worker with a tracker of its own
+    would warn about a "leaked" segment and unlink it when it exits.
+    Unregistering after attaching is no fix: spawned workers share the
+    parent's tracker, so it would drop the parent's own registration."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+
+    register = resource_tracker.register
+
+    def register_others(resource: str, rtype: str) -> None:
+        if rtype != "shared_memory":
+            register(resource, rtype)
+
+    resource_tracker.register = register_others
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _analyze_shared(name: str, size: int) -> dict:
+    """Worker-side entry point: attach to the parent's segment and analyze."""
+    shm = _attach_shared(name)
+    try:
+        view = shm.buf[:size]
+        try:
+            return run_analysis(ImageContext(view))
+        finally:
+            view.release()
+    finally:
+        shm.close()
+
+
+def _init_worker() -> None:
+    thread_budget.apply()
+    if settings.preload_model:
+        load_detector()
+
+
+def _noop() -> None:
+    return None
+
+
+def _pool_size() -> int:
+    return thread_budget.get_budget().analysis_slots
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        workers = _pool_size()
+        _pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+        logger.info("Analysis process pool started with %d workers", workers)
+    return _pool
+
+
+def start_pool() -> list[Future]:
+    """Start the pool (process mode). With ``preload_model`` every worker
+    loads the model up front instead of on its first request; the returned
+    futures are done once all workers have started."""
+    if settings.analysis_executor != "process":
+        return []
+    pool = get_pool()
+    return [pool.submit(_noop) for _ in range(_pool_size())]
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+async def _run_in_process(file_bytes: bytes | memoryview) -> dict:
+    size = len(file_bytes)
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    try:
+        shm.buf[:size] = file_bytes
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_pool(), _analyze_shared, shm.name, size)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+async def _dispatch(file_bytes: bytes | memoryview) -> dict:
+    mode = settings.analysis_executor
+    if mode == "process":
+        return await _run_in_process(file_bytes)
+    if mode == "thread":
+        async with _analysis_slots():
+            return await run_in_threadpool(run_analysis, ImageContext(file_bytes))
+    return run_analysis(ImageContext(file_bytes))
+
+
+def _analysis_slots() -> asyncio.Semaphore:
+    global _slots
+    loop = asyncio.get_running_loop()
+    if _slots is None or _slots[0] is not loop:
+        _slots = (loop, asyncio.Semaphore(thread_budget.get_budget().analysis_slots))
+    return _slots[1]
+
+
+async def _dispatch_video(path: str) -> dict:
+    mode = settings.analysis_executor
+    if mode == "process":
+        # Workers open the spooled file themselves: nothing to hand over
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_pool(), analyze_video, path)
+    if mode == "thread":
+        async with _analysis_slots():
+            return await run_in_threadpool(analyze_video, path)
+    return analyze_video(path)
+
+
+async def analyze_video_file(path: str) -> dict:
+    """Analyze a clip on disk with the configured executor; one clip
+    takes one analysis slot."""
+    with metrics.IN_FLIGHT.track(), metrics.STAGE_SECONDS.time("video"):
+        analysis = await _dispatch_video(path)
+    metrics.observe_stages(analysis["timings"])
+    return analysis
+
+
+async def analyze_upload(file_bytes: bytes | memoryview) -> dict:
+    # "pipeline" is the caller's view, including any wait for a free
+    # thread or worker process; the other stages are timed where they run
+    with metrics.IN_FLIGHT.track(), metrics.STAGE_SECONDS.time("pipeline"):
+        analysis = await _dispatch(file_bytes)
+    metrics.observe_stages(analysis["timings"])
+    return analysis
@@ -0,0 +1,172 @@
+"""Startup timing and readiness.
+
+``report`` records how long the process spent importing modules (from
+the moment ``app`` is first imported), initialising the database and
+loading the model, and which components the process is still waiting
+for before it should receive traffic. ``/health/live`` answers as soon
+as the server runs; ``/health/ready`` only once nothing is pending.
+
+Imports are timed by a meta path finder that wraps the loader of each
+top-level package and each ``app.*`` module; times are inclusive of the
+imports they trigger. Imports made later (e.g. torch on the first model
+load) are recorded too.
+"""
+
+import importlib.abc
+import logging
+import sys
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Imports faster than this are left out of the report
+IMPORT_THRESHOLD_S = 0.005
+
+
+class _TimedLoader(importlib.abc.Loader):
+    def __init__(self, loader, report: "StartupReport"):
+        self.loader = loader
+        self.report = report
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module) -> None:
+        start = time.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.report.record_import(module.__name__, time.perf_counter() - start)
+            # Leave the real loader on the module for anything that inspects it
+            module.__loader__ = self.loader
+            if module.__spec__ is not None:
+                module.__spec__.loader = self.loader
+
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    def __init__(self, report: "StartupReport"):
+        self.report = report
+        self._local = threading.local()
+
+    def find_spec(self, name, path, target=None):
+        if "." in name and not name.startswith("app."):
+            return None
+        if getattr(self._local, "finding", False):
+            return None
+        self._local.finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._local.finding = False
+        if spec.loader is None or not hasattr(spec.loader, "exec_module"):
+            return spec
+        spec.loader = _TimedLoader(spec.loader, self.report)
+        return spec
+
+
+class StartupReport:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.imports: dict[str, float] = {}
+        self.phases: dict[str, float] = {}
+        self.ready_at: float | None = None
+        self._pending: set[str] = set()
+        self._lock = threading.Lock()
+        self._finder: _ImportTimer | None = None
+
+    def install_import_timer(self) -> None:
+        if self._finder is None:
+            self._finder = _ImportTimer(self)
+            sys.meta_path.insert(0, self._finder)
+
+    def record_import(self, module: str, seconds: float) -> None:
+        if seconds >= IMPORT_THRESHOLD_S:
+            with self._lock:
+                self.imports[module] = seconds
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases[name] = time.perf_counter() - start
+
+    # ---------- Readiness ----------
+
+    def wait_for(self, component: str) -> None:
+        """Hold readiness until ``component_ready(component)``."""
+        with self._lock:
+            self._pending.add(component)
+
+    def component_ready(self, component: str) -> None:
+        with self._lock:
+            self._pending.discard(component)
+            self._check_ready()
+
+    def startup_complete(self) -> None:
+        with self._lock:
+            self.phases["startup"] = time.perf_counter() - self.started
+            self._pending.discard("startup")
+            self._check_ready()
+        self.log_summary()
+
+    def _check_ready(self) -> None:
+        if not self._pending and self.ready_at is None:
+            self.ready_at = time.perf_counter()
+            logger.info("Ready after %.0f ms", (self.ready_at - self.started) * 1000)
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None
+
+    @property
+    def pending(self) -> list[str]:
+        with self._lock:
+            return sorted(self._pending)
+
+    # ---------- Reporting ----------
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            imports = sorted(self.imports.items(), key=lambda item: -item[1])
+            phases = dict(self.phases)
+            pending = sorted(self._pending)
+        return {
+            "ready": self.ready_at is not None,
+            "pending": pending,
+            "ready_after_ms": (
+                round((self.ready_at - self.started) * 1000, 1)
+                if self.ready_at is not None else None
+            ),
+            "phases_ms": {name: round(s * 1000, 1) for name, s in phases.items()},
+            "imports_ms": {name: round(s * 1000, 1) for name, s in imports},
+        }
+
+    def log_summary(self, top: int = 8) -> None:
+        report = self.as_dict()
+        # Third-party packages only: app.* times include them
+        heaviest = [
+            f"{name} {ms:.0f}" for name, ms in report["imports_ms"].items()
+            if not name.startswith("app")
+        ][:top]
+        phases = ", ".join(f"{name} {ms:.0f}" for name, ms in report["phases_ms"].items())
+        logger.info("Startup (ms): %s; heaviest imports: %s", phases, ", ".join(heaviest))
+
+
+report = StartupReport()
+report.wait_for("startup")
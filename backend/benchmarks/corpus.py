@@ -0,0 +1,120 @@
+"""Deterministic synthetic image corpus for the benchmarks.
+
+Every image is generated from a fixed seed: a smooth gradient with a few
+shapes and mild noise, so codecs and the ELA/feature code see
+photo-like content rather than white noise. Cases cover JPEG and PNG,
+several resolutions, and files with and without EXIF.
+"""
+
+import hashlib
+import io
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import numpy as np
+import piexif
+from PIL import Image, ImageDraw
+
+RESOLUTIONS = {"vga": (640, 480), "fhd": (1920, 1080), "12mp": (4000, 3000)}
+FORMATS = ("jpeg", "png")
+SEED = 20240601
+
+
+@dataclass
+class CorpusImage:
+    name: str
+    format: str
+    width: int
+    height: int
+    exif: bool
+    size: int
+    sha256: str
+    path: str
+
+
+def _pixels(width: int, height: int, seed: int) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack(
+        [
+            128 + 100 * np.sin(x / width * np.pi * rng.uniform(1, 3)),
+            128 + 100 * np.cos(y / height * np.pi * rng.uniform(1, 3)),
+            255 * (x + y) / (width + height),
+        ],
+        axis=-1,
+    )
+    base += rng.normal(0, 6, base.shape)
+    img = Image.fromarray(np.clip(base, 0, 255).astype(np.uint8), "RGB")
+
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x0, y0 = int(rng.integers(0, width)), int(rng.integers(0, height))
+        w, h = int(rng.integers(width // 20, width // 4)), int(rng.integers(height // 20, height // 4))
+        fill = tuple(int(c) for c in rng.integers(0, 256, 3))
+        draw.ellipse((x0, y0, x0 + w, y0 + h), fill=fill)
+    return img
+
+
+def _exif() -> bytes:
+    return piexif.dump({
+        "0th": {
+            piexif.ImageIFD.Make: b"BenchCam",
+            piexif.ImageIFD.Model: b"BC-1",
+            piexif.ImageIFD.Software: b"Adobe Photoshop 25.0",
+            piexif.ImageIFD.XResolution: (72, 1),
+            piexif.ImageIFD.YResolution: (72, 1),
+            piexif.ImageIFD.Orientation: 1,
+        },
+        "Exif": {
+            piexif.ExifIFD.DateTimeOriginal: b"2024:06:01 12:00:00",
+            piexif.ExifIFD.ExposureTime: (1, 125),
+            piexif.ExifIFD.FNumber: (28, 10),
+            piexif.ExifIFD.ISOSpeedRatings: 200,
+        },
+        "GPS": {
+            piexif.GPSIFD.GPSLatitudeRef: b"N",
+            piexif.GPSIFD.GPSLatitude: ((52, 1), (22, 1), (1234, 100)),
+            piexif.GPSIFD.GPSLongitudeRef: b"E",
+            piexif.GPSIFD.GPSLongitude: ((4, 1), (53, 1), (4321, 100)),
+        },
+    })
+
+
+def _encode(img: Image.Image, fmt: str, exif: bytes | None) -> bytes:
+    buffer = io.BytesIO()
+    kwargs = {"exif": exif} if exif else {}
+    if fmt == "jpeg":
+        img.save(buffer, "JPEG", quality=90, **kwargs)
+    else:
+        img.save(buffer, "PNG", compress_level=6, **kwargs)
+    return buffer.getvalue()
+
+
+def build_corpus(
+    directory: Path, resolutions: list[str] | None = None
+) -> list[CorpusImage]:
+    """Write the corpus to ``directory`` (reusing files that exist) and
+    describe it."""
+    directory.mkdir(parents=True, exist_ok=True)
+    images = []
+    for i, res in enumerate(resolutions or list(RESOLUTIONS)):
+        width, height = RESOLUTIONS[res]
+        pixels = None
+        for fmt in FORMATS:
+            for with_exif in (True, False):
+                name = f"{fmt}-{res}-{'exif' if with_exif else 'noexif'}"
+                path = directory / f"{name}.{'jpg' if fmt == 'jpeg' else 'png'}"
+                if not path.is_file():
+                    if pixels is None:
+                        pixels = _pixels(width, height, SEED + i)
+                    path.write_bytes(_encode(pixels, fmt, _exif() if with_exif else None))
+                data = path.read_bytes()
+                images.append(CorpusImage(
+                    name=name, format=fmt, width=width, height=height, exif=with_exif,
+                    size=len(data), sha256=hashlib.sha256(data).hexdigest(), path=str(path),
+                ))
+    return images
+
+
+def describe(images: list[CorpusImage]) -> list[dict]:
+    return [asdict(img) for img in images]
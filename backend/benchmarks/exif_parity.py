@@ -0,0 +1,241 @@
+"""Parity and fuzz check of the header-only EXIF reader against Pillow.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.exif_parity                     # built-in cases + 3000 fuzzed segments
+    python -m benchmarks.exif_parity --fuzz 20000 --seed 7
+    python -m benchmarks.exif_parity --images ~/photos bench-corpus
+
+Every image goes through ``extract_metadata`` twice: once on the header-
+only fast path (app/services/exif_reader.py) and once on the Pillow/piexif
+path. The two results must be identical, or the fast path must decline
+the file (``UnsupportedLayout``) so that the Pillow path handles it.
+Fuzzed files that Pillow cannot open are skipped, as the pipeline rejects
+them whichever path reads their metadata. Exits 1 on any mismatch.
+"""
+
+import argparse
+import io
+import logging
+import random
+import struct
+import sys
+import warnings
+from collections import Counter
+from pathlib import Path
+
+import piexif
+from PIL import Image
+
+from benchmarks.corpus import _exif, _pixels
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png"}
+
+
+# ---------- Built-in cases ----------
+
+def _jpeg(img: Image.Image, exif: bytes | None = None, **kwargs) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=90, **({"exif": exif} if exif else {}), **kwargs)
+    return buffer.getvalue()
+
+
+def _png(img: Image.Image, exif: bytes | None = None, pnginfo=None) -> bytes:
+    buffer = io.BytesIO()
+    kwargs = {"exif": exif} if exif else {}
+    img.save(buffer, "PNG", pnginfo=pnginfo, **kwargs)
+    return buffer.getvalue()
+
+
+def _little_endian_exif() -> bytes:
+    # piexif only writes big-endian ("MM"); Pillow writes little-endian
+    exif = Image.Exif()
+    exif[0x010F] = "LittleCam"  # Make
+    exif[0x0110] = "LC-2"  # Model
+    exif[0x0131] = "GIMP 2.10"  # Software
+    exif[0x8769] = {0x9003: "2023:01:02 03:04:05"}  # Exif IFD: DateTimeOriginal
+    return exif.tobytes()
+
+
+def _app1(jpeg: bytes) -> tuple[int, int]:
+    """(offset of the marker, segment length) of the first APP1."""
+    pos = 2
+    while jpeg[pos + 1] != 0xE1:
+        pos += 2 + struct.unpack(">H", jpeg[pos + 2 : pos + 4])[0]
+    return pos, struct.unpack(">H", jpeg[pos + 2 : pos + 4])[0]
+
+
+def _with_second_app1(jpeg: bytes, payload: bytes) -> bytes:
+    """Insert an extra EXIF APP1 segment right after the first one."""
+    pos, length = _app1(jpeg)
+    end = pos + 2 + length
+    segment = b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload
+    return jpeg[:end] + segment + jpeg[end:]
+
+
+def _png_text_exif(img: Image.Image, exif: bytes) -> bytes:
+    """EXIF as an ImageMagick-style "Raw profile type exif" zTXt chunk."""
+    from PIL.PngImagePlugin import PngInfo
+
+    hexdata = exif.hex()
+    text = f"\nexif\n{len(exif):8d}\n" + "\n".join(
+        hexdata[i : i + 72] for i in range(0, len(hexdata), 72)
+    ) + "\n"
+    info = PngInfo()
+    info.add_text("Raw profile type exif", text, zip=True)
+    return _png(img, pnginfo=info)
+
+
+def builtin_cases() -> dict[str, bytes]:
+    rgb = _pixels(640, 480, seed=1)
+    big = _pixels(4000, 3000, seed=2)
+    exif, little = _exif(), _little_endian_exif()
+    gps_only = piexif.dump({"GPS": {
+        piexif.GPSIFD.GPSLatitudeRef: b"S",
+        piexif.GPSIFD.GPSLatitude: ((33, 1), (51, 1), (0, 1)),
+        piexif.GPSIFD.GPSLongitudeRef: b"W",
+        piexif.GPSIFD.GPSLongitude: ((70, 1), (40, 1), (0, 1)),
+    }})
+    first_ifd = piexif.dump({
+        "0th": {piexif.ImageIFD.Make: b"ThumbCam"},
+        "1st": {piexif.ImageIFD.Compression: 6, piexif.ImageIFD.XResolution: (72, 1)},
+    })
+    return {
+        "jpeg-exif-big-endian": _jpeg(rgb, exif),
+        "jpeg-exif-little-endian": _jpeg(rgb, little),
+        "jpeg-gps-only": _jpeg(rgb, gps_only),
+        "jpeg-1st-ifd": _jpeg(rgb, first_ifd),
+        "jpeg-no-exif": _jpeg(rgb),
+        "jpeg-progressive": _jpeg(rgb, exif, progressive=True),
+        "jpeg-grayscale": _jpeg(rgb.convert("L"), exif),
+        "jpeg-multi-app1": _with_second_app1(_jpeg(rgb, exif), b"Exif\x00\x00" + little[6:]),
+        "jpeg-12mp": _jpeg(big, exif),
+        "png-exif": _png(rgb, exif),
+        "png-exif-rgba": _png(rgb.convert("RGBA"), little),
+        "png-no-exif": _png(rgb),
+        "png-text-exif": _png_text_exif(rgb, exif),  # expected: declined
+    }
+
+
+def file_cases(paths: list[Path]) -> dict[str, bytes]:
+    cases = {}
+    for root in paths:
+        files = [root] if root.is_file() else sorted(root.rglob("*"))
+        for path in files:
+            if path.suffix.lower() in IMAGE_SUFFIXES and path.is_file():
+                cases[str(path)] = path.read_bytes()
+    return cases
+
+
+# ---------- Comparison ----------
+
+def compare(raw: bytes) -> str:
+    """"match", "declined", "unreadable" (Pillow cannot open it) or
+    "mismatch"."""
+    from app.services.exif_reader import UnsupportedLayout, read_exif
+    from app.services.image_context import ImageContext
+    from app.services.metadata_extractor import (
+        _apply_exif,
+        _empty_result,
+        _extract_with_pillow,
+        _mark_no_exif,
+    )
+
+    ctx = ImageContext(raw)
+    try:
+        ctx.image
+    except Exception:
+        return "unreadable"
+    slow = _extract_with_pillow(ctx)
+
+    try:
+        exif_dict = read_exif(raw)
+    except UnsupportedLayout:
+        return "declined"
+    fast = _empty_result()
+    if exif_dict is not None:
+        _apply_exif(fast, exif_dict)
+    else:
+        _mark_no_exif(fast)
+    return "match" if fast == slow else "mismatch"
+
+
+# ---------- Fuzzing ----------
+
+def _mutate(jpeg: bytes, rng: random.Random) -> bytes:
+    """Corrupt the APP1 (EXIF) segment of a JPEG in one of several ways,
+    keeping the segment length consistent unless that is the mutation."""
+    pos, length = _app1(jpeg)
+    start, end = pos + 4, pos + 2 + length  # payload of the first APP1
+    data = bytearray(jpeg)
+    kind = rng.choice(("flip", "bytes", "u32", "u16", "truncate", "length"))
+    if kind == "flip":
+        for _ in range(rng.randint(1, 8)):
+            data[rng.randrange(start, end)] ^= 1 << rng.randrange(8)
+    elif kind == "bytes":
+        for _ in range(rng.randint(1, 4)):
+            data[rng.randrange(start, end)] = rng.randrange(256)
+    elif kind == "u32":  # IFD offsets and value counts
+        at = rng.randrange(start + 6, end - 4)
+        value = rng.choice((0, 1, 0xFFFF, 0x7FFFFFFF, 0xFFFFFFFF, rng.getrandbits(32)))
+        data[at : at + 4] = value.to_bytes(4, rng.choice(("big", "little")))
+    elif kind == "u16":  # entry counts and field types
+        at = rng.randrange(start + 6, end - 2)
+        data[at : at + 2] = rng.getrandbits(16).to_bytes(2, "big")
+    elif kind == "truncate":
+        cut = rng.randrange(start, end)
+        data[cut:end] = b""
+        data[pos + 2 : pos + 4] = struct.pack(">H", length - (end - cut))
+    else:  # a segment length that disagrees with the payload
+        data[pos + 2 : pos + 4] = struct.pack(">H", rng.randrange(2, 0x10000))
+    return bytes(data)
+
+
+def fuzz(iterations: int, seed: int) -> Counter:
+    rng = random.Random(seed)
+    rgb = _pixels(160, 120, seed=3)
+    bases = [_jpeg(rgb, _exif()), _jpeg(rgb, _little_endian_exif())]
+    outcomes: Counter = Counter()
+    for i in range(iterations):
+        raw = _mutate(rng.choice(bases), rng)
+        outcome = compare(raw)
+        outcomes[outcome] += 1
+        if outcome == "mismatch":
+            path = BACKEND_DIR / "exif-mismatch" / f"fuzz-{seed}-{i}.jpg"
+            path.parent.mkdir(exist_ok=True)
+            path.write_bytes(raw)
+            print(f"  mismatch: fuzz case {i}, saved to {path}")
+    return outcomes
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--images", nargs="*", type=Path, default=[], help="files or directories to check too")
+    parser.add_argument("--fuzz", type=int, default=3000, help="fuzzed EXIF segments (0 to skip)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    # The Pillow path logs every file it cannot open, and warns on every
+    # corrupt EXIF block it reads
+    logging.getLogger("app.services.metadata_extractor").setLevel(logging.CRITICAL)
+    warnings.simplefilter("ignore")
+
+    failed = False
+    cases = {**builtin_cases(), **file_cases(args.images)}
+    for name, raw in cases.items():
+        outcome = compare(raw)
+        failed |= outcome == "mismatch"
+        print(f"{name:40s} {outcome}")
+
+    if args.fuzz:
+        outcomes = fuzz(args.fuzz, args.seed)
+        failed |= outcomes["mismatch"] > 0
+        print(f"fuzz ({args.fuzz} segments, seed {args.seed}): " + ", ".join(
+            f"{outcome} {outcomes[outcome]}"
+            for outcome in ("match", "declined", "unreadable", "mismatch")
+        ))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Benchmark every analysis stage over the synthetic corpus.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.run                       # all stages -> bench-results/<timestamp>.json
+    python -m benchmarks.run --quick               # vga/fhd only, fewer repetitions
+    python -m benchmarks.run --stages perform_ela run_analysis --repeat 30
+    python -m benchmarks.run --compare old.json new.json
+
+Each stage runs in its own spawned process with a throwaway database and
+upload directory, so peak RSS is per stage and runs never touch real data.
+Results are written as sorted, indented JSON so two runs diff cleanly.
+"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from importlib import metadata as importlib_metadata
+from pathlib import Path
+
+from benchmarks.corpus import RESOLUTIONS, build_corpus, describe
+from benchmarks.stages import STAGES, run_stage
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+PACKAGES = ("numpy", "pillow", "opencv-python-headless", "torch", "fastapi", "sqlalchemy", "piexif")
+
+
+def _versions() -> dict:
+    versions = {}
+    for name in PACKAGES:
+        try:
+            versions[name] = importlib_metadata.version(name)
+        except importlib_metadata.PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _stage_env(workdir: Path, max_size: int) -> dict:
+    return {
+        "DATABASE_URL": f"sqlite:///{workdir / 'bench.db'}",
+        "UPLOAD_DIR": str(workdir / "uploads"),
+        "BENCH_TMP": str(workdir),
+        # Every repetition must run the full analysis, not hit the cache
+        "RESULT_CACHE_ENABLED": "false",
+        "MAX_FILE_SIZE": str(max_size),
+    }
+
+
+def run(args) -> dict:
+    corpus = build_corpus(args.corpus_dir, args.resolutions)
+    cases = [(img.name, img.path) for img in corpus]
+    max_size = max(img.size for img in corpus)
+    context = multiprocessing.get_context("spawn")
+
+    stages = {}
+    for stage in args.stages:
+        print(f"[bench] {stage} ...", file=sys.stderr, flush=True)
+        with tempfile.TemporaryDirectory(prefix="vg-bench-") as workdir:
+            env = _stage_env(Path(workdir), max_size)
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                started = time.perf_counter()
+                stages[stage] = pool.submit(
+                    run_stage, stage, cases, args.warmup, args.repeat, env
+                ).result()
+                stages[stage]["wall_s"] = round(time.perf_counter() - started, 2)
+
+    return {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": multiprocessing.cpu_count(),
+            "packages": _versions(),
+            "warmup": args.warmup,
+            "repeat": args.repeat,
+            "max_file_size": max_size,
+        },
+        "corpus": describe(corpus),
+        "stages": stages,
+    }
+
+
+def compare(old_path: Path, new_path: Path) -> None:
+    """Print the median change per stage and case between two result files."""
+    old = json.loads(old_path.read_text())["stages"]
+    new = json.loads(new_path.read_text())["stages"]
+    print(f"{'stage':28s} {'case':20s} {'old ms':>10s} {'new ms':>10s} {'change':>8s}")
+    for stage in sorted(set(old) & set(new)):
+        for case in sorted(set(old[stage]["cases"]) & set(new[stage]["cases"])):
+            a = old[stage]["cases"][case].get("median_ms")
+            b = new[stage]["cases"][case].get("median_ms")
+            if a is None or b is None:
+                continue
+            change = f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+            print(f"{stage:28s} {case:20s} {a:10.3f} {b:10.3f} {change:>8s}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--resolutions", nargs="+", choices=list(RESOLUTIONS))
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--quick", action="store_true", help="vga/fhd only, warmup 1, repeat 5")
+    parser.add_argument("--corpus-dir", type=Path, default=BACKEND_DIR / "bench-corpus")
+    parser.add_argument("--output", type=Path, help="JSON file (default: bench-results/<timestamp>.json)")
+    parser.add_argument("--compare", nargs=2, type=Path, metavar=("OLD", "NEW"))
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.quick:
+        args.resolutions = args.resolutions or ["vga", "fhd"]
+        args.warmup, args.repeat = 1, 5
+
+    results = run(args)
+    output = args.output or (
+        BACKEND_DIR / "bench-results" / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+
+    for stage, data in results["stages"].items():
+        medians = [
+            f"{case}={c['median_ms']:.2f}" for case, c in data["cases"].items() if "median_ms" in c
+        ]
+        problems = [c.get("error") or c.get("skipped") for c in data["cases"].values() if "median_ms" not in c]
+        line = f"{stage:28s} peak {data['peak_rss_mb']:7.1f} MB  " + " ".join(medians[:4])
+        if problems:
+            line += f"  [{problems[0]}]"
+        print(line)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
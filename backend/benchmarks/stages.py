@@ -0,0 +1,228 @@
+"""Benchmarked stages. Runs inside a fresh worker process per stage, so
+``app`` is imported only after the environment has been prepared and the
+peak RSS reported for a stage is that stage's own."""
+
+import os
+import resource
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import numpy as np
+
+# Each stage: name -> factory(raw bytes, case name) -> zero-arg callable timed
+# per repetition. Work done in the factory (decoding inputs the stage takes
+# as given, building clients) is excluded from the timings.
+Factory = Callable[[bytes, str], Callable[[], object]]
+
+
+def _rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _metadata(fast: bool) -> Factory:
+    def factory(raw, case):
+        from app.config import settings
+        from app.services.image_context import ImageContext
+        from app.services.metadata_extractor import extract_metadata
+
+        settings.metadata_fast_path = fast
+        return lambda: extract_metadata(ImageContext(raw))
+
+    return factory
+
+
+def _decode(raw, case):
+    from app.services.image_context import ImageContext
+
+    return lambda: ImageContext(raw).thumbnail_jpeg
+
+
+def _ela(raw, case):
+    from app.services.ela_analyzer import perform_ela
+    from app.services.image_context import ImageContext
+
+    ctx = ImageContext(raw)
+    ctx.thumbnail  # ELA input; decoding is the "decode" stage
+    return lambda: perform_ela(ctx)
+
+
+def _statistical(raw, case):
+    from app.services.ai_detector import AIDetector
+    from app.services.ela_analyzer import perform_ela
+    from app.services.image_context import ImageContext
+
+    ctx = ImageContext(raw)
+    ela = perform_ela(ctx)
+    detector = AIDetector(None)
+    return lambda: detector._statistical_fallback(ctx, ela)
+
+
+def _model(engine: str) -> Factory:
+    detectors = {}
+
+    def factory(raw, case):
+        from app.services.ai_detector import AIDetector
+        from app.services.image_context import ImageContext
+
+        if engine not in detectors:
+            detectors[engine] = AIDetector(
+                _model_weights(), engine=engine, warmup_runs=0, parity_atol=None
+            )
+        detector = detectors[engine]
+        if not detector.model_loaded:
+            raise RuntimeError("MesoNet weights could not be loaded")
+        ctx = ImageContext(raw)
+        ctx.rgb
+        return lambda: detector.predict(ctx)
+
+    return factory
+
+
+def _model_weights() -> Path:
+    """Configured weights if present, else randomly initialised ones
+    (latency does not depend on the weight values)."""
+    from app.config import settings
+
+    if settings.model_path.exists():
+        return settings.model_path
+    import torch
+
+    from app.services.mesonet import MesoNet4
+
+    path = Path(os.environ["BENCH_TMP"]) / "mesonet-random.pth"
+    if not path.exists():
+        torch.manual_seed(0)
+        torch.save(MesoNet4().state_dict(), path)
+    return path
+
+
+def _hashes(raw, case):
+    from app.services.image_context import ImageContext
+    from app.services.perceptual_hash import image_hashes
+
+    ctx = ImageContext(raw)
+    ctx.thumbnail_array
+    return lambda: image_hashes(ctx.thumbnail_array)
+
+
+def _compute_hash(raw, case):
+    from app.services.image_storage import compute_hash
+
+    return lambda: compute_hash(raw)
+
+
+def _save_image(raw, case):
+    from app.services.image_context import ImageContext
+    from app.services.image_storage import compute_hash, save_image
+
+    processed = ImageContext(raw).thumbnail_jpeg
+
+    def save():
+        # A fresh random key each time: save_image skips keys that are
+        # already stored, which would leave only an existence check to time
+        return save_image(processed, compute_hash(os.urandom(32)))
+
+    return save
+
+
+def _pipeline(raw, case):
+    from app.services.image_context import ImageContext
+    from app.services.pipeline import run_analysis
+
+    return lambda: run_analysis(ImageContext(raw))
+
+
+_clients = {}
+
+
+def _handler(raw, case):
+    if "client" not in _clients:
+        from fastapi.testclient import TestClient
+
+        from app.main import app
+
+        client = TestClient(app)
+        client.__enter__()  # runs startup; the process exits after the stage
+        _clients["client"] = client
+    client = _clients["client"]
+    filename = f"{case}.{'png' if case.startswith('png') else 'jpg'}"
+    content_type = "image/png" if case.startswith("png") else "image/jpeg"
+
+    def call():
+        response = client.post(
+            "/api/analyze", files={"file": (filename, raw, content_type)}
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/analyze returned {response.status_code}: {response.text}")
+        return response
+
+    return call
+
+
+STAGES: dict[str, Factory] = {
+    "extract_metadata": _metadata(fast=True),
+    "extract_metadata[pillow]": _metadata(fast=False),
+    "decode_thumbnail": _decode,
+    "perform_ela": _ela,
+    "ai_statistical_fallback": _statistical,
+    "ai_model[eager]": _model("eager"),
+    "ai_model[optimized]": _model("optimized"),
+    "perceptual_hashes": _hashes,
+    "compute_hash": _compute_hash,
+    "save_image": _save_image,
+    "run_analysis": _pipeline,
+    "analyze_handler": _handler,
+}
+
+
+def _summarise(samples_ns: list[int]) -> dict:
+    ms = np.asarray(samples_ns, dtype=np.float64) / 1e6
+    mean = float(ms.mean())
+    return {
+        "repeat": len(ms),
+        "min_ms": round(float(ms.min()), 4),
+        "median_ms": round(float(np.median(ms)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "mean_ms": round(mean, 4),
+        "throughput_per_s": round(1000.0 / mean, 2) if mean > 0 else None,
+    }
+
+
+def run_stage(
+    stage: str, cases: list[tuple[str, str]], warmup: int, repeat: int, env: dict
+) -> dict:
+    """Worker entry point: time ``stage`` over every (name, path) case."""
+    os.environ.update(env)
+    os.environ.setdefault("BENCH_TMP", tempfile.mkdtemp(prefix="vg-bench-"))
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+    import logging
+
+    logging.disable(logging.CRITICAL)  # per-request INFO logs would dominate
+
+    factory = STAGES[stage]
+    result = {"cases": {}, "baseline_rss_mb": round(_rss_mb(), 1)}
+    for name, path in cases:
+        raw = Path(path).read_bytes()
+        try:
+            fn = factory(raw, name)
+            for _ in range(warmup):
+                fn()
+            samples = []
+            for _ in range(repeat):
+                start = time.perf_counter_ns()
+                fn()
+                samples.append(time.perf_counter_ns() - start)
+        except ImportError as e:
+            result["cases"][name] = {"skipped": f"missing dependency: {e.name}"}
+            continue
+        except Exception as e:
+            result["cases"][name] = {"error": f"{type(e).__name__}: {e}"}
+            continue
+        result["cases"][name] = _summarise(samples)
+    result["peak_rss_mb"] = round(_rss_mb(), 1)
+    return result
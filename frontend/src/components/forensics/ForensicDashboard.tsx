@@ -9,6 +9,9 @@ interface ForensicDashboardProps {
 }
 
 export default function ForensicDashboard({ result }: ForensicDashboardProps) {
+  // The upload itself when the server keeps originals, else its thumbnail
+  const imageUrl = result.original_image_url ?? result.thumbnail_url;
+
   return (
     <div className="w-full max-w-7xl mx-auto mt-10 animate-fade-in-up space-y-6">
       <div className="text-center mb-6">
@@ -24,8 +27,14 @@ export default function ForensicDashboard({ result }: ForensicDashboardProps) {
       <div className="grid grid-cols-1 lg:grid-cols-3 gap-6">
         <div className="lg:col-span-2">
           <ELAComparison
-            originalImageBase64={result.original_image_base64}
-            elaHeatmapBase64={result.ela.heatmap_base64}
+            originalImageBase64={
+              result.original_image_base64 ??
+              (imageUrl ? import.meta.env.VITE_API_URL + imageUrl : '')
+            }
+            elaHeatmapBase64={
+              result.ela.heatmap_base64 ||
+              `${import.meta.env.VITE_API_URL}/api/scans/${result.scan_id}/ela`
+            }
             meanDiff={result.ela.mean_diff}
             maxDiff={result.ela.max_diff}
           />
@@ -6,7 +6,9 @@ interface FileUploadZoneProps {
   isAnalyzing: boolean;
 }
 
-const MAX_SIZE = 2 * 1024 * 1024; // 2MB
+// Match the backend limit (40 with LARGE_IMAGE_MODE); defaults to 2MB
+const MAX_SIZE_MB = Number(import.meta.env.VITE_MAX_UPLOAD_MB) || 2;
+const MAX_SIZE = MAX_SIZE_MB * 1024 * 1024;
 
 export default function FileUploadZone({ onFileSelect, isAnalyzing }: FileUploadZoneProps) {
   const [error, setError] = useState<string | null>(null);
@@ -17,7 +19,7 @@ export default function FileUploadZone({ onFileSelect, isAnalyzing }: FileUpload
       if (rejected.length > 0) {
         const err = rejected[0]?.errors?.[0];
         if (err?.code === 'file-too-large') {
-          setError('File too large. Maximum size is 2MB.');
+          setError(`File too large. Maximum size is ${MAX_SIZE_MB}MB.`);
         } else if (err?.code === 'file-invalid-type') {
           setError('Invalid format. Only JPG and PNG accepted.');
         } else {
@@ -80,7 +82,7 @@ export default function FileUploadZone({ onFileSelect, isAnalyzing }: FileUpload
                 : '[ DRAG & DROP IMAGE HERE ]'}
             </p>
             <p className="text-xs text-gray-600 mt-2">
-              or click to browse -- JPG/PNG, max 2MB
+              or click to browse -- JPG/PNG, max {MAX_SIZE_MB}MB
             </p>
           </div>
         </div>
@@ -1,5 +1,7 @@
 import api from './api';
-import type { AnalysisResponse } from '../types/forensics';
+import type {
+  AnalysisResponse, JobAccepted, JobStatus, VideoAnalysisResponse,
+} from '../types/forensics';
 
 export async function uploadAndAnalyze(file: File): Promise<AnalysisResponse> {
   const formData = new FormData();
@@ -9,4 +11,30 @@ export async function uploadAndAnalyze(file: File): Promise<AnalysisResponse> {
   headers: { 'Content-Type': 'multipart/form-data' },
 });
   return response.data;
-}
\ No newline at end of file
+}
+
+// MP4/WebM; the response carries the per-frame timeline
+export async function analyzeVideo(file: File): Promise<VideoAnalysisResponse> {
+  const formData = new FormData();
+  formData.append('file', file);
+  const response = await api.post<VideoAnalysisResponse>('/analyze/video', formData, {
+    headers: { 'Content-Type': 'multipart/form-data' },
+  });
+  return response.data;
+}
+
+// Queue the analysis; the request returns as soon as the upload is stored
+export async function submitAnalysisJob(file: File): Promise<JobAccepted> {
+  const formData = new FormData();
+  formData.append('file', file);
+  const response = await api.post<JobAccepted>('/analyze', formData, {
+    params: { async: true },
+    headers: { 'Content-Type': 'multipart/form-data' },
+  });
+  return response.data;
+}
+
+export async function getJob(jobId: string): Promise<JobStatus> {
+  const response = await api.get<JobStatus>(`/jobs/${jobId}`);
+  return response.data;
+}
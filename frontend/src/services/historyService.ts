@@ -10,3 +10,21 @@ export async function getScanHistory(
   });
   return response.data;
 }
+
+export interface ScanExportOptions {
+  format?: 'csv' | 'ndjson';
+  includeMetadata?: boolean;
+  verdict?: string;
+  since?: string;
+  until?: string;
+}
+
+// A download link rather than a request: the browser streams the file to
+// disk instead of buffering the whole history in memory
+export function scanExportUrl(options: ScanExportOptions = {}): string {
+  const { format = 'csv', includeMetadata = false, ...filters } = options;
+  return api.getUri({
+    url: '/scans/export',
+    params: { format, include_metadata: includeMetadata, ...filters },
+  });
+}
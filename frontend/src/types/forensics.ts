@@ -14,6 +14,11 @@ export interface ELAResult {
   heatmap_base64: string;
   mean_diff: number;
   max_diff: number;
+  channel_max_mean: number | null;
+  p50_diff: number | null;
+  p95_diff: number | null;
+  p99_diff: number | null;
+  block_means: number[][] | null;
 }
 
 export interface AIDetectionResult {
@@ -32,7 +37,57 @@ export interface AnalysisResponse {
   metadata: MetadataResult;
   ela: ELAResult;
   ai_detection: AIDetectionResult;
-  original_image_base64: string;
+  original_image_base64: string | null;
+  original_image_url: string | null; // only when the server keeps originals
+  thumbnail_url: string | null;
+}
+
+export interface VideoInfo {
+  duration_s: number | null;
+  fps: number | null;
+  width: number;
+  height: number;
+  frame_count: number | null;
+  codec: string | null;
+}
+
+export interface FrameResult {
+  time_s: number;
+  frame_index: number;
+  keyframe: boolean;
+  manipulation_score: number;
+  ela_mean: number;
+  ai_probability: number;
+}
+
+export interface TimelineSegment {
+  start_s: number;
+  end_s: number;
+  peak_score: number;
+}
+
+export interface VideoTimeline {
+  sample_mode: "stride" | "scene";
+  frames_analyzed: number;
+  covered_s: number | null;
+  truncated: boolean;
+  frames: FrameResult[];
+  segments: TimelineSegment[];
+}
+
+export interface VideoAnalysisResponse {
+  scan_id: number;
+  image_name: string;
+  sha256_hash: string;
+  timestamp: string;
+  media_type: "video";
+  verdict: string;
+  manipulation_score: number;
+  video: VideoInfo;
+  ela_mean: number;
+  ai_detection: AIDetectionResult;
+  timeline: VideoTimeline;
+  poster_url: string | null;
 }
 
 export interface ScanSummary {
@@ -45,11 +100,48 @@ export interface ScanSummary {
   software_detected: string | null;
   ela_mean: number | null;
   ai_score: number | null;
+  has_exif: boolean | null;
+  camera_make: string | null;
+  camera_model: string | null;
+  date_taken: string | null;
+  media_type: "image" | "video";
+  duration_s: number | null;
 }
 
 export interface ScanListResponse {
   total: number;
   limit: number;
   offset: number;
+  next_cursor: string | null;
   scans: ScanSummary[];
 }
+
+export interface SimilarScan extends ScanSummary {
+  distance: number;
+}
+
+export interface SimilarScansResponse {
+  scan_id: number;
+  hash: "phash" | "dhash";
+  max_distance: number;
+  matches: SimilarScan[];
+}
+
+export interface JobAccepted {
+  job_id: string;
+  status: string;
+  status_url: string;
+}
+
+export interface JobStatus {
+  job_id: string;
+  status: "queued" | "running" | "done" | "failed";
+  image_name: string;
+  created_at: string;
+  started_at: string | null;
+  finished_at: string | null;
+  attempts: number;
+  queue_position: number | null;
+  error: string | null;
+  result: AnalysisResponse | null;
+}